@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from api.route_helpers import bool_status_response, list_response
+from api.route_helpers import bool_status_response, list_response, refresh_monitor_snapshot
 from repositories.monitor_repository import MonitorStockRepository
 from repositories.portfolio_repository import StockRepository
 from schemas.admin import (
@@ -10,7 +10,15 @@ from schemas.admin import (
     AdminStockUpdate,
     ToggleEnabled,
 )
+from services.monitor_cache_service import MonitorCacheService
+from services.monitor_snapshot_service import MonitorSnapshotService
+from utils.adaptive_limiter import all_limiter_stats
+from utils.api_helpers import success_response
+from utils.compute_executor import get_compute_executor
+from utils.http_clients import get_http_clients
+from utils.kline_store import get_kline_store
 from utils.logger import get_logger
+from utils.market_data_executor import get_market_data_executor
 
 logger = get_logger('admin_routes')
 
@@ -27,18 +35,21 @@ async def list_stocks():
 @admin_router.post('/stocks')
 async def create_stock(data: AdminStockCreate):
     success, msg = await StockRepository.add(data.code, data.name, data.cost_price, data.shares)
+    refresh_monitor_snapshot(success)
     return bool_status_response(success, msg, msg)
 
 
 @admin_router.put('/stocks/{code}')
 async def update_stock(code: str, data: AdminStockUpdate):
     success = await StockRepository.update(code, data.name, data.cost_price, data.shares)
+    refresh_monitor_snapshot(success)
     return bool_status_response(success, '更新成功', '更新失败')
 
 
 @admin_router.delete('/stocks/{code}')
 async def delete_stock(code: str):
     success = await StockRepository.delete(code)
+    refresh_monitor_snapshot(success)
     return bool_status_response(success, '删除成功', '删除失败')
 
 
@@ -58,6 +69,7 @@ async def create_monitor_stock(data: AdminMonitorStockCreate):
         data.reasonable_pe_min,
         data.reasonable_pe_max,
     )
+    refresh_monitor_snapshot(success)
     return bool_status_response(success, msg, msg)
 
 
@@ -70,16 +82,32 @@ async def update_monitor_stock(code: str, data: AdminMonitorStockUpdate):
         data.reasonable_pe_min,
         data.reasonable_pe_max,
     )
+    refresh_monitor_snapshot(success)
     return bool_status_response(success, '更新成功', '更新失败')
 
 
 @admin_router.delete('/monitor-stocks/{code}')
 async def delete_monitor_stock(code: str):
     success = await MonitorStockRepository.delete(code)
+    refresh_monitor_snapshot(success)
     return bool_status_response(success, '删除成功', '删除失败')
 
 
 @admin_router.post('/monitor-stocks/{code}/toggle')
 async def toggle_monitor_stock(code: str, data: ToggleEnabled):
     success = await MonitorStockRepository.toggle_enabled(code, data.enabled)
+    refresh_monitor_snapshot(success)
     return bool_status_response(success, '操作成功', '操作失败')
+
+
+@admin_router.get('/runtime-status')
+async def get_runtime_status():
+    logger.info('GET /api/admin/runtime-status')
+    return success_response(data={
+        'executors': [get_market_data_executor().stats(), get_compute_executor().stats()],
+        'limiters': all_limiter_stats(),
+        'kline_store': get_kline_store().stats(),
+        'http': get_http_clients().stats(),
+        'monitor_snapshot': MonitorSnapshotService.stats(),
+        'monitor_cache': MonitorCacheService.stats(),
+    })
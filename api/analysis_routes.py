@@ -1,8 +1,9 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 
 from schemas.analysis import AnalysisRequest
 from services.price_action_service import PriceActionService
-from utils.api_helpers import current_timestamp, success_response
+from utils.api_helpers import current_timestamp, sse_event, success_response
 from utils.logger import get_logger
 
 logger = get_logger('analysis_routes')
@@ -42,6 +43,32 @@ async def create_analysis_report(payload: AnalysisRequest):
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@analysis_router.post('/stream')
+async def stream_analysis_report(payload: AnalysisRequest):
+    logger.info(f'POST /api/analysis/stream {payload.code}')
+    try:
+        prepared = await PriceActionService.prepare_analysis(
+            code=payload.code,
+            count=payload.count,
+            period=payload.period,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except Exception as exc:
+        logger.error(f'POST /api/analysis/stream failed: {exc}')
+        raise HTTPException(status_code=500, detail=str(exc))
+
+    async def events():
+        async for event, data in PriceActionService.stream_analysis(prepared):
+            yield sse_event(event, data)
+
+    return StreamingResponse(
+        events(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 @analysis_router.delete('/{report_id}')
 async def delete_analysis_report(report_id: int):
     logger.info(f'DELETE /api/analysis/{report_id}')
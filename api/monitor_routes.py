@@ -1,44 +1,20 @@
-import threading
-import time
-
 from api.route_helpers import bool_status_response
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from schemas.monitor import MonitorStockCreate, MonitorStockUpdate, ToggleStock, UpdateKline
 from services.monitor_service import MonitorService
-from utils.api_helpers import current_timestamp, success_response
+from utils.api_helpers import success_response
 from utils.logger import get_logger
 
 logger = get_logger('monitor_routes')
 
 monitor_router = APIRouter()
 
-_monitor_cache = {
-    'data': None,
-    'timestamp': None,
-    'lock': threading.Lock(),
-}
-_CACHE_TTL = 60
-
-
 @monitor_router.get('')
 async def get_monitor():
     logger.info('GET /api/monitor')
     try:
-        current_time = time.time()
-        with _monitor_cache['lock']:
-            if (
-                _monitor_cache['data'] is not None
-                and _monitor_cache['timestamp'] is not None
-                and current_time - _monitor_cache['timestamp'] < _CACHE_TTL
-            ):
-                return _monitor_cache['data']
-
-        stocks = await MonitorService.get_enriched_monitor_data()
-        result = success_response(timestamp=current_timestamp(), stocks=stocks, clean_nan=True)
-        with _monitor_cache['lock']:
-            _monitor_cache['data'] = result
-            _monitor_cache['timestamp'] = current_time
-        return result
+        snapshot = await MonitorService.get_monitor_snapshot()
+        return Response(snapshot.monitor_body, media_type='application/json')
     except Exception as exc:
         logger.error(f'GET /api/monitor failed: {exc}')
         raise HTTPException(status_code=500, detail=str(exc))
@@ -96,7 +72,7 @@ async def update_kline(data: UpdateKline):
         from services.kline_service import KlineService
 
         asyncio.create_task(
-            KlineService.batch_update_kline_async(force_update=data.force_update, max_concurrent=3)
+            KlineService.batch_update_kline_async(force_update=data.force_update)
         )
         return success_response(message='K线更新任务已启动')
     except Exception as exc:
@@ -1,6 +1,6 @@
 ﻿from fastapi import APIRouter, HTTPException
 
-from api.route_helpers import bool_status_response
+from api.route_helpers import bool_status_response, refresh_monitor_snapshot
 from repositories.portfolio_repository import StockRepository
 from schemas.portfolio import PortfolioStockCreate, PortfolioStockUpdate
 from services.portfolio_service import PortfolioService
@@ -32,6 +32,7 @@ async def get_portfolio():
 async def create_stock(data: PortfolioStockCreate):
     logger.info(f'POST /api/portfolio {data.code}')
     success, msg = await StockRepository.add(data.code, data.name, data.cost_price, data.shares)
+    refresh_monitor_snapshot(success)
     return bool_status_response(success, msg, msg)
 
 
@@ -39,6 +40,7 @@ async def create_stock(data: PortfolioStockCreate):
 async def update_stock(code: str, data: PortfolioStockUpdate):
     logger.info(f'PUT /api/portfolio/{code}')
     success = await StockRepository.update(code, data.name, data.cost_price, data.shares)
+    refresh_monitor_snapshot(success)
     return bool_status_response(success, '更新成功', '更新失败')
 
 
@@ -46,4 +48,5 @@ async def update_stock(code: str, data: PortfolioStockUpdate):
 async def delete_stock(code: str):
     logger.info(f'DELETE /api/portfolio/{code}')
     success = await StockRepository.delete(code)
+    refresh_monitor_snapshot(success)
     return bool_status_response(success, '删除成功', '删除失败')
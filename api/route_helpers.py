@@ -14,3 +14,11 @@ def list_response(items: Iterable[Any], *, clean_nan: bool = True) -> dict[str,
 
 def bool_status_response(success: bool, success_message: str, error_message: str) -> dict[str, str]:
     return status_message_response(success, success_message, error_message)
+
+
+def refresh_monitor_snapshot(success: bool) -> None:
+    """持仓或监控股票变更成功后重建监控快照，首页与监控页不必等到下一次定时刷新"""
+    if success:
+        from services.monitor_snapshot_service import MonitorSnapshotService
+
+        MonitorSnapshotService.request_rebuild()
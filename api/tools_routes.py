@@ -53,15 +53,15 @@ async def get_export_stocks():
         from repositories.monitor_repository import MonitorStockRepository
 
         stocks = await MonitorStockRepository.get_enabled()
-        result = []
-        for stock in stocks:
-            result.append(
-                {
-                    'code': stock.code,
-                    'name': stock.name,
-                    'latest_date': await KlineRepository.get_latest_date(stock.code),
-                }
-            )
+        latest_dates = await KlineRepository.get_latest_dates_batch([stock.code for stock in stocks])
+        result = [
+            {
+                'code': stock.code,
+                'name': stock.name,
+                'latest_date': latest_dates.get(stock.code),
+            }
+            for stock in stocks
+        ]
 
         return success_response(data=result, clean_nan=True)
     except Exception as exc:
@@ -78,14 +78,14 @@ async def export_kline(data: ExportKlineRequest):
         if data.format not in {'csv', 'excel'}:
             raise HTTPException(status_code=400, detail='不支持的导出格式')
 
-        from repositories.kline_repository import KlineRepository
         from repositories.monitor_repository import MonitorStockRepository
+        from services.kline_service import KlineService
 
         stock = await MonitorStockRepository.get_by_code(data.code)
         stock_name = stock.name if stock else data.code
         logger.info(f'export kline for {stock_name} ({data.code})')
 
-        dataframe = await KlineRepository.export_kline_data(data.code, data.start_date, data.end_date)
+        dataframe = await KlineService.get_export_frame(data.code, data.start_date, data.end_date)
         if dataframe is None or dataframe.empty:
             raise HTTPException(status_code=400, detail='没有可导出的数据')
 
@@ -11,8 +11,12 @@ from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 
 from api.router_registry import register_api_routers
+from repositories.schema_migrations import run_migrations
 from utils.db import DatabaseUnavailableError, close_db_pool, init_db_pool
 from utils.logger import get_logger
+from utils.compute_executor import get_compute_executor, shutdown_compute_executor
+from utils.http_clients import close_http_clients, get_http_clients
+from utils.market_data_executor import shutdown_market_data_executor
 from utils.template_renderer import render_page
 
 load_dotenv()
@@ -24,18 +28,35 @@ async def lifespan(app: FastAPI):
     try:
         await init_db_pool()
         logger.info('数据库连接池已初始化')
+        # 表结构只在启动时迁移一次，请求路径上的仓储层不再执行 DDL
+        await run_migrations()
     except DatabaseUnavailableError:
         logger.warning('数据库不可用，服务将以降级模式启动')
 
+    # 行情、雪球与大模型调用共用的 HTTP 连接池，在服务事件循环上复用 keep-alive 连接
+    get_http_clients()
     start_background_tasks()
+    # 计算进程采用 spawn 启动，提前拉起，避免首个分析请求承担进程启动与模块导入的耗时
+    asyncio.create_task(get_compute_executor().warm_up())
 
     from services.scheduler_service import SchedulerService
 
+    from services.eps_service import EpsService
+    from services.kline_service import KlineService
+    from services.monitor_cache_service import MonitorCacheService
+    from services.monitor_snapshot_service import SNAPSHOT_INTERVAL, MonitorSnapshotService
+
     SchedulerService.start()
 
-    if os.getenv('AUTO_UPDATE_KLINE', 'true').lower() == 'true':
-        from services.kline_service import KlineService
+    # 监控快照在后台构建，/api/monitor 与 /api/dashboard 只读取已发布的版本
+    SchedulerService.add_interval_job(
+        MonitorSnapshotService.refresh_if_due,
+        seconds=SNAPSHOT_INTERVAL,
+        job_id='monitor_snapshot_refresh',
+    )
+    asyncio.create_task(MonitorSnapshotService.warm_up())
 
+    if os.getenv('AUTO_UPDATE_KLINE', 'true').lower() == 'true':
         SchedulerService.add_cron_job(
             KlineService.auto_update_kline_data,
             hour=15,
@@ -43,6 +64,28 @@ async def lifespan(app: FastAPI):
             job_id='daily_kline_update',
         )
 
+    SchedulerService.add_cron_job(
+        KlineService.maintain_partitions_async,
+        hour=3,
+        minute=30,
+        job_id='kline_partition_maintenance',
+    )
+
+    # EPS 每晚预取，监控数据只读缓存
+    SchedulerService.add_cron_job(
+        EpsService.prefetch_all,
+        hour=2,
+        minute=0,
+        job_id='nightly_eps_prefetch',
+    )
+
+    SchedulerService.add_cron_job(
+        MonitorCacheService.clean_expired,
+        hour=3,
+        minute=40,
+        job_id='monitor_cache_cleanup',
+    )
+
     if os.getenv('AUTO_UPDATE_STOCK_LIST', 'true').lower() == 'true':
         from services.stock_list_service import StockListService
 
@@ -56,6 +99,9 @@ async def lifespan(app: FastAPI):
     yield
 
     SchedulerService.shutdown()
+    shutdown_market_data_executor()
+    shutdown_compute_executor()
+    await close_http_clients()
     await close_db_pool()
     logger.info('数据库连接池已关闭')
 
@@ -0,0 +1,110 @@
+"""价格行为分析数据构造微基准：iterrows 逐行构造与整列取整后一次 zip 的对比，以及提示词编码长度。
+
+纯 CPU 基准，不需要数据库。对每个K线根数分别统计构造耗时、JSON（indent=2）与 columnar 两种提示词编码的
+耗时和字符数，并校验新旧构造结果一致：
+
+    python benchmarks/bench_analysis_payload.py --bars 60 250 500
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.price_action_service import PriceActionService  # noqa: E402
+
+
+def build_frame(bars):
+    rng = np.random.default_rng(17)
+    close = 10 + np.abs(np.cumsum(rng.normal(0, 0.2, bars))) + 1
+    open_ = close * (1 + rng.normal(0, 0.01, bars))
+    return pd.DataFrame({
+        'date': pd.bdate_range('2020-01-01', periods=bars),
+        'open': open_,
+        'close': close,
+        'high': np.maximum(open_, close) * 1.01,
+        'low': np.minimum(open_, close) * 0.99,
+        'volume': rng.integers(1e5, 1e7, bars),
+        'amount': close * 1e6,
+    })
+
+
+def legacy_payload(df, code, stock_name, period, count):
+    """改造前 _build_analysis_payload 的逐行构造"""
+    df = df.copy()
+    df['ema20'] = PriceActionService._compute_ema(df['close'], span=20).round(2)
+    df['ema20_slope'] = (df['ema20'].pct_change() * 100).round(3).fillna(0)
+    ema_safe = df['ema20'].replace(0, float('nan'))
+    df['ema20_distance'] = (((df['close'] - df['ema20']) / ema_safe) * 100).round(2).fillna(0)
+    df = PriceActionService._compute_bar_metrics(df)
+    df['bar_type'] = PriceActionService._classify_bar_type(df)
+    df['gap'] = PriceActionService._detect_gaps(df)
+    if len(df) > count:
+        df = df.tail(count).reset_index(drop=True)
+
+    klines = []
+    for _, row in df.iterrows():
+        item = {
+            'date': row['date'].strftime('%Y-%m-%d') if hasattr(row['date'], 'strftime') else str(row['date']),
+            'open': round(float(row['open']), 2),
+            'high': round(float(row['high']), 2),
+            'low': round(float(row['low']), 2),
+            'close': round(float(row['close']), 2),
+            'volume': round(float(row.get('volume', 0))),
+            'amount': round(float(row.get('amount', 0)), 2),
+            'change_pct': round(float(row.get('change_pct', 0)), 2) if 'change_pct' in row else 0,
+            'turnover': round(float(row.get('turnover', 0)), 2) if 'turnover' in row else 0,
+            'amplitude': round(float(row.get('amplitude', 0)), 2) if 'amplitude' in row else round(((row['high'] - row['low']) / row['close']) * 100, 2) if row['close'] else 0,
+            'ema20': float(row['ema20']),
+            'ema20_slope': float(row['ema20_slope']),
+            'ema20_distance': float(row['ema20_distance']),
+            'body_ratio': float(row['body_ratio']),
+            'upper_wick_ratio': float(row['upper_wick_ratio']),
+            'lower_wick_ratio': float(row['lower_wick_ratio']),
+            'close_position': float(row['close_position']),
+            'bar_type': row['bar_type'],
+        }
+        if pd.notna(row.get('gap')):
+            item['gap'] = row['gap']
+        klines.append(item)
+
+    return {'code': code, 'name': stock_name, 'period': period, 'count': len(klines), 'klines': klines}
+
+
+def timed(func, *args, repeat=20):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bars', type=int, nargs='+', default=[60, 250, 500])
+    args = parser.parse_args()
+
+    for bars in args.bars:
+        # 与数据库取数一致：多取预热K线，只输出最后 bars 根
+        df = build_frame(max(bars * 6, 300))
+        legacy, slow = timed(legacy_payload, df, '600000', 'bench', 'daily', bars)
+        payload, fast = timed(PriceActionService._build_analysis_payload, df, '600000', 'bench', 'daily', bars)
+        assert json.dumps(legacy, ensure_ascii=False) == json.dumps(payload, ensure_ascii=False)
+
+        as_json, json_ms = timed(PriceActionService._encode_kline_data, payload, 'json')
+        as_columnar, columnar_ms = timed(PriceActionService._encode_kline_data, payload, 'columnar')
+        print(f'bars={bars:>4}  iterrows={slow:7.2f}ms  vectorized={fast:6.2f}ms  speedup={slow / fast:5.1f}x  '
+              f'json={len(as_json):>7,} chars/{json_ms:5.2f}ms  '
+              f'columnar={len(as_columnar):>6,} chars/{columnar_ms:5.2f}ms  '
+              f'ratio={len(as_columnar) / len(as_json):.2f}')
+
+
+if __name__ == '__main__':
+    main()
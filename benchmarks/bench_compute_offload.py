@@ -0,0 +1,152 @@
+"""计算进程池压测：20 个价格行为分析并发计算时 /api/portfolio 的延迟分布。
+
+在同一进程内用 uvicorn 启动 API，另起线程持续请求 /api/portfolio，同时在服务端事件循环里
+并发执行 20 个分析的取数与指标计算（PriceActionService.fetch_kline_data，分析中 CPU 密集的部分；
+大模型调用是纯网络等待，不计入）。分别以 inline（COMPUTE_WORKERS=0，计算跑在事件循环线程）
+和进程池两种方式运行，对比 p50 / p99 / max。
+
+持仓接口的实时行情替换为固定报价，只测事件循环本身是否被阻塞。需要可用的 PostgreSQL（读取 PG_* 环境变量），
+基准使用 benchco 前缀的虚拟代码写入 stock_kline_data，结束后删除：
+
+    python benchmarks/bench_compute_offload.py --analyses 20 --rounds 3 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+import httpx
+import numpy as np
+import pandas as pd
+import uvicorn
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.compute_executor as compute_executor  # noqa: E402
+from api.router_registry import register_api_routers  # noqa: E402
+from repositories.kline_repository import KlineRepository  # noqa: E402
+from services.portfolio_service import PortfolioService  # noqa: E402
+from services.price_action_service import PriceActionService  # noqa: E402
+from utils.db import close_db_pool, get_db_conn, init_db_pool  # noqa: E402
+from utils.kline_store import get_kline_store  # noqa: E402
+
+PREFIX = 'benchco'
+
+
+async def fixed_quote(session, stock_code):
+    return stock_code, 10.0, 0.5, 5.0
+
+
+def build_kline_data(codes, bars):
+    dates = pd.bdate_range('2018-01-01', periods=bars)
+    rng = np.random.default_rng(5)
+    result = {}
+    for code in codes:
+        close = 10 + np.abs(np.cumsum(rng.normal(0, 0.1, bars))) + 1
+        result[code] = pd.DataFrame({
+            '日期': dates,
+            '开盘': close,
+            '收盘': close,
+            '最高': close * 1.01,
+            '最低': close * 0.99,
+            'amount': close * 1e6,
+        })
+    return result
+
+
+async def cleanup():
+    async with get_db_conn() as conn:
+        await conn.execute('DELETE FROM stock_kline_data WHERE code LIKE $1', f'{PREFIX}%')
+        await conn.execute('DELETE FROM kline_coverage WHERE code LIKE $1', f'{PREFIX}%')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def poll_portfolio(url, stop, latencies):
+    """独立线程里按固定间隔请求持仓接口，记录每次往返耗时"""
+    with httpx.Client(timeout=30) as client:
+        while not stop.is_set():
+            start = time.perf_counter()
+            client.get(url).raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.01)
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float('nan')
+
+
+async def run_mode(label, workers, url, codes, args):
+    compute_executor.shutdown_compute_executor()
+    compute_executor._executor = compute_executor.ComputeExecutor('compute', workers)
+    await compute_executor.get_compute_executor().warm_up()
+
+    stop = threading.Event()
+    latencies = []
+    poller = threading.Thread(target=poll_portfolio, args=(url, stop, latencies))
+    poller.start()
+    await asyncio.sleep(0.5)
+    idle = len(latencies)
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        get_kline_store().invalidate()
+        await asyncio.gather(*(
+            PriceActionService.fetch_kline_data(code, args.count, 'daily') for code in codes
+        ))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await asyncio.to_thread(poller.join)
+    loaded = latencies[idle:]
+    print(f'{label:<10} analyses={len(codes) * args.rounds:>4}  wall={elapsed:6.2f}s  '
+          f'requests={len(loaded):>4}  p50={statistics.median(loaded):7.1f}ms  '
+          f'p99={percentile(loaded, 99):7.1f}ms  max={max(loaded):7.1f}ms')
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--analyses', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--bars', type=int, default=2000)
+    parser.add_argument('--count', type=int, default=250)
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    PortfolioService._fetch_stock_price = staticmethod(fixed_quote)
+    await init_db_pool()
+    codes = [f'{PREFIX}{i:06d}' for i in range(args.analyses)]
+    await cleanup()
+    await KlineRepository.save_all_batch(build_kline_data(codes, args.bars))
+
+    app = FastAPI()
+    register_api_routers(app)
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    url = f'http://127.0.0.1:{port}/api/portfolio'
+    try:
+        await run_mode('inline', 0, url, codes, args)
+        await run_mode('process', args.workers, url, codes, args)
+    finally:
+        server.should_exit = True
+        await server_task
+        compute_executor.shutdown_compute_executor()
+        await cleanup()
+        await close_db_pool()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
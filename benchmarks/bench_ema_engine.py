@@ -0,0 +1,69 @@
+"""EMA 批量计算微基准：逐只股票逐个周期 pandas ewm 与 multi_span_ema 一次矩阵乘法对比。
+
+纯 CPU 基准，不需要数据库。各股票历史长度随机（参差不齐），周期取日K监控用的 144/188/5/10/20：
+
+    python benchmarks/bench_ema_engine.py --codes 50 500 5000 --min-bars 200 --max-bars 1500
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ema_state_service import MONITOR_EMA_SPANS  # noqa: E402
+from services.indicator_engine import multi_span_ema, right_align  # noqa: E402
+
+SPANS = MONITOR_EMA_SPANS['1d']
+
+
+def build_series(codes, min_bars, max_bars):
+    rng = np.random.default_rng(13)
+    lengths = rng.integers(min_bars, max_bars + 1, codes)
+    return [10 + np.abs(np.cumsum(rng.normal(0, 0.1, n))) + 1 for n in lengths]
+
+
+def pandas_path(series_list):
+    """改造前：DataService.calculate_ema 的做法，每只股票每个周期一次 ewm"""
+    return np.array([
+        [pd.Series(closes).ewm(span=span, adjust=False).mean().iloc[-1] for span in SPANS]
+        for closes in series_list
+    ])
+
+
+def engine_path(series_list):
+    matrix, lengths = right_align(series_list)
+    return multi_span_ema(matrix, lengths, SPANS)[0]
+
+
+def timed(func, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--codes', type=int, nargs='+', default=[50, 500, 5000])
+    parser.add_argument('--min-bars', type=int, default=200)
+    parser.add_argument('--max-bars', type=int, default=1500)
+    args = parser.parse_args()
+
+    for codes in args.codes:
+        series_list = build_series(codes, args.min_bars, args.max_bars)
+        expected, slow = timed(pandas_path, series_list, repeat=1)
+        actual, fast = timed(engine_path, series_list)
+        diff = float(np.max(np.abs(expected - actual)))
+        print(f'codes={codes:>5}  pandas={slow * 1000:9.1f}ms  engine={fast * 1000:8.1f}ms  '
+              f'speedup={slow / fast:6.1f}x  max_diff={diff:.1e}')
+
+
+if __name__ == '__main__':
+    main()
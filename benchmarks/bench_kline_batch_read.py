@@ -0,0 +1,165 @@
+"""K 线批量读取基准：监控场景 50 只股票 x 最近 1000 根的几种取数方式对比。
+
+对比逐行取全部历史再在 Python 截断、array_agg 全量聚合后截断、ROW_NUMBER 窗口函数、
+LATERAL top-N（KlineRepository.get_batch_by_codes 当前实现）四种方式。
+需要可用的 PostgreSQL（读取 PG_* 环境变量）。基准使用 bench 前缀的虚拟代码写入 stock_kline_data，
+结束后删除，不影响真实 K 线：
+
+    python benchmarks/bench_kline_batch_read.py --codes 50 --history 3000 --limit 1000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repositories.kline_repository import KLINE_FRAME_COLUMNS, KlineRepository  # noqa: E402
+from utils.db import close_db_pool, get_db_conn, init_db_pool  # noqa: E402
+
+PREFIX = 'benchrd'
+
+ARRAY_COLUMNS = '''array_agg(date ORDER BY date) AS dates,
+                   array_agg(open ORDER BY date) AS opens,
+                   array_agg(close ORDER BY date) AS closes,
+                   array_agg(high ORDER BY date) AS highs,
+                   array_agg(low ORDER BY date) AS lows,
+                   array_agg(volume ORDER BY date) AS volumes,
+                   array_agg(amount ORDER BY date) AS amounts'''
+
+
+def build_kline_data(codes, bars):
+    """构造 {code: DataFrame}，列名与 akshare 重命名后的结构一致"""
+    dates = pd.bdate_range('2014-01-01', periods=bars)
+    rng = np.random.default_rng(11)
+    result = {}
+    for code in codes:
+        close = 10 + np.abs(np.cumsum(rng.normal(0, 0.1, bars))) + 1
+        result[code] = pd.DataFrame({
+            '日期': dates,
+            '开盘': close,
+            '收盘': close,
+            '最高': close * 1.01,
+            '最低': close * 0.99,
+            'amount': close * 1e6,
+        })
+    return result
+
+
+async def read_rows(codes, limit):
+    """改造前：取回全部历史，逐行构造字典，再在 Python 里截断"""
+    async with get_db_conn() as conn:
+        rows = await conn.fetch(
+            '''SELECT code, date, open, close, high, low, volume, amount
+               FROM stock_kline_data
+               WHERE code = ANY($1)
+               ORDER BY code, date DESC''',
+            codes
+        )
+    code_data = {}
+    for row in rows:
+        code_data.setdefault(row['code'], []).append({
+            'date': row['date'], 'open': row['open'], 'close': row['close'], 'high': row['high'],
+            'low': row['low'], 'volume': row['volume'], 'amount': row['amount'],
+        })
+    result = {}
+    for code in codes:
+        df = pd.DataFrame(code_data[code][:limit])
+        df.columns = KLINE_FRAME_COLUMNS
+        result[code] = df.iloc[::-1]
+    return result
+
+
+async def read_agg_all(codes, limit):
+    """按股票 array_agg 全部历史，在 Python 里截取最后 limit 条"""
+    async with get_db_conn() as conn:
+        rows = await conn.fetch(
+            f'''SELECT code, {ARRAY_COLUMNS}
+                FROM stock_kline_data
+                WHERE code = ANY($1)
+                GROUP BY code''',
+            codes
+        )
+    result = {}
+    for row in rows:
+        row = {key: value[-limit:] if key != 'code' else value for key, value in dict(row).items()}
+        result[row['code']] = KlineRepository._frame_from_arrays(row)
+    return result
+
+
+async def read_row_number(codes, limit):
+    """ROW_NUMBER() OVER (PARTITION BY code) 过滤后再聚合"""
+    async with get_db_conn() as conn:
+        rows = await conn.fetch(
+            f'''SELECT code, {ARRAY_COLUMNS}
+                FROM (
+                    SELECT code, date, open, close, high, low, volume, amount,
+                           ROW_NUMBER() OVER (PARTITION BY code ORDER BY date DESC) AS rn
+                    FROM stock_kline_data
+                    WHERE code = ANY($1)
+                ) AS ranked
+                WHERE rn <= $2
+                GROUP BY code''',
+            codes, limit
+        )
+    return {row['code']: KlineRepository._frame_from_arrays(row) for row in rows}
+
+
+async def read_lateral(codes, limit):
+    return await KlineRepository.get_batch_by_codes(codes, limit=limit)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--codes', type=int, default=50)
+    parser.add_argument('--history', type=int, default=3000, help='每只股票的历史 K 线根数')
+    parser.add_argument('--limit', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    codes = [f'{PREFIX}{i:06d}' for i in range(args.codes)]
+    variants = [
+        ('rows+slice', read_rows),
+        ('agg+slice', read_agg_all),
+        ('row_number', read_row_number),
+        ('lateral', read_lateral),
+    ]
+
+    await init_db_pool()
+    try:
+        data = build_kline_data(codes, args.history)
+        for i in range(0, len(codes), 10):
+            await KlineRepository.save_all_batch({code: data[code] for code in codes[i:i + 10]})
+        async with get_db_conn() as conn:
+            await conn.execute('ANALYZE stock_kline_data')
+        print(f'{args.codes} codes x {args.history} bars history, limit {args.limit}, {args.repeat} runs each')
+
+        reference = await read_lateral(codes, args.limit)
+        for label, func in variants:
+            frames = await func(codes, args.limit)
+            for code in codes:
+                got = frames[code].reset_index(drop=True)
+                assert len(got) == args.limit, (label, code, len(got))
+                assert np.array_equal(got['收盘'].to_numpy(dtype=np.float64), reference[code]['收盘'].to_numpy())
+                assert (pd.to_datetime(got['日期']).to_numpy() == reference[code]['日期'].to_numpy()).all()
+
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                await func(codes, args.limit)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f'{label:<12} median {statistics.median(timings):8.1f}ms   min {min(timings):8.1f}ms')
+    finally:
+        async with get_db_conn() as conn:
+            await conn.execute('DELETE FROM stock_kline_data WHERE code LIKE $1', f'{PREFIX}%')
+            await conn.execute('DELETE FROM kline_coverage WHERE code LIKE $1', f'{PREFIX}%')
+        await close_db_pool()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
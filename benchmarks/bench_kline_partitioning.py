@@ -0,0 +1,182 @@
+"""K 线表布局基准：旧索引单表、精简索引单表、按年分区表的写入与查询对比。
+
+需要可用的 PostgreSQL（读取 PG_* 环境变量），并已执行 sql/init_postgres.sql
+（分区表通过 create_stock_kline_partitioned_table 创建）。基准在 bench_kline_* 临时表上运行，
+结束后删除，不影响真实 K 线。默认 5000 只 x 2000 根 = 1000 万行：
+
+    python benchmarks/bench_kline_partitioning.py --codes 5000 --bars 2000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repositories.kline_repository import KLINE_COLUMNS, KlineRepository  # noqa: E402
+from utils.db import close_db_pool, get_db_conn, init_db_pool  # noqa: E402
+
+TYPED_COLUMNS_DDL = '''
+    code TEXT NOT NULL,
+    date DATE NOT NULL,
+    open DOUBLE PRECISION NOT NULL,
+    close DOUBLE PRECISION NOT NULL,
+    high DOUBLE PRECISION NOT NULL,
+    low DOUBLE PRECISION NOT NULL,
+    volume BIGINT NOT NULL,
+    amount DOUBLE PRECISION NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+'''
+
+LAYOUTS = {
+    # 改造前：UNIQUE(code, date) 之外还有四个重叠索引
+    'flat+4idx': [
+        f'CREATE TABLE bench_kline_flat4 (id BIGSERIAL PRIMARY KEY, {TYPED_COLUMNS_DDL}, UNIQUE (code, date))',
+        'CREATE INDEX bench_kline_flat4_code ON bench_kline_flat4(code)',
+        'CREATE INDEX bench_kline_flat4_code_date ON bench_kline_flat4(code, date)',
+        'CREATE INDEX bench_kline_flat4_date ON bench_kline_flat4(date)',
+        'CREATE INDEX bench_kline_flat4_created ON bench_kline_flat4(created_at)',
+    ],
+    'flat': [
+        f'CREATE TABLE bench_kline_flat (id BIGSERIAL PRIMARY KEY, {TYPED_COLUMNS_DDL}, UNIQUE (code, date))',
+    ],
+    'partitioned': [
+        "SELECT create_stock_kline_partitioned_table('bench_kline_part', {from_year})",
+    ],
+}
+TABLES = {'flat+4idx': 'bench_kline_flat4', 'flat': 'bench_kline_flat', 'partitioned': 'bench_kline_part'}
+
+
+def build_chunk(codes, dates, seed):
+    """构造一批 {code: DataFrame}，列名与 akshare 重命名后的结构一致"""
+    rng = np.random.default_rng(seed)
+    result = {}
+    for code in codes:
+        close = 10 + np.abs(np.cumsum(rng.normal(0, 0.1, len(dates)))) + 1
+        result[code] = pd.DataFrame({
+            '日期': dates,
+            '开盘': close * 0.995,
+            '收盘': close,
+            '最高': close * 1.01,
+            '最低': close * 0.99,
+            'amount': close * 1e6,
+        })
+    return result
+
+
+async def upsert(conn, table, kline_data):
+    """与 KlineRepository._upsert_with_copy 相同的 COPY + 临时表合并，只是目标表可变"""
+    records = []
+    for code, df in kline_data.items():
+        records.extend(KlineRepository._build_insert_records(code, df))
+    async with conn.transaction():
+        await conn.execute(
+            f'CREATE TEMP TABLE bench_staging (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP'
+        )
+        await conn.copy_records_to_table('bench_staging', records=records, columns=KLINE_COLUMNS)
+        await conn.execute(
+            f'''INSERT INTO {table} (code, date, open, close, high, low, volume, amount, updated_at)
+                SELECT code, date, open, close, high, low, volume, amount, CURRENT_TIMESTAMP
+                FROM bench_staging
+                ON CONFLICT (code, date) DO UPDATE
+                SET open = EXCLUDED.open, close = EXCLUDED.close, high = EXCLUDED.high,
+                    low = EXCLUDED.low, volume = EXCLUDED.volume, amount = EXCLUDED.amount,
+                    updated_at = CURRENT_TIMESTAMP'''
+        )
+    return len(records)
+
+
+async def timed_queries(conn, table, sample_codes, last_dates):
+    timings = {}
+
+    start = time.perf_counter()
+    for code in sample_codes:
+        await conn.fetch(
+            f'SELECT * FROM {table} WHERE code = $1 ORDER BY date DESC LIMIT 250', code
+        )
+    timings['latest250 x code'] = (time.perf_counter() - start) / len(sample_codes) * 1000
+
+    start = time.perf_counter()
+    await conn.fetch(
+        f'SELECT code, MAX(date) FROM {table} WHERE code = ANY($1) GROUP BY code', sample_codes
+    )
+    timings['max(date) batch'] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    await conn.fetchval(
+        f'SELECT AVG(close) FROM {table} WHERE date BETWEEN $1 AND $2', last_dates[0], last_dates[-1]
+    )
+    timings['last 20d all codes'] = (time.perf_counter() - start) * 1000
+    return timings
+
+
+async def run_layout(name, args, all_codes, dates):
+    table = TABLES[name]
+    async with get_db_conn() as conn:
+        await conn.execute(f'DROP TABLE IF EXISTS {table} CASCADE')
+        for ddl in LAYOUTS[name]:
+            await conn.execute(ddl.format(from_year=dates[0].year))
+
+        start = time.perf_counter()
+        rows = 0
+        for i in range(0, len(all_codes), args.chunk):
+            rows += await upsert(conn, table, build_chunk(all_codes[i:i + args.chunk], dates, seed=i))
+        ingest = time.perf_counter() - start
+
+        # 日常增量：每只股票重写最近 5 根并新增 1 根（update + insert 混合）
+        next_dates = pd.bdate_range(dates[-5], periods=6)
+        start = time.perf_counter()
+        daily_rows = 0
+        for i in range(0, len(all_codes), args.chunk):
+            daily_rows += await upsert(conn, table, build_chunk(all_codes[i:i + args.chunk], next_dates, seed=args.codes + i))
+        daily = time.perf_counter() - start
+
+        await conn.execute(f'ANALYZE {table}')
+        sample = random.Random(7).sample(all_codes, min(200, len(all_codes)))
+        last_dates = [d.date() for d in dates[-20:]]
+        await timed_queries(conn, table, sample, last_dates)  # 预热缓存
+        queries = await timed_queries(conn, table, sample, last_dates)
+        size = await conn.fetchval(
+            '''SELECT pg_size_pretty(SUM(pg_total_relation_size(oid))) FROM pg_class
+               WHERE oid = to_regclass($1)
+                  OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass($1))''',
+            table
+        )
+        if not args.keep:
+            await conn.execute(f'DROP TABLE IF EXISTS {table} CASCADE')
+
+    print(
+        f'{name:<12} ingest {rows / ingest:>10,.0f} rows/s   daily upsert {daily_rows / daily:>10,.0f} rows/s   '
+        f'size {size:>8}   ' + '   '.join(f'{k} {v:7.2f}ms' for k, v in queries.items())
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--codes', type=int, default=5000)
+    parser.add_argument('--bars', type=int, default=2000)
+    parser.add_argument('--chunk', type=int, default=100, help='每次 upsert 的股票数')
+    parser.add_argument('--layouts', nargs='+', choices=list(LAYOUTS), default=list(LAYOUTS))
+    parser.add_argument('--keep', action='store_true', help='保留基准表')
+    args = parser.parse_args()
+
+    all_codes = [f'bench{i:06d}' for i in range(args.codes)]
+    dates = pd.bdate_range('2018-01-01', periods=args.bars)
+    print(f'{args.codes} codes x {args.bars} bars = {args.codes * args.bars:,} rows, {dates[0].date()} ~ {dates[-1].date()}')
+
+    await init_db_pool()
+    try:
+        for name in args.layouts:
+            await run_layout(name, args, all_codes, dates)
+    finally:
+        await close_db_pool()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+"""K 线批量写入基准：executemany 逐行 upsert 与 COPY + 临时表合并对比。
+
+需要可用的 PostgreSQL（读取 PG_* 环境变量）。基准使用 bench 前缀的虚拟代码，
+结束后会删除写入的数据，不影响真实 K 线。
+
+    python benchmarks/bench_kline_upsert.py --codes 200 --bars 1200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repositories.kline_repository import KlineRepository  # noqa: E402
+from utils.db import close_db_pool, get_db_conn, init_db_pool  # noqa: E402
+
+
+def build_kline_data(prefix, codes, bars):
+    """构造 {code: DataFrame}，列名与 akshare 重命名后的结构一致"""
+    dates = pd.bdate_range('2021-01-04', periods=bars)
+    rng = np.random.default_rng(7)
+    result = {}
+    for i in range(codes):
+        close = 10 + np.abs(np.cumsum(rng.normal(0, 0.1, bars))) + 1
+        open_ = close * (1 + rng.normal(0, 0.005, bars))
+        high = np.maximum(open_, close) * 1.01
+        low = np.minimum(open_, close) * 0.99
+        result[f'{prefix}{i:06d}'] = pd.DataFrame({
+            '日期': dates,
+            '开盘': open_,
+            '收盘': close,
+            '最高': high,
+            '最低': low,
+            'amount': close * 1e6,
+        })
+    return result
+
+
+async def cleanup(prefix):
+    async with get_db_conn() as conn:
+        await conn.execute('DELETE FROM stock_kline_data WHERE code LIKE $1', f'{prefix}%')
+        await conn.execute('DELETE FROM kline_coverage WHERE code LIKE $1', f'{prefix}%')
+
+
+async def run_once(label, prefix, codes, bars, use_copy):
+    data = build_kline_data(prefix, codes, bars)
+    await cleanup(prefix)
+    start = time.perf_counter()
+    _, _, records = await KlineRepository.save_all_batch(data, use_copy=use_copy)
+    elapsed = time.perf_counter() - start
+    await cleanup(prefix)
+    print(f'{label:<12} rows={records:>9,}  elapsed={elapsed:8.2f}s  rows/sec={records / elapsed:>12,.0f}')
+    return records / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--codes', type=int, default=200)
+    parser.add_argument('--bars', type=int, default=1200)
+    args = parser.parse_args()
+
+    await init_db_pool()
+    try:
+        slow = await run_once('executemany', 'benchem', args.codes, args.bars, use_copy=False)
+        fast = await run_once('copy', 'benchcp', args.codes, args.bars, use_copy=True)
+        print(f'speedup: {fast / slow:.1f}x')
+    finally:
+        await close_db_pool()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
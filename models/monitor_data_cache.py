@@ -1,6 +1,6 @@
 # models/monitor_data_cache.py
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
 
@@ -23,6 +23,8 @@ class MonitorDataCache:
     ema42: Optional[float]
     eps_forecast: Optional[float]
     created_at: datetime
+    ema_as_of: Optional[date] = None
+    eps_updated_at: Optional[datetime] = None
 
     def to_dict(self):
         """转换为字典"""
@@ -42,5 +44,7 @@ class MonitorDataCache:
             'ema21': self.ema21,
             'ema42': self.ema42,
             'eps_forecast': self.eps_forecast,
-            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
+            'ema_as_of': self.ema_as_of.isoformat() if self.ema_as_of else None,
+            'eps_updated_at': self.eps_updated_at.strftime('%Y-%m-%d %H:%M:%S') if self.eps_updated_at else None,
         }
\ No newline at end of file
@@ -0,0 +1,11 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class MonitorSnapshot:
+    version: int
+    built_at: str
+    stocks: tuple
+    dashboard: dict
+    monitor_body: bytes
+    dashboard_body: bytes
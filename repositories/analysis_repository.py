@@ -1,5 +1,6 @@
 import json
 
+from repositories.schema_migrations import ensure_schema
 from utils.db import get_db_conn
 from utils.logger import get_logger
 
@@ -8,62 +9,43 @@ logger = get_logger('analysis_repository')
 
 class AnalysisRepository:
     @staticmethod
-    async def ensure_table():
+    async def upsert_prompt_assets(assets: list[dict]) -> None:
+        """批量写入 prompt 资产，assets 每项含 asset_key / category / source_path / content / fingerprint"""
+        if not assets:
+            return
+        await ensure_schema()
         async with get_db_conn() as conn:
             await conn.execute(
                 '''
-                CREATE TABLE IF NOT EXISTS analysis_reports (
-                    id SERIAL PRIMARY KEY,
-                    code VARCHAR(20) NOT NULL,
-                    stock_name VARCHAR(100),
-                    period VARCHAR(20) NOT NULL,
-                    kline_count INTEGER NOT NULL,
-                    model_name VARCHAR(100) NOT NULL,
-                    prompt_text TEXT NOT NULL,
-                    input_payload JSONB NOT NULL,
-                    analysis_markdown TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-                '''
-            )
-            await conn.execute('CREATE INDEX IF NOT EXISTS idx_analysis_reports_created_at ON analysis_reports(created_at DESC)')
-            await conn.execute('CREATE INDEX IF NOT EXISTS idx_analysis_reports_code ON analysis_reports(code)')
-            await conn.execute(
-                '''
-                CREATE TABLE IF NOT EXISTS prompt_assets (
-                    asset_key VARCHAR(255) PRIMARY KEY,
-                    category VARCHAR(50) NOT NULL,
-                    source_path TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-                '''
-            )
-            await conn.execute('CREATE INDEX IF NOT EXISTS idx_prompt_assets_category ON prompt_assets(category)')
-
-    @staticmethod
-    async def upsert_prompt_asset(*, asset_key: str, category: str, source_path: str, content: str) -> None:
-        await AnalysisRepository.ensure_table()
-        async with get_db_conn() as conn:
-            await conn.execute(
-                '''
-                INSERT INTO prompt_assets (asset_key, category, source_path, content, updated_at)
-                VALUES ($1, $2, $3, $4, CURRENT_TIMESTAMP)
+                INSERT INTO prompt_assets (asset_key, category, source_path, content, fingerprint, updated_at)
+                SELECT asset_key, category, source_path, content, fingerprint, CURRENT_TIMESTAMP
+                FROM unnest($1::text[], $2::text[], $3::text[], $4::text[], $5::text[])
+                     AS u(asset_key, category, source_path, content, fingerprint)
                 ON CONFLICT (asset_key) DO UPDATE
                 SET category = EXCLUDED.category,
                     source_path = EXCLUDED.source_path,
                     content = EXCLUDED.content,
+                    fingerprint = EXCLUDED.fingerprint,
                     updated_at = CURRENT_TIMESTAMP
                 ''',
-                asset_key,
-                category,
-                source_path,
-                content,
+                [item['asset_key'] for item in assets],
+                [item['category'] for item in assets],
+                [item['source_path'] for item in assets],
+                [item['content'] for item in assets],
+                [item['fingerprint'] for item in assets],
             )
 
+    @staticmethod
+    async def list_prompt_asset_fingerprints() -> dict:
+        """{asset_key: fingerprint}，用于判断本地文件是否需要重新同步"""
+        await ensure_schema()
+        async with get_db_conn() as conn:
+            rows = await conn.fetch('SELECT asset_key, fingerprint FROM prompt_assets')
+            return {row['asset_key']: row['fingerprint'] for row in rows}
+
     @staticmethod
     async def list_prompt_assets() -> list[dict]:
-        await AnalysisRepository.ensure_table()
+        await ensure_schema()
         async with get_db_conn() as conn:
             rows = await conn.fetch(
                 '''
@@ -86,7 +68,7 @@ class AnalysisRepository:
         input_payload: dict,
         analysis_markdown: str,
     ) -> int:
-        await AnalysisRepository.ensure_table()
+        await ensure_schema()
         async with get_db_conn() as conn:
             row = await conn.fetchrow(
                 '''
@@ -108,7 +90,7 @@ class AnalysisRepository:
 
     @staticmethod
     async def list_reports(limit: int = 50) -> list[dict]:
-        await AnalysisRepository.ensure_table()
+        await ensure_schema()
         async with get_db_conn() as conn:
             rows = await conn.fetch(
                 '''
@@ -123,7 +105,7 @@ class AnalysisRepository:
 
     @staticmethod
     async def get_report(report_id: int) -> dict | None:
-        await AnalysisRepository.ensure_table()
+        await ensure_schema()
         async with get_db_conn() as conn:
             row = await conn.fetchrow(
                 '''
@@ -137,7 +119,7 @@ class AnalysisRepository:
 
     @staticmethod
     async def delete_report(report_id: int) -> bool:
-        await AnalysisRepository.ensure_table()
+        await ensure_schema()
         async with get_db_conn() as conn:
             result = await conn.execute('DELETE FROM analysis_reports WHERE id = $1', report_id)
             return result.endswith('1')
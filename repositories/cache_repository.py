@@ -1,7 +1,6 @@
 # repositories/cache_repository.py
 from utils.db import get_db_conn
 from utils.logger import get_logger
-from datetime import datetime, timezone
 
 logger = get_logger('cache_repository')
 
@@ -38,7 +37,9 @@ class MonitorDataCacheRepository:
                     'ema7': float,
                     'ema21': float,
                     'ema42': float,
-                    'eps_forecast': float
+                    'eps_forecast': float,
+                    'ema_as_of': date,            # 可选，EMA 对应的最新K线日期
+                    'eps_updated_at': datetime,   # 可选，EPS 的获取时间
                 }
         """
         if not cache_data_list:
@@ -65,15 +66,17 @@ class MonitorDataCacheRepository:
                         MonitorDataCacheRepository.convert_value(data['ema7']),
                         MonitorDataCacheRepository.convert_value(data['ema21']),
                         MonitorDataCacheRepository.convert_value(data['ema42']),
-                        MonitorDataCacheRepository.convert_value(data['eps_forecast'])
+                        MonitorDataCacheRepository.convert_value(data['eps_forecast']),
+                        data.get('ema_as_of'),
+                        data.get('eps_updated_at'),
                     ))
 
                 # 批量执行
                 await conn.executemany(
                     '''INSERT INTO monitor_data_cache
                        (code, timeframe, current_price, ema144, ema188, ema5, ema10, ema20,
-                        ema30, ema60, ema7, ema21, ema42, eps_forecast, created_at)
-                       VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, CURRENT_TIMESTAMP)
+                        ema30, ema60, ema7, ema21, ema42, eps_forecast, ema_as_of, eps_updated_at, created_at)
+                       VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, CURRENT_TIMESTAMP)
                        ON CONFLICT (code, timeframe) DO UPDATE
                        SET current_price = EXCLUDED.current_price,
                            ema144 = EXCLUDED.ema144,
@@ -87,6 +90,8 @@ class MonitorDataCacheRepository:
                            ema21 = EXCLUDED.ema21,
                            ema42 = EXCLUDED.ema42,
                            eps_forecast = EXCLUDED.eps_forecast,
+                           ema_as_of = EXCLUDED.ema_as_of,
+                           eps_updated_at = EXCLUDED.eps_updated_at,
                            created_at = CURRENT_TIMESTAMP''',
                     all_values
                 )
@@ -123,6 +128,8 @@ class MonitorDataCacheRepository:
     async def get_batch_by_code_and_timeframe(code_timeframe_pairs, max_age_minutes=5):
         """批量获取缓存数据
 
+        按 (code, timeframe) 配对查询（与 unnest 的配对数组做连接），有效期也在 SQL 中过滤，只返回仍然有效的行。
+
         Args:
             code_timeframe_pairs: 列表，每个元素是 (code, timeframe) 元组
             max_age_minutes: 缓存最大有效期（分钟）
@@ -136,59 +143,24 @@ class MonitorDataCacheRepository:
         logger.info(f"SQL: 批量查询 {len(code_timeframe_pairs)} 条缓存数据")
         from models.monitor_data_cache import MonitorDataCache
 
+        pairs = list(dict.fromkeys(code_timeframe_pairs))
         async with get_db_conn() as conn:
-            # 使用 IN 子句批量查询
-            codes = [pair[0] for pair in code_timeframe_pairs]
-            timeframes = [pair[1] for pair in code_timeframe_pairs]
-
-            # 查询所有匹配的记录
             rows = await conn.fetch(
-                '''SELECT id, code, timeframe, current_price, ema144, ema188,
-                          ema5, ema10, ema20, ema30, ema60, ema7, ema21, ema42, eps_forecast, created_at
-                   FROM monitor_data_cache
-                   WHERE code = ANY($1) AND timeframe = ANY($2)
-                   ORDER BY code, timeframe, created_at DESC''',
-                codes, timeframes
+                '''SELECT c.id, c.code, c.timeframe, c.current_price, c.ema144, c.ema188,
+                          c.ema5, c.ema10, c.ema20, c.ema30, c.ema60, c.ema7, c.ema21, c.ema42,
+                          c.eps_forecast, c.created_at, c.ema_as_of, c.eps_updated_at
+                   FROM monitor_data_cache c
+                   JOIN unnest($1::text[], $2::text[]) AS p(code, timeframe)
+                     ON c.code = p.code AND c.timeframe = p.timeframe
+                   WHERE c.created_at > NOW() - INTERVAL '1 minute' * $3''',
+                [code for code, _ in pairs],
+                [timeframe for _, timeframe in pairs],
+                max_age_minutes,
             )
 
-            logger.info(f"SQL: 批量查询返回 {len(rows)} 条记录")
-
-            # 构建结果字典，只保留最新的记录
-            result = {}
-            now = datetime.now()
-
-            for row in rows:
-                key = (row['code'], row['timeframe'])
-
-                # 检查时间有效性
-                created_at = row['created_at']
-                if created_at:
-                    age_minutes = (now - created_at).total_seconds() / 60
-                    if age_minutes > max_age_minutes:
-                        continue
-
-                # 如果该 key 还没有记录，或者当前记录更新，则保存
-                if key not in result or row['created_at'] > result[key].created_at:
-                    result[key] = MonitorDataCache(
-                        id=row['id'],
-                        code=row['code'],
-                        timeframe=row['timeframe'],
-                        current_price=row['current_price'],
-                        ema144=row['ema144'],
-                        ema188=row['ema188'],
-                        ema5=row['ema5'],
-                        ema10=row['ema10'],
-                        ema20=row['ema20'],
-                        ema30=row['ema30'],
-                        ema60=row['ema60'],
-                        ema7=row['ema7'],
-                        ema21=row['ema21'],
-                        ema42=row['ema42'],
-                        eps_forecast=row['eps_forecast'],
-                        created_at=row['created_at']
-                    )
-
-            return result
+        logger.info(f"SQL: 批量查询返回 {len(rows)} 条有效记录")
+        # (code, timeframe) 有唯一约束，每个配对最多一行
+        return {(row['code'], row['timeframe']): MonitorDataCache(**dict(row)) for row in rows}
 
     @staticmethod
     async def get_by_code_and_timeframe(code, timeframe, max_age_minutes=5):
@@ -199,11 +171,48 @@ class MonitorDataCacheRepository:
         return result.get((code, timeframe))
 
     @staticmethod
-    async def clean_old_data(hours=1):
-        """清理过期数据"""
+    async def clear_ema_as_of(code_timeframe_pairs):
+        """EMA 状态被全量重算后清空这些行的 ema_as_of，进程重启时不再从这里恢复旧的 EMA
+
+        Returns:
+            int: 更新的行数
+        """
+        if not code_timeframe_pairs:
+            return 0
+        pairs = list(dict.fromkeys(code_timeframe_pairs))
         async with get_db_conn() as conn:
             result = await conn.execute(
-                "DELETE FROM monitor_data_cache WHERE created_at < NOW() - INTERVAL '1 hour' * $1",
-                hours
+                '''UPDATE monitor_data_cache c SET ema_as_of = NULL
+                   FROM unnest($1::text[], $2::text[]) AS p(code, timeframe)
+                   WHERE c.code = p.code AND c.timeframe = p.timeframe AND c.ema_as_of IS NOT NULL''',
+                [code for code, _ in pairs],
+                [timeframe for _, timeframe in pairs],
             )
-            return int(result.split()[-1])
\ No newline at end of file
+        return int(result.split()[-1])
+
+    @staticmethod
+    async def clean_old_data(hours=1, batch_size=5000):
+        """清理超过 hours 小时未更新的缓存
+
+        由定时维护任务调用，读路径不执行 DELETE。按 batch_size 分批删除，每批是一个短语句，
+        不会长时间持有大量行锁。
+
+        Returns:
+            int: 删除的总行数
+        """
+        total = 0
+        async with get_db_conn() as conn:
+            while True:
+                result = await conn.execute(
+                    '''DELETE FROM monitor_data_cache
+                       WHERE id IN (
+                           SELECT id FROM monitor_data_cache
+                           WHERE created_at < NOW() - INTERVAL '1 hour' * $1
+                           LIMIT $2
+                       )''',
+                    hours, batch_size
+                )
+                deleted = int(result.split()[-1])
+                total += deleted
+                if deleted < batch_size:
+                    return total
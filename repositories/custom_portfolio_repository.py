@@ -1,4 +1,5 @@
 from models.custom_portfolio import CustomPortfolio, CustomPortfolioHolding
+from repositories.schema_migrations import ensure_schema
 from utils.db import get_db_conn
 from utils.logger import get_logger
 
@@ -6,60 +7,13 @@ logger = get_logger('custom_portfolio_repository')
 
 
 class CustomPortfolioRepository:
-    _tables_ready = False
-
-    @classmethod
-    async def ensure_tables(cls) -> None:
-        if cls._tables_ready:
-            return
-
-        async with get_db_conn() as conn:
-            await conn.execute(
-                '''
-                CREATE TABLE IF NOT EXISTS custom_portfolios (
-                    id SERIAL PRIMARY KEY,
-                    name VARCHAR(120) NOT NULL,
-                    notes TEXT DEFAULT '',
-                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-                )
-                '''
-            )
-            await conn.execute(
-                '''
-                CREATE TABLE IF NOT EXISTS custom_portfolio_holdings (
-                    id SERIAL PRIMARY KEY,
-                    portfolio_id INTEGER NOT NULL REFERENCES custom_portfolios(id) ON DELETE CASCADE,
-                    code VARCHAR(20) NOT NULL,
-                    name VARCHAR(80) NOT NULL,
-                    cost_price NUMERIC(12, 3) NOT NULL CHECK (cost_price >= 0),
-                    shares INTEGER NOT NULL CHECK (shares > 0),
-                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-                )
-                '''
-            )
-            await conn.execute(
-                '''
-                CREATE INDEX IF NOT EXISTS idx_custom_portfolio_holdings_portfolio_id
-                ON custom_portfolio_holdings(portfolio_id)
-                '''
-            )
-            await conn.execute(
-                '''
-                CREATE UNIQUE INDEX IF NOT EXISTS idx_custom_portfolio_holdings_unique
-                ON custom_portfolio_holdings(portfolio_id, code)
-                '''
-            )
-        cls._tables_ready = True
-
     @staticmethod
     def _normalize_timestamp(value) -> str:
         return value.strftime('%Y-%m-%d %H:%M:%S')
 
     @classmethod
     async def list_portfolios(cls) -> list[CustomPortfolio]:
-        await cls.ensure_tables()
+        await ensure_schema()
         async with get_db_conn() as conn:
             rows = await conn.fetch(
                 '''
@@ -81,7 +35,7 @@ class CustomPortfolioRepository:
 
     @classmethod
     async def list_holdings(cls) -> list[CustomPortfolioHolding]:
-        await cls.ensure_tables()
+        await ensure_schema()
         async with get_db_conn() as conn:
             rows = await conn.fetch(
                 '''
@@ -106,7 +60,7 @@ class CustomPortfolioRepository:
 
     @classmethod
     async def get_portfolio_by_id(cls, portfolio_id: int) -> CustomPortfolio | None:
-        await cls.ensure_tables()
+        await ensure_schema()
         async with get_db_conn() as conn:
             row = await conn.fetchrow(
                 '''
@@ -128,7 +82,7 @@ class CustomPortfolioRepository:
 
     @classmethod
     async def list_holdings_by_portfolio(cls, portfolio_id: int) -> list[CustomPortfolioHolding]:
-        await cls.ensure_tables()
+        await ensure_schema()
         async with get_db_conn() as conn:
             rows = await conn.fetch(
                 '''
@@ -155,7 +109,7 @@ class CustomPortfolioRepository:
 
     @classmethod
     async def create_portfolio(cls, name: str, notes: str, holdings: list[dict]) -> int:
-        await cls.ensure_tables()
+        await ensure_schema()
         async with get_db_conn() as conn:
             async with conn.transaction():
                 portfolio_id = await conn.fetchval(
@@ -183,7 +137,7 @@ class CustomPortfolioRepository:
 
     @classmethod
     async def add_holding(cls, portfolio_id: int, code: str, name: str, cost_price: float, shares: int) -> tuple[bool, str]:
-        await cls.ensure_tables()
+        await ensure_schema()
         async with get_db_conn() as conn:
             async with conn.transaction():
                 exists = await conn.fetchval('SELECT 1 FROM custom_portfolios WHERE id = $1', portfolio_id)
@@ -214,14 +168,14 @@ class CustomPortfolioRepository:
 
     @classmethod
     async def delete_portfolio(cls, portfolio_id: int) -> bool:
-        await cls.ensure_tables()
+        await ensure_schema()
         async with get_db_conn() as conn:
             result = await conn.execute('DELETE FROM custom_portfolios WHERE id = $1', portfolio_id)
         return 'DELETE 1' in result
 
     @classmethod
     async def delete_holding(cls, portfolio_id: int, holding_id: int) -> bool:
-        await cls.ensure_tables()
+        await ensure_schema()
         async with get_db_conn() as conn:
             async with conn.transaction():
                 result = await conn.execute(
@@ -0,0 +1,124 @@
+import numpy as np
+
+from repositories.schema_migrations import ensure_schema
+from utils.db import get_db_conn
+from utils.logger import get_logger
+
+logger = get_logger('derived_kline_repository')
+
+
+class DerivedKlineRepository:
+    """2 日 / 3 日 / 周 / 月K聚合结果仓储层，每个 (code, timeframe, date) 一行"""
+
+    @staticmethod
+    def _arrays_from_row(row):
+        return {
+            'dates': np.array(row['dates'], dtype='datetime64[D]'),
+            'opens': np.array(row['opens'], dtype=np.float64),
+            'closes': np.array(row['closes'], dtype=np.float64),
+            'highs': np.array(row['highs'], dtype=np.float64),
+            'lows': np.array(row['lows'], dtype=np.float64),
+            'volumes': np.array(row['volumes'], dtype=np.int64),
+            'amounts': np.array(row['amounts'], dtype=np.float64),
+            'last_dates': np.array(row['last_dates'], dtype='datetime64[D]'),
+        }
+
+    @classmethod
+    async def get_arrays_by_codes(cls, codes, timeframe, limit=250):
+        """批量读取多只股票某周期最近 limit 根聚合K线，并带出 kline_coverage 中的最新日K日期
+
+        Returns:
+            tuple: ({code: 列数组（含 last_dates）}, {code: kline_last_date})
+        """
+        if not codes:
+            return {}, {}
+        await ensure_schema()
+        async with get_db_conn() as conn:
+            rows = await conn.fetch(
+                '''SELECT c.code, recent.*
+                   FROM unnest($1::text[]) AS c(code)
+                   CROSS JOIN LATERAL (
+                       SELECT array_agg(date ORDER BY date) AS dates,
+                              array_agg(open ORDER BY date) AS opens,
+                              array_agg(close ORDER BY date) AS closes,
+                              array_agg(high ORDER BY date) AS highs,
+                              array_agg(low ORDER BY date) AS lows,
+                              array_agg(volume ORDER BY date) AS volumes,
+                              array_agg(amount ORDER BY date) AS amounts,
+                              array_agg(last_date ORDER BY date) AS last_dates
+                       FROM (
+                           SELECT date, open, close, high, low, volume, amount, last_date
+                           FROM stock_kline_derived d
+                           WHERE d.code = c.code AND d.timeframe = $2
+                           ORDER BY date DESC LIMIT $3
+                       ) AS bars
+                   ) AS recent
+                   WHERE recent.dates IS NOT NULL''',
+                list(codes), timeframe, limit
+            )
+            coverage = await conn.fetch(
+                'SELECT code, last_date FROM kline_coverage WHERE code = ANY($1)',
+                list(codes)
+            )
+        logger.debug(f"SQL: 查询 {len(codes)} 只股票的 {timeframe} K线，返回 {len(rows)} 只")
+        return (
+            {row['code']: cls._arrays_from_row(row) for row in rows},
+            {row['code']: row['last_date'] for row in coverage},
+        )
+
+    @classmethod
+    async def get_materialized_codes(cls, codes):
+        """已经聚合过的股票代码集合（入库时只增量维护这些股票，其余在首次读取时全量聚合）"""
+        if not codes:
+            return set()
+        await ensure_schema()
+        async with get_db_conn() as conn:
+            rows = await conn.fetch(
+                '''SELECT c.code
+                   FROM unnest($1::text[]) AS c(code)
+                   WHERE EXISTS (SELECT 1 FROM stock_kline_derived d WHERE d.code = c.code)''',
+                list(codes)
+            )
+        return {row['code'] for row in rows}
+
+    @classmethod
+    async def save_bars(cls, bars):
+        """批量写入聚合K线，已有的箱体整行覆盖
+
+        Args:
+            bars: {(code, timeframe): aggregate_bars 返回的列数组}
+        """
+        items = [(key, arrays) for key, arrays in bars.items() if len(arrays['dates'])]
+        if not items:
+            return
+        await ensure_schema()
+
+        def column(key):
+            return np.concatenate([arrays[key] for _, arrays in items])
+
+        codes = [code for (code, _), arrays in items for _ in range(len(arrays['dates']))]
+        timeframes = [timeframe for (_, timeframe), arrays in items for _ in range(len(arrays['dates']))]
+        async with get_db_conn() as conn:
+            await conn.execute(
+                '''INSERT INTO stock_kline_derived
+                   (code, timeframe, date, open, close, high, low, volume, amount, last_date, updated_at)
+                   SELECT code, timeframe, date, open, close, high, low, volume, amount, last_date, CURRENT_TIMESTAMP
+                   FROM unnest($1::text[], $2::text[], $3::date[], $4::float8[], $5::float8[], $6::float8[],
+                               $7::float8[], $8::int8[], $9::float8[], $10::date[])
+                        AS u(code, timeframe, date, open, close, high, low, volume, amount, last_date)
+                   ON CONFLICT (code, timeframe, date) DO UPDATE
+                   SET open = EXCLUDED.open, close = EXCLUDED.close, high = EXCLUDED.high, low = EXCLUDED.low,
+                       volume = EXCLUDED.volume, amount = EXCLUDED.amount, last_date = EXCLUDED.last_date,
+                       updated_at = CURRENT_TIMESTAMP''',
+                codes,
+                timeframes,
+                column('dates').tolist(),
+                column('opens').tolist(),
+                column('closes').tolist(),
+                column('highs').tolist(),
+                column('lows').tolist(),
+                column('volumes').tolist(),
+                column('amounts').tolist(),
+                column('last_dates').tolist(),
+            )
+        logger.debug(f"SQL: 写入 {len(codes)} 根聚合K线")
@@ -0,0 +1,99 @@
+from repositories.schema_migrations import ensure_schema
+from utils.db import get_db_conn
+from utils.logger import get_logger
+
+logger = get_logger('ema_state_repository')
+
+
+class EmaStateRepository:
+    """EMA 增量状态仓储层，每个 (code, timeframe, span) 一行"""
+
+    @staticmethod
+    def _group(rows):
+        states = {}
+        for row in rows:
+            states.setdefault((row['code'], row['timeframe']), {})[row['span']] = {
+                'ema': row['ema'],
+                'ema_prev': row['ema_prev'],
+                'last_bin': row['last_bin'],
+                'last_date': row['last_date'],
+                'bar_count': row['bar_count'],
+            }
+        return states
+
+    @classmethod
+    async def get_states(cls, pairs):
+        """读取一批 (code, timeframe) 的 EMA 状态，并带出 kline_coverage 中的最新K线日期
+
+        Returns:
+            tuple: ({(code, timeframe): {span: state}}, {code: kline_last_date})
+        """
+        if not pairs:
+            return {}, {}
+        await ensure_schema()
+        codes = [code for code, _ in pairs]
+        timeframes = [timeframe for _, timeframe in pairs]
+        async with get_db_conn() as conn:
+            rows = await conn.fetch(
+                '''SELECT s.*
+                   FROM ema_state s
+                   JOIN unnest($1::text[], $2::text[]) AS p(code, timeframe)
+                     ON s.code = p.code AND s.timeframe = p.timeframe''',
+                codes, timeframes
+            )
+            coverage = await conn.fetch(
+                'SELECT code, last_date FROM kline_coverage WHERE code = ANY($1)',
+                list(set(codes))
+            )
+        return cls._group(rows), {row['code']: row['last_date'] for row in coverage}
+
+    @classmethod
+    async def get_states_by_codes(cls, codes):
+        """读取这些股票已有的全部 EMA 状态（入库时只维护已被监控读取过的组合）"""
+        if not codes:
+            return {}
+        await ensure_schema()
+        async with get_db_conn() as conn:
+            rows = await conn.fetch(
+                'SELECT * FROM ema_state WHERE code = ANY($1)',
+                list(codes)
+            )
+        return cls._group(rows)
+
+    @classmethod
+    async def save_states(cls, states):
+        """批量写入 EMA 状态
+
+        Args:
+            states: {(code, timeframe): {span: state}}
+        """
+        rows = [
+            (code, timeframe, span, state)
+            for (code, timeframe), spans in states.items()
+            for span, state in spans.items()
+        ]
+        if not rows:
+            return
+        await ensure_schema()
+        async with get_db_conn() as conn:
+            await conn.execute(
+                '''INSERT INTO ema_state
+                   (code, timeframe, span, ema, ema_prev, last_bin, last_date, bar_count, updated_at)
+                   SELECT code, timeframe, span, ema, ema_prev, last_bin, last_date, bar_count, CURRENT_TIMESTAMP
+                   FROM unnest($1::text[], $2::text[], $3::int[], $4::float8[], $5::float8[],
+                               $6::int[], $7::date[], $8::int[])
+                        AS u(code, timeframe, span, ema, ema_prev, last_bin, last_date, bar_count)
+                   ON CONFLICT (code, timeframe, span) DO UPDATE
+                   SET ema = EXCLUDED.ema, ema_prev = EXCLUDED.ema_prev, last_bin = EXCLUDED.last_bin,
+                       last_date = EXCLUDED.last_date, bar_count = EXCLUDED.bar_count,
+                       updated_at = CURRENT_TIMESTAMP''',
+                [row[0] for row in rows],
+                [row[1] for row in rows],
+                [row[2] for row in rows],
+                [row[3]['ema'] for row in rows],
+                [row[3]['ema_prev'] for row in rows],
+                [row[3]['last_bin'] for row in rows],
+                [row[3]['last_date'] for row in rows],
+                [row[3]['bar_count'] for row in rows],
+            )
+        logger.debug(f"SQL: 写入 {len(rows)} 条 EMA 状态")
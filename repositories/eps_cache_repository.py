@@ -9,68 +9,51 @@ class EpsCacheRepository:
     """EPS 预测缓存仓储层（异步版本）"""
 
     @staticmethod
-    async def get(code):
-        """获取 EPS 缓存"""
-        async with get_db_conn() as conn:
-            row = await conn.fetchrow(
-                '''SELECT eps_value, updated_at 
-                   FROM eps_cache 
-                   WHERE code = $1''',
-                code
-            )
-            
-            if row:
-                # 检查是否过期（24小时）
-                from datetime import datetime, timedelta
-                if datetime.now() - row['updated_at'] < timedelta(hours=24):
-                    eps_value = row['eps_value']
-                    logger.debug(f"从数据库缓存获取 {code} 的 EPS: {eps_value}")
-                    return eps_value
-            
-            return None
+    async def get_entries(codes, ttl_hours, negative_ttl_hours):
+        """批量读取仍有效的 EPS 缓存，包括“无预测”的负缓存
 
-    @staticmethod
-    async def set(code, eps_value):
-        """设置 EPS 缓存"""
-        async with get_db_conn() as conn:
-            try:
-                await conn.execute(
-                    '''INSERT INTO eps_cache (code, eps_value)
-                       VALUES ($1, $2)
-                       ON CONFLICT (code) DO UPDATE
-                       SET eps_value = EXCLUDED.eps_value,
-                           updated_at = CURRENT_TIMESTAMP''',
-                    code, eps_value
-                )
-                logger.debug(f"已缓存 {code} 的 EPS: {eps_value}")
-                return True
-            except Exception as e:
-                logger.error(f"保存 EPS 缓存失败: {e}")
-                return False
+        eps_value 为 NULL 的行表示该股票没有盈利预测，按 negative_ttl_hours 过期；有值的行按 ttl_hours 过期。
 
-    @staticmethod
-    async def get_batch(codes):
-        """批量获取 EPS 缓存"""
+        Returns:
+            dict: {code: (eps_value 或 None, updated_at)}，没有有效缓存的股票不在结果中
+        """
         if not codes:
             return {}
-        
+
         async with get_db_conn() as conn:
             rows = await conn.fetch(
                 '''SELECT code, eps_value, updated_at
                    FROM eps_cache
-                   WHERE code = ANY($1)''',
-                codes
+                   WHERE code = ANY($1)
+                     AND updated_at > NOW() - INTERVAL '1 hour' *
+                         CASE WHEN eps_value IS NULL THEN $3::float8 ELSE $2::float8 END''',
+                list(codes), ttl_hours, negative_ttl_hours
+            )
+            return {row['code']: (row['eps_value'], row['updated_at']) for row in rows}
+
+    @staticmethod
+    async def upsert_batch(values):
+        """批量写入 EPS 缓存，一条语句完成
+
+        Args:
+            values: {code: eps_value}，eps_value 为 None 时写入负缓存
+        """
+        if not values:
+            return 0
+
+        codes = list(values)
+        async with get_db_conn() as conn:
+            await conn.execute(
+                '''INSERT INTO eps_cache (code, eps_value, updated_at)
+                   SELECT code, eps_value, CURRENT_TIMESTAMP
+                   FROM unnest($1::text[], $2::real[]) AS t(code, eps_value)
+                   ON CONFLICT (code) DO UPDATE
+                   SET eps_value = EXCLUDED.eps_value,
+                       updated_at = CURRENT_TIMESTAMP''',
+                codes, [values[code] for code in codes]
             )
-            
-            from datetime import datetime, timedelta
-            result = {}
-            for row in rows:
-                # 检查是否过期
-                if datetime.now() - row['updated_at'] < timedelta(hours=24):
-                    eps_value = row['eps_value']
-                    result[row['code']] = eps_value
-            
-            return result
+            logger.info(f"SQL: 批量写入 {len(codes)} 条 EPS 缓存")
+            return len(codes)
 
     @staticmethod
     async def clean_old_data(hours=24):
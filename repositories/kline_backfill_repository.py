@@ -0,0 +1,149 @@
+from repositories.schema_migrations import ensure_schema
+from utils.db import get_db_conn
+from utils.logger import get_logger
+
+logger = get_logger('kline_backfill_repository')
+
+
+class KlineBackfillRepository:
+    """K线回补任务仓储层（任务记录 + 逐只股票的检查点）"""
+
+    @classmethod
+    async def get_running_job(cls):
+        """获取未完成的任务（进程中断后用于断点续跑）"""
+        await ensure_schema()
+        async with get_db_conn() as conn:
+            return await conn.fetchrow(
+                '''SELECT * FROM kline_backfill_jobs
+                   WHERE status = 'running'
+                   ORDER BY id DESC LIMIT 1'''
+            )
+
+    @classmethod
+    async def create_job(cls, mode, codes):
+        """创建任务并为每只股票写入 pending 检查点
+
+        Returns:
+            int: 任务 ID
+        """
+        await ensure_schema()
+        async with get_db_conn() as conn:
+            async with conn.transaction():
+                job_id = await conn.fetchval(
+                    '''INSERT INTO kline_backfill_jobs (mode, total_codes)
+                       VALUES ($1, $2) RETURNING id''',
+                    mode, len(codes)
+                )
+                await conn.execute(
+                    '''INSERT INTO kline_backfill_items (job_id, code)
+                       SELECT $1, code FROM unnest($2::text[]) AS code
+                       ON CONFLICT DO NOTHING''',
+                    job_id, list(codes)
+                )
+        logger.info(f"SQL: 创建K线回补任务 {job_id}，共 {len(codes)} 只股票")
+        return job_id
+
+    @classmethod
+    async def claim_items(cls, job_id, limit, max_attempts):
+        """取出下一批待处理的股票：pending，或失败但未超过重试次数且已到重试时间"""
+        async with get_db_conn() as conn:
+            rows = await conn.fetch(
+                '''SELECT code FROM kline_backfill_items
+                   WHERE job_id = $1
+                     AND (status = 'pending'
+                          OR (status = 'failed' AND attempts < $2 AND next_retry_at <= CURRENT_TIMESTAMP))
+                   ORDER BY attempts, code
+                   LIMIT $3''',
+                job_id, max_attempts, limit
+            )
+        return [row['code'] for row in rows]
+
+    @classmethod
+    async def get_next_retry_at(cls, job_id, max_attempts):
+        """最早一只仍可重试的失败股票的重试时间，没有则返回 None"""
+        async with get_db_conn() as conn:
+            return await conn.fetchval(
+                '''SELECT MIN(next_retry_at) FROM kline_backfill_items
+                   WHERE job_id = $1 AND status = 'failed' AND attempts < $2''',
+                job_id, max_attempts
+            )
+
+    @classmethod
+    async def mark_items(cls, job_id, outcomes, retry_base_seconds):
+        """批量写入一批股票的处理结果（检查点）
+
+        失败的股票按 retry_base_seconds * 2^attempts 退避后再重试。
+
+        Args:
+            job_id: 任务 ID
+            outcomes: {code: (status, rows, error)}，status 取 ok / empty / failed
+            retry_base_seconds: 首次重试的等待秒数
+        """
+        if not outcomes:
+            return
+
+        codes = list(outcomes)
+        statuses = [outcomes[code][0] for code in codes]
+        rows = [outcomes[code][1] for code in codes]
+        errors = [outcomes[code][2] for code in codes]
+
+        async with get_db_conn() as conn:
+            await conn.execute(
+                '''UPDATE kline_backfill_items AS i
+                   SET status = u.status,
+                       rows_written = i.rows_written + u.rows,
+                       attempts = i.attempts + 1,
+                       next_retry_at = CASE
+                           WHEN u.status = 'failed'
+                           THEN CURRENT_TIMESTAMP + make_interval(secs => $5 * power(2, i.attempts))
+                           ELSE NULL
+                       END,
+                       last_error = u.error,
+                       updated_at = CURRENT_TIMESTAMP
+                   FROM unnest($2::text[], $3::text[], $4::int[], $6::text[]) AS u(code, status, rows, error)
+                   WHERE i.job_id = $1 AND i.code = u.code''',
+                job_id, codes, statuses, rows, float(retry_base_seconds), errors
+            )
+
+    @classmethod
+    async def refresh_job_progress(cls, job_id, codes_per_min=None, rows_per_min=None, status=None):
+        """根据检查点汇总任务进度，status 不为空时同时结束任务
+
+        Returns:
+            Record: 更新后的任务记录
+        """
+        async with get_db_conn() as conn:
+            return await conn.fetchrow(
+                '''UPDATE kline_backfill_jobs AS j
+                   SET ok_count = s.ok_count,
+                       empty_count = s.empty_count,
+                       failed_count = s.failed_count,
+                       rows_written = s.rows_written,
+                       codes_per_min = COALESCE($2, j.codes_per_min),
+                       rows_per_min = COALESCE($3, j.rows_per_min),
+                       status = COALESCE($4, j.status),
+                       finished_at = CASE WHEN $4::text IS NULL THEN j.finished_at ELSE CURRENT_TIMESTAMP END,
+                       updated_at = CURRENT_TIMESTAMP
+                   FROM (
+                       SELECT COUNT(*) FILTER (WHERE status = 'ok') AS ok_count,
+                              COUNT(*) FILTER (WHERE status = 'empty') AS empty_count,
+                              COUNT(*) FILTER (WHERE status = 'failed') AS failed_count,
+                              COALESCE(SUM(rows_written), 0) AS rows_written
+                       FROM kline_backfill_items
+                       WHERE job_id = $1
+                   ) AS s
+                   WHERE j.id = $1
+                   RETURNING j.*''',
+                job_id, codes_per_min, rows_per_min, status
+            )
+
+    @classmethod
+    async def get_recent_jobs(cls, limit=10):
+        """获取最近的回补任务"""
+        await ensure_schema()
+        async with get_db_conn() as conn:
+            return await conn.fetch(
+                '''SELECT * FROM kline_backfill_jobs
+                   ORDER BY id DESC LIMIT $1''',
+                limit
+            )
@@ -1,36 +1,103 @@
 from utils.db import get_db_conn
+from utils.kline_store import get_kline_store
 from utils.logger import get_logger
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from itertools import repeat
+import numpy as np
 import pandas as pd
 
 logger = get_logger('kline_repository')
 
+KLINE_COLUMNS = ('code', 'date', 'open', 'close', 'high', 'low', 'volume', 'amount')
+KLINE_FRAME_COLUMNS = ['日期', '开盘', '收盘', '最高', '最低', 'volume', 'amount']
+# 列数组的键，与 KLINE_COLUMNS 中 code 之后的列一一对应
+KLINE_ARRAY_KEYS = ('dates', 'opens', 'closes', 'highs', 'lows', 'volumes', 'amounts')
+
+# K 线写入按股票加事务级 advisory lock 的第一个键（第二个键为 hashtext(code)）
+KLINE_WRITE_LOCK_KEY = 7_204_119
+
+# 把一批写入结果（code, date, inserted）按股票合并进 kline_coverage：
+# 首末日期取并集，bar_count 只累加新插入的行（覆盖更新的行不重复计数）
+# inserted 由写入前对 stock_kline_data 的 NOT EXISTS 反连接得出，同一条语句 / 同一事务内先于写入求值。
+# 反连接只看得到语句开始时已提交的行，两个事务同时写同一 (code, date) 会各自计一次，
+# 因此写入前先按股票取事务级 advisory lock（见 KLINE_WRITE_LOCK_KEY），同一股票的写入串行执行，计数准确。
+# （分区表不支持在 RETURNING 中读取 xmax，无法用 xmax = 0 判断是否新插入。）
+COVERAGE_MERGE_SQL = '''
+    INSERT INTO kline_coverage (code, first_date, last_date, bar_count, updated_at)
+    SELECT code, MIN(date), MAX(date), COUNT(*) FILTER (WHERE inserted), CURRENT_TIMESTAMP
+    FROM {source}
+    GROUP BY code
+    ON CONFLICT (code) DO UPDATE
+    SET first_date = LEAST(kline_coverage.first_date, EXCLUDED.first_date),
+        last_date = GREATEST(kline_coverage.last_date, EXCLUDED.last_date),
+        bar_count = kline_coverage.bar_count + EXCLUDED.bar_count,
+        updated_at = CURRENT_TIMESTAMP
+'''
+
+# kline_coverage 还没有汇总行的股票（迁移前写入、或由其他工具直接写表）退回按索引取 MAX(date)
+LATEST_DATE_FALLBACK_SQL = '''
+    SELECT c.code, (SELECT MAX(k.date) FROM stock_kline_data k WHERE k.code = c.code)::date AS last_date
+    FROM unnest($1::text[]) AS c(code)
+'''
+
+# executemany 路径：写入前按 (code, date) 反连接标出本批新增的行，再按增量合并进 kline_coverage
+COVERAGE_DELTA_SQL = COVERAGE_MERGE_SQL.format(source='''(
+        SELECT DISTINCT t.code, t.date,
+               NOT EXISTS (SELECT 1 FROM stock_kline_data k WHERE k.code = t.code AND k.date = t.date) AS inserted
+        FROM unnest($1::text[], $2::date[]) AS t(code, date)
+    ) AS batch''')
+
 
 class KlineRepository:
     """K线数据仓储层（异步版本）"""
 
+    @staticmethod
+    def _arrays_from_frame(df):
+        """按列把待写入的 DataFrame 转换为与表中存储一致的 NumPy 列数组
+
+        日期整列转换为 datetime64[D]，amount 缺失时整列补 0，成交量按现有约定写 0。
+        写入记录与进程内 K 线缓存共用这份转换，保证缓存与库中数据一致。
+        """
+        count = len(df)
+        if 'amount' in df.columns:
+            amounts = df['amount'].fillna(0).to_numpy(dtype=np.float64)
+        else:
+            amounts = np.zeros(count, dtype=np.float64)
+        return {
+            'dates': pd.to_datetime(df['日期']).to_numpy(dtype='datetime64[D]'),
+            'opens': df['开盘'].to_numpy(dtype=np.float64),
+            'closes': df['收盘'].to_numpy(dtype=np.float64),
+            'highs': df['最高'].to_numpy(dtype=np.float64),
+            'lows': df['最低'].to_numpy(dtype=np.float64),
+            'volumes': np.zeros(count, dtype=np.int64),
+            'amounts': amounts,
+        }
+
+    @staticmethod
+    def _build_insert_records(code, df, arrays=None):
+        """按列把 DataFrame 转换为写入记录，避免 iterrows 逐行装箱
+
+        各列通过 tolist() 转为 Python 原生类型后按行拼装，datetime64[D] 即转为 datetime.date（对应 DATE 列）。
+        已经转换过的列数组可通过 arrays 传入。
+        """
+        if arrays is None:
+            arrays = KlineRepository._arrays_from_frame(df)
+        count = len(arrays['dates'])
+        return list(zip(repeat(code, count), *(arrays[key].tolist() for key in KLINE_ARRAY_KEYS)))
+
     @staticmethod
     async def save_batch(code, kline_data):
         """批量保存K线数据"""
         logger.info(f"SQL: 批量插入/更新 {code} 的 K线数据，数据量: {len(kline_data)}")
         async with get_db_conn() as conn:
             try:
-                insert_data = [
-                    (code, row['日期'].strftime('%Y-%m-%d'), row['开盘'], row['收盘'],
-                     row['最高'], row['最低'], 0, row.get('amount', 0))
-                    for _, row in kline_data.iterrows()
-                ]
-                
-                await conn.executemany(
-                    '''INSERT INTO stock_kline_data
-                       (code, date, open, close, high, low, volume, amount, updated_at)
-                       VALUES ($1, $2, $3, $4, $5, $6, $7, $8, CURRENT_TIMESTAMP)
-                       ON CONFLICT (code, date) DO UPDATE
-                       SET open = EXCLUDED.open, close = EXCLUDED.close, high = EXCLUDED.high,
-                           low = EXCLUDED.low, volume = EXCLUDED.volume, amount = EXCLUDED.amount,
-                           updated_at = CURRENT_TIMESTAMP''',
-                    insert_data
-                )
+                arrays = KlineRepository._arrays_from_frame(kline_data)
+                insert_data = KlineRepository._build_insert_records(code, kline_data, arrays)
+
+                async with conn.transaction():
+                    await KlineRepository._merge_coverage_delta(conn, insert_data)
+                    await KlineRepository._upsert_with_executemany(conn, insert_data)
+                get_kline_store().merge(code, arrays)
                 logger.info(f"SQL: 批量插入/更新成功")
                 return True, len(insert_data)
             except Exception as e:
@@ -38,11 +105,96 @@ class KlineRepository:
                 return False, str(e)
 
     @staticmethod
-    async def save_all_batch(kline_data_dict):
+    async def _upsert_with_executemany(conn, records):
+        """逐行 ON CONFLICT 写入（旧路径，保留用于小批量和基准对比）"""
+        await conn.executemany(
+            '''INSERT INTO stock_kline_data
+               (code, date, open, close, high, low, volume, amount, updated_at)
+               VALUES ($1, $2, $3, $4, $5, $6, $7, $8, CURRENT_TIMESTAMP)
+               ON CONFLICT (code, date) DO UPDATE
+               SET open = EXCLUDED.open, close = EXCLUDED.close, high = EXCLUDED.high,
+                   low = EXCLUDED.low, volume = EXCLUDED.volume, amount = EXCLUDED.amount,
+                   updated_at = CURRENT_TIMESTAMP''',
+            records
+        )
+
+    @staticmethod
+    async def _lock_codes(conn, records):
+        """按股票取事务级 advisory lock（需在写入事务内调用），同一股票的并发写入排队执行
+
+        按键排序后加锁，多个写入方同时锁同一批股票也不会死锁；事务结束时自动释放。
+        """
+        await conn.execute(
+            '''SELECT pg_advisory_xact_lock($1, key)
+               FROM (SELECT DISTINCT hashtext(code) AS key FROM unnest($2::text[]) AS t(code) ORDER BY key) AS keys''',
+            KLINE_WRITE_LOCK_KEY,
+            list({record[0] for record in records}),
+        )
+
+    @staticmethod
+    async def _merge_coverage_delta(conn, records):
+        """按本批新增的行增量更新 kline_coverage（executemany 路径使用，需在写入之前、同一事务内调用）"""
+        await KlineRepository._lock_codes(conn, records)
+        await conn.execute(
+            COVERAGE_DELTA_SQL,
+            [record[0] for record in records],
+            [record[1] for record in records],
+        )
+
+    @staticmethod
+    async def _upsert_with_copy(conn, records):
+        """COPY 到临时表后一次性合并到 stock_kline_data，并在同一条语句里更新 kline_coverage
+
+        临时表在事务提交时自动删除，连接归还连接池后不会残留。
+        同一批次内重复的 (code, date) 只保留一条，避免 ON CONFLICT 二次命中同一行。
+        合并前先用 NOT EXISTS 对 stock_kline_data 做反连接，标出目标表中还没有的行：
+        同一条语句里的各个 CTE 看到的是写入前的快照，据此只为新增 K 线累加 bar_count。
+        合并前按股票加 advisory lock，并发写入同一股票时后到的事务等前者提交后再取快照，不会重复计数。
+        """
+        async with conn.transaction():
+            await conn.execute(
+                '''CREATE TEMP TABLE stock_kline_staging (
+                       code TEXT, date DATE, open DOUBLE PRECISION, close DOUBLE PRECISION,
+                       high DOUBLE PRECISION, low DOUBLE PRECISION, volume BIGINT, amount DOUBLE PRECISION
+                   ) ON COMMIT DROP'''
+            )
+            await conn.copy_records_to_table(
+                'stock_kline_staging',
+                records=records,
+                columns=KLINE_COLUMNS,
+            )
+            await KlineRepository._lock_codes(conn, records)
+            await conn.execute(
+                '''WITH batch AS (
+                       SELECT DISTINCT ON (code, date) *
+                       FROM stock_kline_staging
+                       ORDER BY code, date
+                   ),
+                   delta AS (
+                       SELECT b.*, NOT EXISTS (
+                           SELECT 1 FROM stock_kline_data k WHERE k.code = b.code AND k.date = b.date
+                       ) AS inserted
+                       FROM batch b
+                   ),
+                   upserted AS (
+                       INSERT INTO stock_kline_data
+                       (code, date, open, close, high, low, volume, amount, updated_at)
+                       SELECT code, date, open, close, high, low, volume, amount, CURRENT_TIMESTAMP
+                       FROM delta
+                       ON CONFLICT (code, date) DO UPDATE
+                       SET open = EXCLUDED.open, close = EXCLUDED.close, high = EXCLUDED.high,
+                           low = EXCLUDED.low, volume = EXCLUDED.volume, amount = EXCLUDED.amount,
+                           updated_at = CURRENT_TIMESTAMP
+                   )''' + COVERAGE_MERGE_SQL.format(source='delta')
+            )
+
+    @staticmethod
+    async def save_all_batch(kline_data_dict, use_copy=True):
         """批量保存多只股票的K线数据
         
         Args:
             kline_data_dict: {code: DataFrame} 的字典
+            use_copy: 是否使用 COPY + 临时表合并（默认），False 时退回 executemany
             
         Returns:
             tuple: (success_count, total_count, total_records)
@@ -55,6 +207,7 @@ class KlineRepository:
         async with get_db_conn() as conn:
             try:
                 all_insert_data = []
+                written = {}
                 total_records = 0
                 saved_count = 0
                 
@@ -62,11 +215,8 @@ class KlineRepository:
                     if df is None or df.empty:
                         continue
                     
-                    insert_data = [
-                        (code, row['日期'].strftime('%Y-%m-%d'), row['开盘'], row['收盘'],
-                         row['最高'], row['最低'], 0, row.get('amount', 0))
-                        for _, row in df.iterrows()
-                    ]
+                    written[code] = KlineRepository._arrays_from_frame(df)
+                    insert_data = KlineRepository._build_insert_records(code, df, written[code])
                     all_insert_data.extend(insert_data)
                     total_records += len(insert_data)
                     saved_count += 1
@@ -74,16 +224,16 @@ class KlineRepository:
                 if not all_insert_data:
                     return 0, len(kline_data_dict), 0
                 
-                await conn.executemany(
-                    '''INSERT INTO stock_kline_data
-                       (code, date, open, close, high, low, volume, amount, updated_at)
-                       VALUES ($1, $2, $3, $4, $5, $6, $7, $8, CURRENT_TIMESTAMP)
-                       ON CONFLICT (code, date) DO UPDATE
-                       SET open = EXCLUDED.open, close = EXCLUDED.close, high = EXCLUDED.high,
-                           low = EXCLUDED.low, volume = EXCLUDED.volume, amount = EXCLUDED.amount,
-                           updated_at = CURRENT_TIMESTAMP''',
-                    all_insert_data
-                )
+                if use_copy:
+                    await KlineRepository._upsert_with_copy(conn, all_insert_data)
+                else:
+                    async with conn.transaction():
+                        await KlineRepository._merge_coverage_delta(conn, all_insert_data)
+                        await KlineRepository._upsert_with_executemany(conn, all_insert_data)
+                # 提交后把新写入的 K 线增量合并进进程内缓存（未缓存的股票忽略）
+                store = get_kline_store()
+                for code, arrays in written.items():
+                    store.merge(code, arrays)
                 logger.info(f"SQL: 批量保存成功，{saved_count} 只股票，{total_records} 条记录")
                 return saved_count, len(kline_data_dict), total_records
             except Exception as e:
@@ -91,15 +241,45 @@ class KlineRepository:
                 return 0, len(kline_data_dict), 0
 
     @staticmethod
-    async def get_batch_by_codes(codes, limit=250):
-        """批量获取多只股票的K线数据
+    def _arrays_from_row(row):
+        """把 array_agg 聚合出的一行列数组转换为 NumPy 数组（日期为 datetime64[D]）"""
+        return {
+            'dates': np.array(row['dates'], dtype='datetime64[D]'),
+            'opens': np.array(row['opens'], dtype=np.float64),
+            'closes': np.array(row['closes'], dtype=np.float64),
+            'highs': np.array(row['highs'], dtype=np.float64),
+            'lows': np.array(row['lows'], dtype=np.float64),
+            'volumes': np.array(row['volumes'], dtype=np.int64),
+            'amounts': np.array(row['amounts'], dtype=np.float64),
+        }
+
+    @staticmethod
+    def _frame_from_arrays(arrays):
+        """把列数组（array_agg 的一行或 _arrays_from_row 的结果）转换为 DataFrame
+
+        日期直接构造为 datetime64[ns]，价格与金额为 float64，调用方无需再 pd.to_datetime。
+        DataFrame 会复制传入的数组，调用方修改返回值不会影响缓存。
+        """
+        return pd.DataFrame({
+            '日期': np.asarray(arrays['dates'], dtype='datetime64[D]').astype('datetime64[ns]'),
+            '开盘': np.asarray(arrays['opens'], dtype=np.float64),
+            '收盘': np.asarray(arrays['closes'], dtype=np.float64),
+            '最高': np.asarray(arrays['highs'], dtype=np.float64),
+            '最低': np.asarray(arrays['lows'], dtype=np.float64),
+            'volume': np.asarray(arrays['volumes'], dtype=np.int64),
+            'amount': np.asarray(arrays['amounts'], dtype=np.float64),
+        }, columns=KLINE_FRAME_COLUMNS)
+
+    @staticmethod
+    async def get_arrays_by_codes(codes, limit=250):
+        """批量获取多只股票最近 limit 条K线的列数组
 
         Args:
             codes: 股票代码列表
-            limit: 每只股票返回的最大记录数
+            limit: 每只股票返回的最大记录数，None 表示全部历史
 
         Returns:
-            dict: {code: DataFrame} 的字典
+            dict: {code: {dates, opens, closes, highs, lows, volumes, amounts}}，无数据的股票不在结果中
         """
         if not codes:
             return {}
@@ -107,65 +287,114 @@ class KlineRepository:
         logger.info(f"SQL: 批量查询 {len(codes)} 只股票的K线数据，每只最多 {limit} 条")
 
         async with get_db_conn() as conn:
-            # 使用 IN 子句批量查询
+            # LATERAL 对每只股票沿 (code, date) 索引倒序只取最近 limit 条，再聚合为一行列数组，
+            # 服务端完成 top-N，不再把全部历史传回后在 Python 里截断
             rows = await conn.fetch(
-                '''SELECT code, date, open, close, high, low, volume, amount
-                   FROM stock_kline_data
-                   WHERE code = ANY($1)
-                   ORDER BY code, date DESC''',
-                codes
+                '''SELECT c.code, recent.*
+                   FROM unnest($1::text[]) AS c(code)
+                   CROSS JOIN LATERAL (
+                       SELECT array_agg(date ORDER BY date) AS dates,
+                              array_agg(open ORDER BY date) AS opens,
+                              array_agg(close ORDER BY date) AS closes,
+                              array_agg(high ORDER BY date) AS highs,
+                              array_agg(low ORDER BY date) AS lows,
+                              array_agg(volume ORDER BY date) AS volumes,
+                              array_agg(amount ORDER BY date) AS amounts
+                       FROM (
+                           SELECT date, open, close, high, low, volume, amount
+                           FROM stock_kline_data k
+                           WHERE k.code = c.code
+                           ORDER BY date DESC LIMIT $2
+                       ) AS bars
+                   ) AS recent
+                   WHERE recent.dates IS NOT NULL''',
+                list(codes), limit
             )
 
-            logger.info(f"SQL: 批量查询返回 {len(rows)} 条记录")
-
-            # 按 code 分组数据
-            code_data = {}
-            for row in rows:
-                code = row['code']
-                if code not in code_data:
-                    code_data[code] = []
-                code_data[code].append({
-                    'date': row['date'],
-                    'open': row['open'],
-                    'close': row['close'],
-                    'high': row['high'],
-                    'low': row['low'],
-                    'volume': row['volume'],
-                    'amount': row['amount']
-                })
-
-            # 转换为 DataFrame 并限制数量
-            result = {}
-            for code in codes:
-                if code in code_data and code_data[code]:
-                    data = code_data[code][:limit]  # 限制数量
-                    df = pd.DataFrame(data)
-                    df.columns = ['日期', '开盘', '收盘', '最高', '最低', 'volume', 'amount']
-                    result[code] = df.iloc[::-1]  # 反转回正序
-                else:
-                    result[code] = None
+        logger.info(f"SQL: 批量查询返回 {len(rows)} 只股票")
+        return {row['code']: KlineRepository._arrays_from_row(row) for row in rows}
+
+    @staticmethod
+    async def get_arrays_since(starts):
+        """批量获取每只股票从各自起始日期（含）开始的K线列数组
 
-            return result
+        Args:
+            starts: {code: 起始日期}
+
+        Returns:
+            dict: {code: 列数组}，无数据的股票不在结果中
+        """
+        if not starts:
+            return {}
+
+        async with get_db_conn() as conn:
+            rows = await conn.fetch(
+                '''SELECT c.code, recent.*
+                   FROM unnest($1::text[], $2::date[]) AS c(code, start_date)
+                   CROSS JOIN LATERAL (
+                       SELECT array_agg(date ORDER BY date) AS dates,
+                              array_agg(open ORDER BY date) AS opens,
+                              array_agg(close ORDER BY date) AS closes,
+                              array_agg(high ORDER BY date) AS highs,
+                              array_agg(low ORDER BY date) AS lows,
+                              array_agg(volume ORDER BY date) AS volumes,
+                              array_agg(amount ORDER BY date) AS amounts
+                       FROM stock_kline_data k
+                       WHERE k.code = c.code AND k.date >= c.start_date
+                   ) AS recent
+                   WHERE recent.dates IS NOT NULL''',
+                list(starts), list(starts.values())
+            )
+
+        logger.debug(f"SQL: 按起始日期查询 {len(starts)} 只股票的K线，返回 {len(rows)} 只")
+        return {row['code']: KlineRepository._arrays_from_row(row) for row in rows}
+
+    @staticmethod
+    async def get_batch_by_codes(codes, limit=250):
+        """批量获取多只股票的K线数据
+
+        Args:
+            codes: 股票代码列表
+            limit: 每只股票返回的最大记录数
+
+        Returns:
+            dict: {code: DataFrame} 的字典，无数据的股票为 None
+        """
+        if not codes:
+            return {}
+
+        arrays = await KlineRepository.get_arrays_by_codes(codes, limit)
+        return {
+            code: KlineRepository._frame_from_arrays(arrays[code]) if code in arrays else None
+            for code in codes
+        }
 
     @staticmethod
     async def get_by_code(code, limit=250):
-        """获取K线数据（返回DataFrame）"""
+        """获取K线数据（返回DataFrame，日期为 datetime64，价格为 float64）"""
         logger.debug(f"SQL: SELECT date, open, close, high, low, volume, amount FROM stock_kline_data WHERE code = '{code}' ORDER BY date DESC LIMIT {limit}")
         async with get_db_conn() as conn:
-            rows = await conn.fetch(
-                '''SELECT date, open, close, high, low, volume, amount
-                   FROM stock_kline_data
-                   WHERE code = $1
-                   ORDER BY date DESC LIMIT $2''',
+            row = await conn.fetchrow(
+                '''SELECT array_agg(date ORDER BY date) AS dates,
+                          array_agg(open ORDER BY date) AS opens,
+                          array_agg(close ORDER BY date) AS closes,
+                          array_agg(high ORDER BY date) AS highs,
+                          array_agg(low ORDER BY date) AS lows,
+                          array_agg(volume ORDER BY date) AS volumes,
+                          array_agg(amount ORDER BY date) AS amounts
+                   FROM (
+                       SELECT date, open, close, high, low, volume, amount
+                       FROM stock_kline_data
+                       WHERE code = $1
+                       ORDER BY date DESC LIMIT $2
+                   ) AS recent''',
                 code, limit
             )
-            logger.debug(f"SQL: 查询返回 {len(rows)} 条记录")
 
-            if rows:
-                data = [dict(row) for row in rows]
-                df = pd.DataFrame(data)
-                df.columns = ['日期', '开盘', '收盘', '最高', '最低', 'volume', 'amount']
-                return df.iloc[::-1]  # 反转回正序
+            if row and row['dates']:
+                logger.debug(f"SQL: 查询返回 {len(row['dates'])} 条记录")
+                return KlineRepository._frame_from_arrays(row)
+            logger.debug("SQL: 查询返回 0 条记录")
             return None
 
     @staticmethod
@@ -202,20 +431,16 @@ class KlineRepository:
 
     @staticmethod
     async def get_latest_date(code):
-        """获取最新K线日期"""
-        logger.debug(f"SQL: SELECT MAX(date) FROM stock_kline_data WHERE code = '{code}'")
-        async with get_db_conn() as conn:
-            result = await conn.fetchval(
-                'SELECT MAX(date) FROM stock_kline_data WHERE code = $1',
-                code
-            )
-            logger.debug(f"SQL: 查询返回最新日期: {result}")
-            return result
+        """获取最新K线日期（读 kline_coverage，不扫描 K 线；没有汇总行时退回 MAX(date)）"""
+        latest_dates = await KlineRepository.get_latest_dates_batch([code])
+        return latest_dates[code]
 
     @staticmethod
     async def get_latest_dates_batch(codes):
-        """批量获取多只股票的最新K线日期
-        
+        """批量获取多只股票的最新K线日期（读 kline_coverage，每只股票一次主键查找）
+
+        kline_coverage 中没有汇总行的股票退回按 (code, date) 索引取 MAX(date)，确实没有K线的股票返回 None。
+
         Args:
             codes: 股票代码列表
             
@@ -230,20 +455,18 @@ class KlineRepository:
         async with get_db_conn() as conn:
             # 使用 ANY 子句批量查询
             results = await conn.fetch(
-                '''SELECT code, MAX(date) as max_date 
-                   FROM stock_kline_data 
-                   WHERE code = ANY($1) 
-                   GROUP BY code''',
+                '''SELECT code, last_date
+                   FROM kline_coverage
+                   WHERE code = ANY($1)''',
                 codes
             )
-            
-            # 构建结果字典
-            latest_dates = {row['code']: row['max_date'] for row in results}
-            
-            # 为没有数据的股票返回 None
-            for code in codes:
-                if code not in latest_dates:
-                    latest_dates[code] = None
+            latest_dates = {row['code']: row['last_date'] for row in results}
+
+            uncovered = [code for code in dict.fromkeys(codes) if code not in latest_dates]
+            if uncovered:
+                logger.debug(f"SQL: {len(uncovered)} 只股票没有 kline_coverage 汇总，按 MAX(date) 查询")
+                for row in await conn.fetch(LATEST_DATE_FALLBACK_SQL, uncovered):
+                    latest_dates[row['code']] = row['last_date']
             
             logger.debug(f"SQL: 批量查询完成，返回 {len([v for v in latest_dates.values() if v is not None])} 条有效记录")
             return latest_dates
@@ -264,11 +487,11 @@ class KlineRepository:
         
         # 找到最近的交易日（如果是周末，往前推到周五）
         if weekday == 5:  # 周六
-            latest_trade_date = (now - timedelta(days=1)).strftime('%Y-%m-%d')  # 周五
+            latest_trade_date = (now - timedelta(days=1)).date()  # 周五
         elif weekday == 6:  # 周日
-            latest_trade_date = (now - timedelta(days=2)).strftime('%Y-%m-%d')  # 周五
+            latest_trade_date = (now - timedelta(days=2)).date()  # 周五
         else:
-            latest_trade_date = now.strftime('%Y-%m-%d')  # 周一到周五
+            latest_trade_date = now.date()  # 周一到周五
         
         # 使用批量查询一次性获取所有股票的最新日期
         latest_dates_dict = await KlineRepository.get_latest_dates_batch(codes)
@@ -287,6 +510,21 @@ class KlineRepository:
         logger.info(f"SQL: 筛选出 {len(need_update)} 只股票需要更新，详情: {need_update_details[:5]}...")
         return need_update
 
+    @staticmethod
+    async def ensure_partitions(years_ahead=1):
+        """按年补建分区（单表布局下为空操作）
+
+        Returns:
+            int: 新建的分区数
+        """
+        async with get_db_conn() as conn:
+            created = await conn.fetchval(
+                "SELECT ensure_stock_kline_partitions('stock_kline_data', $1)",
+                years_ahead
+            )
+            logger.info(f"SQL: K线分区维护完成，新建 {created} 个分区")
+            return created
+
     @staticmethod
     async def has_updated_today():
         """检查今天是否已更新"""
@@ -342,40 +580,19 @@ class KlineRepository:
         Returns:
             DataFrame: 包含K线数据的DataFrame，列名包括：日期、开盘、收盘、最高、最低、成交量、成交额
         """
+        start = date.fromisoformat(start_date) if start_date else None
+        end = date.fromisoformat(end_date) if end_date else None
+
         async with get_db_conn() as conn:
-            # 构建查询条件
-            if start_date and end_date:
-                rows = await conn.fetch(
-                    '''SELECT date, open, close, high, low, volume, amount
-                       FROM stock_kline_data
-                       WHERE code = $1 AND date >= $2 AND date <= $3
-                       ORDER BY date ASC''',
-                    code, start_date, end_date
-                )
-            elif start_date:
-                rows = await conn.fetch(
-                    '''SELECT date, open, close, high, low, volume, amount
-                       FROM stock_kline_data
-                       WHERE code = $1 AND date >= $2
-                       ORDER BY date ASC''',
-                    code, start_date
-                )
-            elif end_date:
-                rows = await conn.fetch(
-                    '''SELECT date, open, close, high, low, volume, amount
-                       FROM stock_kline_data
-                       WHERE code = $1 AND date <= $2
-                       ORDER BY date ASC''',
-                    code, end_date
-                )
-            else:
-                rows = await conn.fetch(
-                    '''SELECT date, open, close, high, low, volume, amount
-                       FROM stock_kline_data
-                       WHERE code = $1
-                       ORDER BY date ASC''',
-                    code
-                )
+            rows = await conn.fetch(
+                '''SELECT date, open, close, high, low, volume, amount
+                   FROM stock_kline_data
+                   WHERE code = $1
+                     AND ($2::date IS NULL OR date >= $2)
+                     AND ($3::date IS NULL OR date <= $3)
+                   ORDER BY date ASC''',
+                code, start, end
+            )
 
             if rows:
                 # 将数据库记录转换为字典列表
@@ -0,0 +1,45 @@
+from repositories.schema_migrations import ensure_schema
+from utils.db import get_db_conn
+from utils.logger import get_logger
+
+logger = get_logger('monitor_snapshot_repository')
+
+
+class MonitorSnapshotRepository:
+    """监控看板快照仓储层，每个版本一行，payload 为 JSON 文本"""
+
+    @staticmethod
+    async def save(built_at, stock_count: int, payload_json: str, keep: int) -> int:
+        """写入新版本并删除最近 keep 个之外的旧版本，返回新版本号"""
+        await ensure_schema()
+        async with get_db_conn() as conn:
+            async with conn.transaction():
+                version = await conn.fetchval(
+                    '''
+                    INSERT INTO monitor_snapshots (built_at, stock_count, payload)
+                    VALUES ($1, $2, $3::jsonb)
+                    RETURNING version
+                    ''',
+                    built_at,
+                    stock_count,
+                    payload_json,
+                )
+                await conn.execute(
+                    'DELETE FROM monitor_snapshots WHERE version <= $1',
+                    version - max(keep, 1),
+                )
+        return version
+
+    @staticmethod
+    async def get_latest():
+        """返回最新版本的 (version, built_at, payload 文本)，没有快照时返回 None"""
+        await ensure_schema()
+        async with get_db_conn() as conn:
+            return await conn.fetchrow(
+                '''
+                SELECT version, built_at, payload::text AS payload
+                FROM monitor_snapshots
+                ORDER BY version DESC
+                LIMIT 1
+                '''
+            )
@@ -1,6 +1,7 @@
 from datetime import datetime
 
 from models.recap import RecapRecord
+from repositories.schema_migrations import ensure_schema
 from utils.db import get_db_conn
 from utils.logger import get_logger
 
@@ -8,36 +9,6 @@ logger = get_logger('recap_repository')
 
 
 class RecapRepository:
-    @staticmethod
-    async def ensure_table() -> None:
-        async with get_db_conn() as conn:
-            await conn.execute(
-                '''
-                CREATE TABLE IF NOT EXISTS trade_recaps (
-                    id SERIAL PRIMARY KEY,
-                    review_date TIMESTAMP NOT NULL,
-                    stock_name VARCHAR(100) NOT NULL,
-                    stock_code VARCHAR(20),
-                    take_profit NUMERIC(12, 4),
-                    stop_loss NUMERIC(12, 4),
-                    risk_reward_ratio NUMERIC(12, 4),
-                    profit_amount NUMERIC(14, 2),
-                    is_success BOOLEAN NOT NULL DEFAULT FALSE,
-                    failure_reason TEXT,
-                    strategy_tag VARCHAR(100),
-                    summary TEXT,
-                    lessons_learned TEXT,
-                    notes TEXT,
-                    image_path TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-                '''
-            )
-            await conn.execute('ALTER TABLE trade_recaps ADD COLUMN IF NOT EXISTS profit_amount NUMERIC(14, 2)')
-            await conn.execute('CREATE INDEX IF NOT EXISTS idx_trade_recaps_review_date ON trade_recaps(review_date DESC)')
-            await conn.execute('CREATE INDEX IF NOT EXISTS idx_trade_recaps_stock_code ON trade_recaps(stock_code)')
-
     @staticmethod
     def _build_model(row) -> RecapRecord:
         return RecapRecord(
@@ -62,7 +33,7 @@ class RecapRepository:
 
     @staticmethod
     async def list_records(limit: int = 100) -> list[RecapRecord]:
-        await RecapRepository.ensure_table()
+        await ensure_schema()
         async with get_db_conn() as conn:
             rows = await conn.fetch(
                 '''
@@ -77,7 +48,7 @@ class RecapRepository:
 
     @staticmethod
     async def get_record(record_id: int) -> RecapRecord | None:
-        await RecapRepository.ensure_table()
+        await ensure_schema()
         async with get_db_conn() as conn:
             row = await conn.fetchrow(
                 '''
@@ -107,7 +78,7 @@ class RecapRepository:
         notes: str | None,
         image_path: str | None,
     ) -> int:
-        await RecapRepository.ensure_table()
+        await ensure_schema()
         async with get_db_conn() as conn:
             row = await conn.fetchrow(
                 '''
@@ -153,7 +124,7 @@ class RecapRepository:
         notes: str | None,
         image_path: str | None,
     ) -> bool:
-        await RecapRepository.ensure_table()
+        await ensure_schema()
         async with get_db_conn() as conn:
             result = await conn.execute(
                 '''
@@ -195,7 +166,7 @@ class RecapRepository:
 
     @staticmethod
     async def delete_record(record_id: int) -> bool:
-        await RecapRepository.ensure_table()
+        await ensure_schema()
         async with get_db_conn() as conn:
             result = await conn.execute('DELETE FROM trade_recaps WHERE id = $1', record_id)
             return result.endswith('1')
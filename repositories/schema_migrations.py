@@ -0,0 +1,368 @@
+from utils.db import get_db_conn
+from utils.logger import get_logger
+
+logger = get_logger('schema_migrations')
+
+# 多个进程同时启动时用同一把 advisory lock 串行执行迁移
+MIGRATION_LOCK_KEY = 7_204_118
+
+# (版本号, 名称, DDL 列表)。版本号只增不改，已发布的迁移不再修改，表结构变化追加新版本。
+# 早期版本的语句都带 IF NOT EXISTS，已用 sql/init_postgres.sql 初始化过的库可以直接登记。
+MIGRATIONS = [
+    (
+        1,
+        'analysis_reports',
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS analysis_reports (
+                id SERIAL PRIMARY KEY,
+                code VARCHAR(20) NOT NULL,
+                stock_name VARCHAR(100),
+                period VARCHAR(20) NOT NULL,
+                kline_count INTEGER NOT NULL,
+                model_name VARCHAR(100) NOT NULL,
+                prompt_text TEXT NOT NULL,
+                input_payload JSONB NOT NULL,
+                analysis_markdown TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            'CREATE INDEX IF NOT EXISTS idx_analysis_reports_created_at ON analysis_reports(created_at DESC)',
+            'CREATE INDEX IF NOT EXISTS idx_analysis_reports_code ON analysis_reports(code)',
+        ],
+    ),
+    (
+        2,
+        'prompt_assets',
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS prompt_assets (
+                asset_key VARCHAR(255) PRIMARY KEY,
+                category VARCHAR(50) NOT NULL,
+                source_path TEXT NOT NULL,
+                content TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            'ALTER TABLE prompt_assets ADD COLUMN IF NOT EXISTS fingerprint TEXT',
+            'CREATE INDEX IF NOT EXISTS idx_prompt_assets_category ON prompt_assets(category)',
+        ],
+    ),
+    (
+        3,
+        'trade_recaps',
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS trade_recaps (
+                id SERIAL PRIMARY KEY,
+                review_date TIMESTAMP NOT NULL,
+                stock_name VARCHAR(100) NOT NULL,
+                stock_code VARCHAR(20),
+                take_profit NUMERIC(12, 4),
+                stop_loss NUMERIC(12, 4),
+                risk_reward_ratio NUMERIC(12, 4),
+                profit_amount NUMERIC(14, 2),
+                is_success BOOLEAN NOT NULL DEFAULT FALSE,
+                failure_reason TEXT,
+                strategy_tag VARCHAR(100),
+                summary TEXT,
+                lessons_learned TEXT,
+                notes TEXT,
+                image_path TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            'ALTER TABLE trade_recaps ADD COLUMN IF NOT EXISTS profit_amount NUMERIC(14, 2)',
+            'CREATE INDEX IF NOT EXISTS idx_trade_recaps_review_date ON trade_recaps(review_date DESC)',
+            'CREATE INDEX IF NOT EXISTS idx_trade_recaps_stock_code ON trade_recaps(stock_code)',
+        ],
+    ),
+    (
+        4,
+        'custom_portfolios',
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS custom_portfolios (
+                id SERIAL PRIMARY KEY,
+                name VARCHAR(120) NOT NULL,
+                notes TEXT DEFAULT '',
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS custom_portfolio_holdings (
+                id SERIAL PRIMARY KEY,
+                portfolio_id INTEGER NOT NULL REFERENCES custom_portfolios(id) ON DELETE CASCADE,
+                code VARCHAR(20) NOT NULL,
+                name VARCHAR(80) NOT NULL,
+                cost_price NUMERIC(12, 3) NOT NULL CHECK (cost_price >= 0),
+                shares INTEGER NOT NULL CHECK (shares > 0),
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            '''
+            CREATE INDEX IF NOT EXISTS idx_custom_portfolio_holdings_portfolio_id
+            ON custom_portfolio_holdings(portfolio_id)
+            ''',
+            '''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_custom_portfolio_holdings_unique
+            ON custom_portfolio_holdings(portfolio_id, code)
+            ''',
+        ],
+    ),
+    (
+        5,
+        'kline_backfill',
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS kline_backfill_jobs (
+                id SERIAL PRIMARY KEY,
+                mode VARCHAR(20) NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'running',
+                total_codes INTEGER NOT NULL DEFAULT 0,
+                ok_count INTEGER NOT NULL DEFAULT 0,
+                empty_count INTEGER NOT NULL DEFAULT 0,
+                failed_count INTEGER NOT NULL DEFAULT 0,
+                rows_written BIGINT NOT NULL DEFAULT 0,
+                codes_per_min REAL,
+                rows_per_min REAL,
+                started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS kline_backfill_items (
+                job_id INTEGER NOT NULL REFERENCES kline_backfill_jobs(id) ON DELETE CASCADE,
+                code VARCHAR(20) NOT NULL,
+                status VARCHAR(10) NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                rows_written INTEGER NOT NULL DEFAULT 0,
+                next_retry_at TIMESTAMP,
+                last_error TEXT,
+                updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (job_id, code)
+            )
+            ''',
+            '''
+            CREATE INDEX IF NOT EXISTS idx_kline_backfill_items_status
+            ON kline_backfill_items(job_id, status)
+            ''',
+        ],
+    ),
+    (
+        6,
+        'ema_state',
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS ema_state (
+                code TEXT NOT NULL,
+                timeframe TEXT NOT NULL,
+                span INTEGER NOT NULL,
+                ema DOUBLE PRECISION NOT NULL,
+                ema_prev DOUBLE PRECISION,
+                last_bin INTEGER NOT NULL,
+                last_date DATE NOT NULL,
+                bar_count INTEGER NOT NULL,
+                updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (code, timeframe, span)
+            )
+            ''',
+        ],
+    ),
+    (
+        7,
+        'stock_kline_derived',
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS stock_kline_derived (
+                code TEXT NOT NULL,
+                timeframe TEXT NOT NULL,
+                date DATE NOT NULL,
+                open DOUBLE PRECISION NOT NULL,
+                close DOUBLE PRECISION NOT NULL,
+                high DOUBLE PRECISION NOT NULL,
+                low DOUBLE PRECISION NOT NULL,
+                volume BIGINT NOT NULL,
+                amount DOUBLE PRECISION NOT NULL,
+                last_date DATE NOT NULL,
+                updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (code, timeframe, date)
+            )
+            ''',
+        ],
+    ),
+    (
+        8,
+        'monitor_snapshots',
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS monitor_snapshots (
+                version BIGSERIAL PRIMARY KEY,
+                built_at TIMESTAMP NOT NULL,
+                stock_count INTEGER NOT NULL,
+                payload JSONB NOT NULL
+            )
+            ''',
+        ],
+    ),
+    (
+        9,
+        'monitor_data_cache_field_freshness',
+        [
+            '''
+            ALTER TABLE monitor_data_cache
+                ADD COLUMN IF NOT EXISTS ema_as_of DATE,
+                ADD COLUMN IF NOT EXISTS eps_updated_at TIMESTAMP
+            ''',
+        ],
+    ),
+    (
+        10,
+        'kline_coverage',
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS kline_coverage (
+                code TEXT PRIMARY KEY,
+                first_date DATE NOT NULL,
+                last_date DATE NOT NULL,
+                bar_count INTEGER NOT NULL DEFAULT 0 CHECK (bar_count >= 0),
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            # 尚未迁移到 DATE 列的旧表 date 为 TEXT，显式转换后再写入
+            '''
+            INSERT INTO kline_coverage (code, first_date, last_date, bar_count)
+            SELECT code, MIN(date)::date, MAX(date)::date, COUNT(*)
+            FROM stock_kline_data
+            GROUP BY code
+            ON CONFLICT (code) DO NOTHING
+            ''',
+        ],
+    ),
+    (
+        11,
+        'stock_kline_partition_functions',
+        [
+            # 定时维护任务调用 ensure_stock_kline_partitions，单表布局下直接返回 0
+            '''
+            CREATE OR REPLACE FUNCTION ensure_stock_kline_partitions(
+                p_table TEXT DEFAULT 'stock_kline_data',
+                p_years_ahead INTEGER DEFAULT 1,
+                p_from_year INTEGER DEFAULT NULL
+            )
+            RETURNS INTEGER AS $$
+            DECLARE
+                v_year INTEGER;
+                v_to_year INTEGER := EXTRACT(YEAR FROM CURRENT_DATE)::INTEGER + p_years_ahead;
+                v_created INTEGER := 0;
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(p_table)) THEN
+                    RETURN 0;
+                END IF;
+
+                FOR v_year IN COALESCE(p_from_year, EXTRACT(YEAR FROM CURRENT_DATE)::INTEGER)..v_to_year LOOP
+                    IF to_regclass(p_table || '_y' || v_year) IS NULL THEN
+                        EXECUTE format(
+                            'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                            p_table || '_y' || v_year, p_table, make_date(v_year, 1, 1), make_date(v_year + 1, 1, 1)
+                        );
+                        v_created := v_created + 1;
+                    END IF;
+                END LOOP;
+                RETURN v_created;
+            END;
+            $$ LANGUAGE plpgsql
+            ''',
+            '''
+            CREATE OR REPLACE FUNCTION create_stock_kline_partitioned_table(
+                p_table TEXT,
+                p_from_year INTEGER DEFAULT NULL
+            )
+            RETURNS VOID AS $$
+            BEGIN
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I (
+                        id BIGSERIAL,
+                        code TEXT NOT NULL,
+                        date DATE NOT NULL,
+                        open DOUBLE PRECISION NOT NULL CHECK (open > 0),
+                        close DOUBLE PRECISION NOT NULL CHECK (close > 0),
+                        high DOUBLE PRECISION NOT NULL CHECK (high > 0),
+                        low DOUBLE PRECISION NOT NULL CHECK (low > 0),
+                        volume BIGINT NOT NULL CHECK (volume >= 0),
+                        amount DOUBLE PRECISION NOT NULL CHECK (amount >= 0),
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (code, date),
+                        CONSTRAINT chk_ohlc_valid CHECK (high >= open AND high >= close AND high >= low AND low <= open AND low <= close)
+                    ) PARTITION BY RANGE (date)',
+                    p_table
+                );
+                -- 兜底分区只接收超出年度分区范围的数据，正常情况下应为空
+                EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF %I DEFAULT', p_table || '_default', p_table);
+                PERFORM ensure_stock_kline_partitions(p_table, 1, p_from_year);
+            END;
+            $$ LANGUAGE plpgsql
+            ''',
+        ],
+    ),
+]
+
+_schema_ready = False
+
+
+def is_schema_ready() -> bool:
+    return _schema_ready
+
+
+async def run_migrations() -> list[int]:
+    """执行尚未登记的迁移，返回本次执行的版本号。每个版本单独一个事务，执行成功才登记到 schema_migrations"""
+    global _schema_ready
+    applied_now = []
+    async with get_db_conn() as conn:
+        await conn.execute('SELECT pg_advisory_lock($1)', MIGRATION_LOCK_KEY)
+        try:
+            await conn.execute(
+                '''
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+                '''
+            )
+            rows = await conn.fetch('SELECT version FROM schema_migrations')
+            applied = {row['version'] for row in rows}
+            for version, name, statements in MIGRATIONS:
+                if version in applied:
+                    continue
+                async with conn.transaction():
+                    for statement in statements:
+                        await conn.execute(statement)
+                    await conn.execute(
+                        'INSERT INTO schema_migrations (version, name) VALUES ($1, $2)',
+                        version,
+                        name,
+                    )
+                applied_now.append(version)
+                logger.info(f'已执行表结构迁移 {version:03d}_{name}')
+        finally:
+            await conn.execute('SELECT pg_advisory_unlock($1)', MIGRATION_LOCK_KEY)
+
+    _schema_ready = True
+    if applied_now:
+        logger.info(f'表结构迁移完成，本次执行 {len(applied_now)} 个版本，当前版本 {MIGRATIONS[-1][0]}')
+    else:
+        logger.info(f'表结构已是最新版本 {MIGRATIONS[-1][0]}')
+    return applied_now
+
+
+async def ensure_schema() -> None:
+    """仓储层读写前调用：启动时已迁移则直接返回；启动时数据库不可用的进程在首次访问时补做迁移"""
+    if _schema_ready:
+        return
+    await run_migrations()
@@ -0,0 +1,340 @@
+"""stock_kline_data 在线迁移：转为 DATE / DOUBLE PRECISION 类型，可选按年分区布局。
+
+适用于两类变更：旧库 TEXT 日期 / REAL 价格 -> 类型化单表，以及单表 <-> 按年分区表。
+采用 expand / backfill / swap / contract 四步，旧表全程可读写，只有 swap 时短暂持有排他锁：
+
+    python scripts/migrate_kline_table.py expand [--layout partitioned]  # 建 stock_kline_data_typed + 镜像触发器
+    python scripts/migrate_kline_table.py backfill      # 按 (code, date) 分批复制历史数据，可用 --start-code 续跑
+    python scripts/migrate_kline_table.py status        # 查看两张表的布局与行数
+    python scripts/migrate_kline_table.py swap          # 校验后改名切换，旧表保留为 stock_kline_data_legacy
+    python scripts/migrate_kline_table.py drop-legacy   # 确认无误后删除旧表
+
+expand 之后旧表上的每次写入都会被触发器同步到新表；backfill 补齐已存在的行，
+与触发器冲突时以触发器写入的较新数据为准，复制结束后再清理复制期间已在旧表删除的行。
+从 TEXT / REAL 旧库迁移时，新版本代码按 DATE / DOUBLE 读写，因此 swap 应与新版本发布在同一次停机重启中执行（swap 本身只是改名，耗时在毫秒级）。
+分区布局依赖 create_stock_kline_partitioned_table / ensure_stock_kline_partitions，两者由表结构迁移 011 创建（脚本启动时先执行迁移）。
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+load_dotenv()
+
+from repositories.schema_migrations import run_migrations  # noqa: E402
+from utils.db import close_db_pool, get_db_conn, init_db_pool  # noqa: E402
+
+OLD_TABLE = 'stock_kline_data'
+NEW_TABLE = 'stock_kline_data_typed'
+LEGACY_TABLE = 'stock_kline_data_legacy'
+MIRROR_TRIGGER = 'trigger_mirror_stock_kline_data_typed'
+MIRROR_FUNCTION = 'mirror_stock_kline_data_typed'
+
+# REAL 先转 text 再转 double：PostgreSQL 输出 float4 时使用最短往返表示，
+# 10.33::real::text 为 '10.33'，直接 ::double precision 会得到 10.329999923706055；
+# 源表已是 DATE / DOUBLE 时这些转换不改变取值
+TYPED_COLUMNS = '''code, date::date, open::text::double precision, close::text::double precision,
+                   high::text::double precision, low::text::double precision, volume,
+                   amount::text::double precision, created_at, updated_at'''
+
+
+async def describe(conn, table):
+    """返回表的布局：None（不存在）或 {'typed': bool, 'partitioned': bool}"""
+    row = await conn.fetchrow(
+        '''SELECT c.relkind::text AS relkind,
+                  (SELECT data_type FROM information_schema.columns
+                   WHERE table_name = $1 AND column_name = 'date') AS date_type
+           FROM pg_class c
+           WHERE c.oid = to_regclass($1)''',
+        table
+    )
+    if row is None:
+        return None
+    return {'typed': row['date_type'] == 'date', 'partitioned': row['relkind'] == 'p'}
+
+
+def layout_name(layout):
+    if layout is None:
+        return '不存在'
+    kind = '按年分区' if layout['partitioned'] else '单表'
+    return f"{kind}，{'DATE / DOUBLE' if layout['typed'] else 'TEXT / REAL'}"
+
+
+async def expand(target_layout, from_year):
+    partitioned = target_layout == 'partitioned'
+    async with get_db_conn() as conn:
+        current = await describe(conn, OLD_TABLE)
+        if current['typed'] and current['partitioned'] == partitioned:
+            print(f'{OLD_TABLE} 已是目标布局（{layout_name(current)}），无需迁移')
+            return
+
+        if partitioned:
+            if from_year is None:
+                # 只读扫描一次旧表，让年度分区覆盖全部历史数据
+                from_year = await conn.fetchval(f'SELECT EXTRACT(YEAR FROM MIN(date)::date)::int FROM {OLD_TABLE}')
+            await conn.execute('SELECT create_stock_kline_partitioned_table($1, $2)', NEW_TABLE, from_year)
+        else:
+            await conn.execute(
+                f'''
+                CREATE TABLE IF NOT EXISTS {NEW_TABLE} (
+                    id BIGSERIAL PRIMARY KEY,
+                    code TEXT NOT NULL,
+                    date DATE NOT NULL,
+                    open DOUBLE PRECISION NOT NULL CHECK (open > 0),
+                    close DOUBLE PRECISION NOT NULL CHECK (close > 0),
+                    high DOUBLE PRECISION NOT NULL CHECK (high > 0),
+                    low DOUBLE PRECISION NOT NULL CHECK (low > 0),
+                    volume BIGINT NOT NULL CHECK (volume >= 0),
+                    amount DOUBLE PRECISION NOT NULL CHECK (amount >= 0),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE (code, date),
+                    CONSTRAINT chk_ohlc_valid
+                        CHECK (high >= open AND high >= close AND high >= low AND low <= open AND low <= close)
+                )
+                '''
+            )
+        await conn.execute(
+            f'''
+            CREATE OR REPLACE FUNCTION {MIRROR_FUNCTION}()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    IF TG_OP = 'DELETE' OR (OLD.code, OLD.date) IS DISTINCT FROM (NEW.code, NEW.date) THEN
+                        DELETE FROM {NEW_TABLE} WHERE code = OLD.code AND date = OLD.date::date;
+                    END IF;
+                    IF TG_OP = 'DELETE' THEN
+                        RETURN OLD;
+                    END IF;
+                END IF;
+                INSERT INTO {NEW_TABLE} (code, date, open, close, high, low, volume, amount, created_at, updated_at)
+                VALUES (NEW.code, NEW.date::date, NEW.open::text::double precision, NEW.close::text::double precision,
+                        NEW.high::text::double precision, NEW.low::text::double precision, NEW.volume,
+                        NEW.amount::text::double precision, NEW.created_at, NEW.updated_at)
+                ON CONFLICT (code, date) DO UPDATE
+                SET open = EXCLUDED.open, close = EXCLUDED.close, high = EXCLUDED.high, low = EXCLUDED.low,
+                    volume = EXCLUDED.volume, amount = EXCLUDED.amount, updated_at = EXCLUDED.updated_at;
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql
+            '''
+        )
+        async with conn.transaction():
+            # 建触发器需要短暂的 SHARE ROW EXCLUSIVE 锁，拿不到就放弃，避免排在长事务后面阻塞写入
+            await conn.execute("SET LOCAL lock_timeout = '5s'")
+            await conn.execute(f'DROP TRIGGER IF EXISTS {MIRROR_TRIGGER} ON {OLD_TABLE}')
+            await conn.execute(
+                f'''CREATE TRIGGER {MIRROR_TRIGGER}
+                    AFTER INSERT OR UPDATE OR DELETE ON {OLD_TABLE}
+                    FOR EACH ROW EXECUTE FUNCTION {MIRROR_FUNCTION}()'''
+            )
+        target = await describe(conn, NEW_TABLE)
+    print(f'已创建 {NEW_TABLE}（{layout_name(target)}）与镜像触发器，可以开始 backfill')
+
+
+async def backfill(batch_size, start_code, pause):
+    async with get_db_conn() as conn:
+        has_trigger = await conn.fetchval(
+            'SELECT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = $1)', MIRROR_TRIGGER
+        )
+        if not has_trigger:
+            print('镜像触发器不存在，请先执行 expand')
+            return
+        # 分区表的父表没有统计行数，按子表估算
+        estimated = await conn.fetchval(
+            '''SELECT COALESCE(SUM(GREATEST(reltuples, 0)), 0)::bigint FROM pg_class
+               WHERE oid = to_regclass($1)
+                  OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass($1))''',
+            OLD_TABLE
+        )
+
+    # 按唯一键 (code, date) 做 keyset 分页，单表和分区表都能走索引；每批一个短事务
+    batch_sql = f'''
+        WITH batch AS (
+            SELECT * FROM {OLD_TABLE}
+            WHERE {{condition}}
+            ORDER BY code, date
+            LIMIT {int(batch_size)}
+        ), inserted AS (
+            INSERT INTO {NEW_TABLE} (code, date, open, close, high, low, volume, amount, created_at, updated_at)
+            SELECT {TYPED_COLUMNS} FROM batch
+            ON CONFLICT (code, date) DO NOTHING
+            RETURNING 1
+        )
+        SELECT last.code, last.date,
+               (SELECT COUNT(*) FROM batch) AS scanned,
+               (SELECT COUNT(*) FROM inserted) AS copied
+        FROM (SELECT code, date FROM batch ORDER BY code DESC, date DESC LIMIT 1) AS last
+    '''
+    first_sql = batch_sql.format(condition='code >= $1')
+    next_sql = batch_sql.format(condition='(code, date) > ($1, $2)')
+
+    scanned = 0
+    copied = 0
+    cursor = None
+    start = time.perf_counter()
+    while True:
+        async with get_db_conn() as conn:
+            if cursor is None:
+                row = await conn.fetchrow(first_sql, start_code)
+            else:
+                row = await conn.fetchrow(next_sql, *cursor)
+        if row is None:
+            break
+        cursor = (row['code'], row['date'])
+        scanned += row['scanned']
+        copied += row['copied']
+        elapsed = time.perf_counter() - start
+        progress = f'{scanned / estimated:6.1%}' if estimated else '      '
+        print(
+            f'{progress}  已扫描 {scanned:,} 行，新增 {copied:,} 行  {scanned / max(elapsed, 1e-6):,.0f} 行/秒  '
+            f'游标 {cursor[0]} {cursor[1]}'
+        )
+        if pause:
+            await asyncio.sleep(pause)
+    print(f'backfill 完成，共扫描 {scanned:,} 行，新增 {copied:,} 行，耗时 {time.perf_counter() - start:.1f}s')
+    await prune(batch_size)
+
+
+async def prune(batch_size):
+    """删除新表中旧表已不存在的行
+
+    某批 backfill 读取快照之后、写入新表之前，旧表删除了其中的行时，触发器的 DELETE 先于
+    backfill 的 INSERT 执行，该行会被重新写入新表。复制结束后按 (code, date) 分批比对一遍。
+    """
+    async with get_db_conn() as conn:
+        old_typed = (await describe(conn, OLD_TABLE))['typed']
+    # 用旧表的列类型比较，才能命中旧表 (code, date) 唯一索引
+    old_date = 'n.date' if old_typed else 'n.date::text'
+    prune_sql = f'''
+        WITH batch AS (
+            SELECT code, date FROM {NEW_TABLE}
+            WHERE {{condition}}
+            ORDER BY code, date
+            LIMIT {int(batch_size)}
+        ), deleted AS (
+            DELETE FROM {NEW_TABLE} t
+            USING batch n
+            WHERE t.code = n.code AND t.date = n.date
+              AND NOT EXISTS (SELECT 1 FROM {OLD_TABLE} o WHERE o.code = n.code AND o.date = {old_date})
+            RETURNING 1
+        )
+        SELECT last.code, last.date, (SELECT COUNT(*) FROM deleted) AS deleted
+        FROM (SELECT code, date FROM batch ORDER BY code DESC, date DESC LIMIT 1) AS last
+    '''
+    first_sql = prune_sql.format(condition='TRUE')
+    next_sql = prune_sql.format(condition='(code, date) > ($1, $2)')
+
+    cursor = None
+    removed = 0
+    while True:
+        async with get_db_conn() as conn:
+            row = await (conn.fetchrow(first_sql) if cursor is None else conn.fetchrow(next_sql, *cursor))
+        if row is None:
+            break
+        cursor = (row['code'], row['date'])
+        removed += row['deleted']
+    print(f'比对完成，清理复制期间已删除的行 {removed:,} 行')
+
+
+async def status():
+    async with get_db_conn() as conn:
+        for table in (OLD_TABLE, NEW_TABLE, LEGACY_TABLE):
+            layout = await describe(conn, table)
+            if layout is None:
+                print(f'{table}: 不存在')
+                continue
+            count = await conn.fetchval(f'SELECT COUNT(*) FROM {table}')
+            print(f'{table}: {layout_name(layout)}，{count:,} 行')
+
+
+async def rename_partitions(conn, table, new_prefix):
+    children = await conn.fetch(
+        '''SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+           WHERE i.inhparent = to_regclass($1)''',
+        table
+    )
+    for child in children:
+        name = child['relname']
+        if name.startswith(table):
+            await conn.execute(f'ALTER TABLE {name} RENAME TO {new_prefix}{name[len(table):]}')
+
+
+async def swap(force):
+    async with get_db_conn() as conn:
+        if await describe(conn, NEW_TABLE) is None:
+            print(f'{NEW_TABLE} 不存在，请先执行 expand 和 backfill')
+            return
+        if await describe(conn, LEGACY_TABLE) is not None:
+            print(f'{LEGACY_TABLE} 已存在，请先确认并执行 drop-legacy')
+            return
+        # 行数校验放在加锁之前，全表计数不占用排他锁
+        old_count = await conn.fetchval(f'SELECT COUNT(*) FROM {OLD_TABLE}')
+        new_count = await conn.fetchval(f'SELECT COUNT(*) FROM {NEW_TABLE}')
+        if old_count != new_count and not force:
+            print(f'行数不一致（{old_count:,} vs {new_count:,}），请先完成 backfill，或使用 --force')
+            return
+
+        async with conn.transaction():
+            await conn.execute("SET LOCAL lock_timeout = '5s'")
+            await conn.execute(f'LOCK TABLE {OLD_TABLE} IN ACCESS EXCLUSIVE MODE')
+            await conn.execute(f'DROP TRIGGER IF EXISTS {MIRROR_TRIGGER} ON {OLD_TABLE}')
+            # 分区名跟随父表前缀，定时任务按 stock_kline_data_y<年份> 补建分区
+            await rename_partitions(conn, OLD_TABLE, LEGACY_TABLE)
+            await conn.execute(f'ALTER TABLE {OLD_TABLE} RENAME TO {LEGACY_TABLE}')
+            await rename_partitions(conn, NEW_TABLE, OLD_TABLE)
+            await conn.execute(f'ALTER TABLE {NEW_TABLE} RENAME TO {OLD_TABLE}')
+            await conn.execute(f'DROP TRIGGER IF EXISTS trigger_update_stock_kline_data_updated_at ON {LEGACY_TABLE}')
+            await conn.execute(
+                f'''CREATE TRIGGER trigger_update_stock_kline_data_updated_at
+                    BEFORE UPDATE ON {OLD_TABLE}
+                    FOR EACH ROW EXECUTE FUNCTION update_stock_kline_data_updated_at()'''
+            )
+            await conn.execute(f'DROP FUNCTION IF EXISTS {MIRROR_FUNCTION}()')
+        current = await describe(conn, OLD_TABLE)
+    print(f'切换完成：{OLD_TABLE} 现为 {layout_name(current)}，旧表保留为 {LEGACY_TABLE}')
+
+
+async def drop_legacy():
+    async with get_db_conn() as conn:
+        if await describe(conn, NEW_TABLE) is not None:
+            print('尚未 swap，不能删除旧表')
+            return
+        await conn.execute(f'DROP TABLE IF EXISTS {LEGACY_TABLE}')
+    print(f'已删除 {LEGACY_TABLE}')
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('step', choices=['expand', 'backfill', 'status', 'swap', 'drop-legacy'])
+    parser.add_argument('--layout', choices=['flat', 'partitioned'], default='flat', help='expand 的目标布局')
+    parser.add_argument('--from-year', type=int, help='分区布局的起始年份，默认取旧表最早日期')
+    parser.add_argument('--batch', type=int, default=50000, help='backfill 每批复制的行数')
+    parser.add_argument('--start-code', default='', help='从该代码开始继续 backfill')
+    parser.add_argument('--pause', type=float, default=0.0, help='backfill 每批之间的休眠秒数')
+    parser.add_argument('--force', action='store_true', help='swap 时忽略行数校验')
+    args = parser.parse_args()
+
+    await init_db_pool()
+    try:
+        await run_migrations()
+        if args.step == 'expand':
+            await expand(args.layout, args.from_year)
+        elif args.step == 'backfill':
+            await backfill(args.batch, args.start_code, args.pause)
+        elif args.step == 'status':
+            await status()
+        elif args.step == 'swap':
+            await swap(args.force)
+        else:
+            await drop_legacy()
+    finally:
+        await close_db_pool()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,9 +1,8 @@
 import asyncio
 
-import aiohttp
-
 from repositories.custom_portfolio_repository import CustomPortfolioRepository
 from services.portfolio_service import PortfolioService
+from utils.http_clients import get_http_clients
 from utils.logger import get_logger
 
 logger = get_logger('custom_portfolio_service')
@@ -116,12 +115,9 @@ class CustomPortfolioService:
         if not stock_codes:
             return {}
 
-        headers = PortfolioService._get_headers()
-        connector = aiohttp.TCPConnector(limit=10, ttl_dns_cache=300)
-
-        async with aiohttp.ClientSession(headers=headers, connector=connector, trust_env=False) as session:
-            tasks = [PortfolioService._fetch_stock_price(session, code) for code in stock_codes]
-            fetched = await asyncio.gather(*tasks, return_exceptions=True)
+        session = get_http_clients().session()
+        tasks = [PortfolioService._fetch_stock_price(session, code) for code in stock_codes]
+        fetched = await asyncio.gather(*tasks, return_exceptions=True)
 
         price_map = {}
         for item in fetched:
@@ -0,0 +1,114 @@
+import numpy as np
+
+from repositories.derived_kline_repository import DerivedKlineRepository
+from repositories.kline_repository import KlineRepository
+from services.kline_timeframes import DERIVED_TIMEFRAMES, aggregate_bars, bin_first_day
+from utils.kline_store import get_kline_store
+from utils.logger import get_logger
+
+logger = get_logger('derived_kline_service')
+
+
+class DerivedKlineService:
+    """维护 2 日 / 3 日 / 周 / 月K聚合结果（stock_kline_derived）
+
+    读取方直接取目标周期的K线，不再每次请求对日K做 resample。
+    日K入库后只重算受影响的箱体：从新写入的第一根日K所在箱体的第一天起重读日K并聚合覆盖，
+    未走完的最后一个箱体随新日K不断被覆盖更新。
+    与 ema_state 一样，只维护已经聚合过的股票；从未读取过的股票在首次读取时按全部历史聚合，
+    聚合结果落后于 kline_coverage（其他进程写入了日K）时同样全量重算。
+    """
+
+    @staticmethod
+    def _aggregate_all(history, timeframes=DERIVED_TIMEFRAMES):
+        return {
+            (code, timeframe): aggregate_bars(arrays, timeframe)
+            for code, arrays in history.items()
+            for timeframe in timeframes
+        }
+
+    @staticmethod
+    async def rebuild(codes):
+        """按全部日K重新聚合一批股票的全部周期并落库
+
+        Returns:
+            dict: {(code, timeframe): 列数组}
+        """
+        from services.kline_service import KlineService
+
+        if not codes:
+            return {}
+        history = await KlineService.get_daily_arrays(list(codes), limit=None)
+        bars = DerivedKlineService._aggregate_all(history)
+        await DerivedKlineRepository.save_bars(bars)
+        logger.info(f"全量聚合 {len(history)} 只股票的 {'/'.join(DERIVED_TIMEFRAMES)} K线")
+        return bars
+
+    @staticmethod
+    async def apply_written_bars(kline_data_dict):
+        """日K入库后重算已聚合股票受影响的箱体"""
+        materialized = await DerivedKlineRepository.get_materialized_codes(list(kline_data_dict))
+        if not materialized:
+            return
+
+        first_written = {}
+        for code in materialized:
+            dates = KlineRepository._arrays_from_frame(kline_data_dict[code])['dates']
+            if len(dates):
+                first_written[code] = dates.min()
+        # 从各周期受影响箱体中最早的第一天起读一次日K，覆盖全部周期
+        starts = {
+            code: min(bin_first_day(day, timeframe) for timeframe in DERIVED_TIMEFRAMES)
+            for code, day in first_written.items()
+        }
+
+        store = get_kline_store()
+        daily = {}
+        for code, start in starts.items():
+            arrays = store.get_range(code, start)
+            if arrays is not None:
+                daily[code] = arrays
+        misses = {code: start.item() for code, start in starts.items() if code not in daily}
+        daily.update(await KlineRepository.get_arrays_since(misses))
+
+        bars = {}
+        for code, arrays in daily.items():
+            for timeframe in DERIVED_TIMEFRAMES:
+                begin = bin_first_day(first_written[code], timeframe)
+                offset = np.searchsorted(arrays['dates'], begin, side='left')
+                bars[(code, timeframe)] = aggregate_bars(
+                    {key: array[offset:] for key, array in arrays.items()}, timeframe
+                )
+        await DerivedKlineRepository.save_bars(bars)
+
+    @staticmethod
+    async def get_arrays(codes, timeframe, limit=250):
+        """批量读取最近 limit 根指定周期的K线列数组
+
+        Returns:
+            dict: {code: 列数组}，没有日K的股票不在结果中
+        """
+        codes = list(dict.fromkeys(codes))
+        stored, latest = await DerivedKlineRepository.get_arrays_by_codes(codes, timeframe, limit)
+        stale = [
+            code for code in codes
+            if code in latest and (
+                code not in stored
+                or stored[code]['last_dates'][-1] != np.datetime64(latest[code], 'D')
+            )
+        ]
+        if stale:
+            rebuilt = await DerivedKlineService.rebuild(stale)
+            for code in stale:
+                arrays = rebuilt.get((code, timeframe))
+                if arrays is not None and len(arrays['dates']):
+                    stored[code] = {key: array[-limit:] for key, array in arrays.items()}
+        return stored
+
+    @staticmethod
+    async def get_frame(code, timeframe, limit=250):
+        """读取单只股票最近 limit 根指定周期的K线（列名与日K DataFrame 一致），无数据时返回 None"""
+        arrays = (await DerivedKlineService.get_arrays([code], timeframe, limit)).get(code)
+        if arrays is None:
+            return None
+        return KlineRepository._frame_from_arrays(arrays)
@@ -0,0 +1,215 @@
+import numpy as np
+
+from repositories.ema_state_repository import EmaStateRepository
+from repositories.kline_repository import KlineRepository
+from services.indicator_engine import multi_span_ema, right_align
+from services.kline_timeframes import bin_ids, last_close_per_bin
+from utils.compute_executor import get_compute_executor
+from utils.logger import get_logger
+
+logger = get_logger('ema_state_service')
+
+# 监控各周期用到的 EMA 周期：长期 144 / 188 加三条趋势线
+MONITOR_EMA_SPANS = {
+    '1d': (144, 188, 5, 10, 20),
+    '2d': (144, 188, 10, 30, 60),
+    '3d': (144, 188, 7, 21, 42),
+}
+MONITOR_MIN_BARS = 188
+MONITOR_EMA_KEYS = ('ema144', 'ema188', 'ema5', 'ema10', 'ema20', 'ema30', 'ema60', 'ema7', 'ema21', 'ema42')
+
+
+class EmaStateService:
+    """按 (code, timeframe, span) 增量维护 EMA
+
+    EMA（adjust=False）满足 ema_t = ema_{t-1} + alpha * (close_t - ema_{t-1})，只依赖上一个值和新收盘价。
+    状态里同时保存最后一个箱体之前的值 ema_prev：2 日 / 3 日K的最后一个箱体可能还没走完，
+    同一箱体再来一根日K时用 ema_prev 重算最后一步，而不是再叠加一次。
+    新写入的K线早于已有状态的最后日期（回补历史、前复权整体改写）时，改为按全部历史重算。
+    """
+
+    @staticmethod
+    def _state_columns(arrays, timeframe, spans):
+        """在计算进程中执行：按 offsets 切出各股票的日K，分箱后批量计算 EMA
+
+        Args:
+            arrays: dates / closes 为各股票日K首尾拼接的列，offsets 为各股票的起止位置
+
+        Returns:
+            dict: values 形状 (2, codes, spans)（最后一个与倒数第二个箱体的 EMA），last_bin、bar_count 按股票排列
+        """
+        offsets = arrays['offsets']
+        series = []
+        last_bins = np.empty(len(offsets) - 1, dtype=np.int64)
+        for row, (start, end) in enumerate(zip(offsets[:-1], offsets[1:])):
+            ids, closes = last_close_per_bin(arrays['dates'][start:end], arrays['closes'][start:end], timeframe)
+            series.append(closes)
+            last_bins[row] = ids[-1]
+        matrix, lengths = right_align(series)
+        return {
+            'values': multi_span_ema(matrix, lengths, spans, tail=2),
+            'last_bin': last_bins,
+            'bar_count': lengths,
+        }
+
+    @staticmethod
+    async def compute_states(history, timeframe, spans):
+        """按全部历史从头计算一批股票各周期的 EMA 状态
+
+        各股票的箱体收盘价右对齐成矩阵后交给 multi_span_ema，一次算完全部股票、全部周期的
+        最后两个 EMA 值。分箱与矩阵计算放在计算进程池里，日K列通过共享内存传递，不占用事件循环。
+
+        Args:
+            history: {code: 日K列数组（dates 升序）}
+            timeframe: 1d / 2d / 3d
+            spans: EMA 周期列表
+
+        Returns:
+            dict: {code: {span: state}}，没有K线的股票不出现在结果中
+        """
+        codes = [code for code, arrays in history.items() if len(arrays['dates'])]
+        if not codes:
+            return {}
+
+        lengths = [len(history[code]['dates']) for code in codes]
+        columns = await get_compute_executor().run_arrays(
+            EmaStateService._state_columns,
+            {
+                'dates': np.concatenate([history[code]['dates'] for code in codes]),
+                'closes': np.concatenate([history[code]['closes'] for code in codes]),
+                'offsets': np.concatenate([[0], np.cumsum(lengths)]),
+            },
+            timeframe,
+            tuple(spans),
+        )
+
+        values = columns['values']
+        states = {}
+        for row, code in enumerate(codes):
+            bar_count = int(columns['bar_count'][row])
+            last_date = history[code]['dates'][-1].item()
+            states[code] = {
+                span: {
+                    'ema': float(values[0, row, col]),
+                    'ema_prev': float(values[1, row, col]) if bar_count > 1 else None,
+                    'last_bin': int(columns['last_bin'][row]),
+                    'last_date': last_date,
+                    'bar_count': bar_count,
+                }
+                for col, span in enumerate(spans)
+            }
+        return states
+
+    @staticmethod
+    def advance_state(state, span, dates, closes, timeframe):
+        """把新日K逐根折叠进已有状态，dates 必须都晚于 state['last_date']"""
+        alpha = 2.0 / (span + 1)
+        state = dict(state)
+        for bin_id, close in zip(bin_ids(dates, timeframe).tolist(), np.asarray(closes, dtype=np.float64).tolist()):
+            if bin_id != state['last_bin']:
+                state['ema_prev'] = state['ema']
+                state['last_bin'] = bin_id
+                state['bar_count'] += 1
+            prev = state['ema_prev']
+            state['ema'] = close if prev is None else prev + alpha * (close - prev)
+        state['last_date'] = np.datetime64(dates[-1], 'D').item()
+        return state
+
+    @staticmethod
+    async def recompute(pairs):
+        """按全部历史重算一批 (code, timeframe) 的 EMA 状态并落库
+
+        Returns:
+            dict: {(code, timeframe): {span: state}}
+        """
+        from services.kline_service import KlineService
+        from services.monitor_cache_service import MonitorCacheService
+
+        if not pairs:
+            return {}
+        history = await KlineService.get_daily_arrays([code for code, _ in pairs], limit=None)
+        by_timeframe = {}
+        for code, timeframe in pairs:
+            if code in history:
+                by_timeframe.setdefault(timeframe, {})[code] = history[code]
+
+        states = {}
+        for timeframe, group in by_timeframe.items():
+            spans = MONITOR_EMA_SPANS.get(timeframe, MONITOR_EMA_SPANS['1d'])
+            for code, code_states in (await EmaStateService.compute_states(group, timeframe, spans)).items():
+                states[(code, timeframe)] = code_states
+        await EmaStateRepository.save_states(states)
+        # 重算可能没有推进最新K线日期，监控缓存里按 as_of 判断的 EMA 必须显式作废
+        await MonitorCacheService.evict_emas(states)
+        logger.info(f"全量重算 {len(states)} 组 EMA 状态")
+        return states
+
+    @staticmethod
+    async def apply_written_bars(kline_data_dict):
+        """K线入库后推进已跟踪组合的 EMA 状态
+
+        只处理已经有状态的 (code, timeframe)（即被监控读取过的组合），其他股票不产生任何开销。
+        """
+        tracked = await EmaStateRepository.get_states_by_codes(list(kline_data_dict))
+        if not tracked:
+            return
+
+        advanced = {}
+        rewritten = []
+        for (code, timeframe), spans in tracked.items():
+            arrays = KlineRepository._arrays_from_frame(kline_data_dict[code])
+            order = np.argsort(arrays['dates'], kind='stable')
+            dates, closes = arrays['dates'][order], arrays['closes'][order]
+            if not len(dates):
+                continue
+            last_date = min(state['last_date'] for state in spans.values())
+            if np.datetime64(last_date, 'D') >= dates[0]:
+                rewritten.append((code, timeframe))
+                continue
+            advanced[(code, timeframe)] = {
+                span: EmaStateService.advance_state(state, span, dates, closes, timeframe)
+                for span, state in spans.items()
+            }
+
+        await EmaStateRepository.save_states(advanced)
+        if rewritten:
+            logger.info(f"{len(rewritten)} 组 EMA 状态的历史K线被改写，改为全量重算")
+            await EmaStateService.recompute(rewritten)
+
+    @staticmethod
+    async def get_monitor_emas(pairs):
+        """读取监控用的 EMA 值
+
+        有状态且与 kline_coverage 的最新日期一致时直接使用（每只股票 O(1)），
+        缺失或落后（其他进程写入了K线）的组合按全部历史重算。
+
+        Returns:
+            dict: {(code, timeframe): {ema144: ..., ...}}，K线不足 MONITOR_MIN_BARS 根的组合为 None
+        """
+        pairs = list(dict.fromkeys(pairs))
+        states, latest = await EmaStateRepository.get_states(pairs)
+
+        stale = []
+        for code, timeframe in pairs:
+            spans = states.get((code, timeframe))
+            expected = MONITOR_EMA_SPANS.get(timeframe, MONITOR_EMA_SPANS['1d'])
+            if (
+                not spans
+                or any(span not in spans for span in expected)
+                or any(state['last_date'] != latest.get(code) for state in spans.values())
+            ):
+                stale.append((code, timeframe))
+        if stale:
+            states.update(await EmaStateService.recompute(stale))
+
+        result = {}
+        for code, timeframe in pairs:
+            spans = states.get((code, timeframe))
+            if not spans or min(state['bar_count'] for state in spans.values()) < MONITOR_MIN_BARS:
+                result[(code, timeframe)] = None
+                continue
+            values = dict.fromkeys(MONITOR_EMA_KEYS)
+            for span in MONITOR_EMA_SPANS.get(timeframe, MONITOR_EMA_SPANS['1d']):
+                values[f'ema{span}'] = round(spans[span]['ema'], 2)
+            result[(code, timeframe)] = values
+        return result
@@ -1,30 +1,151 @@
+import asyncio
+import os
+
 import akshare as ak
 from datetime import datetime
+from repositories.eps_cache_repository import EpsCacheRepository
+from utils.adaptive_limiter import get_limiter
 from utils.logger import get_logger
+from utils.market_data_executor import get_market_data_executor
 
 # 获取日志实例
 logger = get_logger('fetch_eps')
 
+EPS_CACHE_TTL_HOURS = float(os.getenv('EPS_CACHE_TTL_HOURS', '36'))
+EPS_NEGATIVE_TTL_HOURS = float(os.getenv('EPS_NEGATIVE_TTL_HOURS', '72'))
+
+def fetch_current_year_eps_forecast(stock_code):
+    """获取当前年度每股收益预测均值（接口异常直接抛出，供限流器感知失败）"""
+    profit_forecast = ak.stock_profit_forecast_ths(symbol=stock_code)
+    
+    if profit_forecast is not None and not profit_forecast.empty:
+        # 获取最早年份的数据（通常是当前年度预测）
+        earliest_year = profit_forecast['年度'].min()
+        current_year_data = profit_forecast[profit_forecast['年度'] == earliest_year]
+        
+        if not current_year_data.empty:
+            eps_forecast = float(current_year_data['均值'].iloc[0])
+            return eps_forecast
+    
+    return None
+
 def get_current_year_eps_forecast(stock_code):
     """获取当前年度每股收益预测均值"""
     try:
-        profit_forecast = ak.stock_profit_forecast_ths(symbol=stock_code)
-        
-        if profit_forecast is not None and not profit_forecast.empty:
-            # 获取最早年份的数据（通常是当前年度预测）
-            earliest_year = profit_forecast['年度'].min()
-            current_year_data = profit_forecast[profit_forecast['年度'] == earliest_year]
-            
-            if not current_year_data.empty:
-                eps_forecast = float(current_year_data['均值'].iloc[0])
-                return eps_forecast
-        
-        return None
-        
+        return fetch_current_year_eps_forecast(stock_code)
     except Exception as e:
         logger.error(f"获取 {stock_code} 数据失败: {e}")
         return None
 
+class EpsService:
+    """EPS 预测的缓存与刷新
+
+    每晚为全部启用的监控股票和持仓股票预取 EPS，结果一条语句批量写入 eps_cache。
+    没有盈利预测的股票写入 eps_value 为 NULL 的负缓存，按 EPS_NEGATIVE_TTL_HOURS 过期，
+    在此之前不会重复请求。监控数据只读缓存，没有缓存的股票交给后台补取，不阻塞构建。
+    """
+
+    # 后台补取中的股票，避免每次刷新监控数据都重复提交
+    _pending = set()
+
+    @staticmethod
+    def _strip_exchange_prefix(code):
+        return code[2:] if code.startswith(('sh', 'sz')) else code
+
+    @staticmethod
+    async def get_cached(codes):
+        """读取仍有效的 EPS 缓存：{code: (eps 或 None（无预测）, 获取时间)}，没有缓存的股票不在结果中"""
+        return await EpsCacheRepository.get_entries(codes, EPS_CACHE_TTL_HOURS, EPS_NEGATIVE_TTL_HOURS)
+
+    @staticmethod
+    def is_fresh(eps, updated_at, now=None):
+        """按 eps_cache 的有效期判断一条 EPS 是否仍有效，负缓存使用 EPS_NEGATIVE_TTL_HOURS"""
+        ttl_hours = EPS_NEGATIVE_TTL_HOURS if eps is None else EPS_CACHE_TTL_HOURS
+        return ((now or datetime.now()) - updated_at).total_seconds() < ttl_hours * 3600
+
+    @staticmethod
+    async def _fetch(code):
+        async with get_limiter('eps').slot():
+            return await get_market_data_executor().run(
+                fetch_current_year_eps_forecast, EpsService._strip_exchange_prefix(code), timeout=60
+            )
+
+    @staticmethod
+    def _publish(codes):
+        """新的 EPS 写入缓存后丢弃监控缓存中的旧值，并重建监控快照，不必等到下一次定时刷新"""
+        from services.monitor_cache_service import MonitorCacheService
+        from services.monitor_snapshot_service import MonitorSnapshotService
+
+        MonitorCacheService.evict_eps(codes)
+        MonitorSnapshotService.request_rebuild()
+
+    @staticmethod
+    async def refresh(codes):
+        """抓取这些股票的 EPS 并批量写入缓存；接口异常的股票不写入，下次再试。有写入时重建监控快照
+
+        Returns:
+            dict: {'fetched': 有预测的数量, 'negative': 无预测的数量, 'failed': 失败数量}
+        """
+        codes = list(dict.fromkeys(codes))
+        if not codes:
+            return {'fetched': 0, 'negative': 0, 'failed': 0}
+
+        results = await asyncio.gather(*(EpsService._fetch(code) for code in codes), return_exceptions=True)
+        values = {}
+        failed = 0
+        for code, result in zip(codes, results):
+            if isinstance(result, Exception):
+                failed += 1
+                logger.warning(f"获取 {code} EPS 失败: {result}")
+            else:
+                values[code] = result
+        await EpsCacheRepository.upsert_batch(values)
+        if values:
+            EpsService._publish(list(values))
+
+        stats = {
+            'fetched': sum(1 for value in values.values() if value is not None),
+            'negative': sum(1 for value in values.values() if value is None),
+            'failed': failed,
+        }
+        logger.info(f"EPS 刷新完成: {stats['fetched']} 只有预测, {stats['negative']} 只无预测, {stats['failed']} 只失败")
+        return stats
+
+    @staticmethod
+    def request_refresh(codes):
+        """后台补取没有缓存的股票，不等待结果；已在补取中的股票不会重复提交"""
+        codes = [code for code in dict.fromkeys(codes) if code not in EpsService._pending]
+        if not codes:
+            return
+        EpsService._pending.update(codes)
+
+        async def run():
+            try:
+                await EpsService.refresh(codes)
+            except Exception as exc:
+                logger.error(f"后台补取 EPS 失败: {exc}")
+            finally:
+                EpsService._pending.difference_update(codes)
+
+        asyncio.get_running_loop().create_task(run())
+
+    @staticmethod
+    async def prefetch_all():
+        """每晚定时任务：刷新全部启用的监控股票与持仓股票的 EPS，并清理早已过期的缓存"""
+        from repositories.monitor_repository import MonitorStockRepository
+        from repositories.portfolio_repository import StockRepository
+
+        try:
+            monitor_stocks = await MonitorStockRepository.get_enabled()
+            holdings = await StockRepository.get_all()
+            codes = [stock.code for stock in monitor_stocks] + [stock.code for stock in holdings]
+            logger.info(f"开始预取 {len(set(codes))} 只股票的 EPS")
+            await EpsService.refresh(codes)
+            await EpsCacheRepository.clean_old_data(max(EPS_CACHE_TTL_HOURS, EPS_NEGATIVE_TTL_HOURS))
+        except Exception as exc:
+            logger.error(f"预取 EPS 失败: {exc}")
+
+
 def main():
     """主函数"""
     stock_code = '600900'  # 长江电力
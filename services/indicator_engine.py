@@ -0,0 +1,67 @@
+"""批量指标引擎：一次矩阵乘法算出多只股票、多个周期的 EMA
+
+EMA（adjust=False，首值为种子）展开后是收盘价的加权和：
+    ema_{n} = (1 - a)^n * x_0 + sum_{k=1..n} a * (1 - a)^(n - k) * x_k
+把各股票的收盘价右对齐到同一个 (codes x bars) 矩阵（左侧补 0），每个周期的权重只与
+"距最后一根的距离"有关，所有股票、所有周期可以一次矩阵乘法算完；长度不同带来的差别只在种子：
+长度为 L 的序列，种子按统一权重拿到 a * (1 - a)^(L-1)，实际应为 (1 - a)^(L-1)，差值 x_0 * (1 - a)^L 单独补上。
+"""
+import numpy as np
+
+
+def right_align(series_list):
+    """把长度不一的序列右对齐成矩阵，左侧补 0
+
+    Returns:
+        tuple: (float64 矩阵 codes x bars, 各行有效长度 int64 数组)
+    """
+    lengths = np.fromiter((len(series) for series in series_list), dtype=np.int64, count=len(series_list))
+    width = int(lengths.max()) if len(lengths) else 0
+    matrix = np.zeros((len(series_list), width), dtype=np.float64)
+    for row, series in enumerate(series_list):
+        if len(series):
+            matrix[row, width - len(series):] = series
+    return matrix, lengths
+
+
+def multi_span_ema(closes, lengths, spans, tail=1):
+    """批量计算最后 tail 个位置的 EMA
+
+    Args:
+        closes: 右对齐、左侧补 0 的收盘价矩阵（codes x bars）
+        lengths: 每行的有效长度
+        spans: EMA 周期列表
+        tail: 需要的末尾位置数，1 只取最后一根，2 同时取倒数第二根（2 日 / 3 日K未走完的箱体要用）
+
+    Returns:
+        ndarray: 形状 (tail, codes, len(spans))，out[0] 为最后一根，out[1] 为倒数第二根；
+                 有效长度不足的位置为 NaN
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    codes, width = closes.shape
+    spans = np.asarray(spans, dtype=np.float64)
+    alpha = 2.0 / (spans + 1.0)
+    decay = 1.0 - alpha
+    out = np.full((tail, codes, len(spans)), np.nan)
+    if codes == 0 or width == 0:
+        return out
+
+    # weights[:, j, s]：第 j 个末尾位置（往前偏移 j 根）对应的权重列，一次乘法同时得到 tail x spans 个结果
+    distance = np.arange(width - 1, -1, -1, dtype=np.float64)
+    weights = np.zeros((width, tail, len(spans)))
+    for offset in range(tail):
+        steps = distance[:width - offset] - offset
+        weights[:width - offset, offset, :] = alpha * decay ** steps[:, None]
+    result = (closes @ weights.reshape(width, -1)).reshape(codes, tail, len(spans))
+
+    rows = np.arange(codes)
+    seeds = closes[rows, np.clip(width - lengths, 0, width - 1)]
+    for offset in range(tail):
+        effective = lengths - offset
+        # 统一权重下种子的权重是 a * (1 - a)^(L - 1)，实际应为 (1 - a)^(L - 1)，相差 (1 - a)^L
+        correction = seeds[:, None] * decay[None, :] ** effective[:, None]
+        values = result[:, offset, :] + correction
+        values[effective < 1] = np.nan
+        out[offset] = values
+    return out
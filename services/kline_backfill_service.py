@@ -0,0 +1,152 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+
+from repositories.kline_backfill_repository import KlineBackfillRepository
+from repositories.kline_repository import KlineRepository
+from repositories.stock_list_repository import StockListRepository
+from utils.logger import get_logger
+
+logger = get_logger('kline_backfill_service')
+
+
+class KlineBackfillService:
+    """全市场K线回补任务
+
+    每次运行对应一条 kline_backfill_jobs 记录，逐只股票的状态（pending / ok / empty / failed）
+    作为检查点写入 kline_backfill_items。进程中断后，下次运行会继续未完成的任务，
+    只处理尚未成功的股票；失败的股票按指数退避重试，超过重试次数后保持 failed。
+    """
+
+    _running = False
+
+    @staticmethod
+    def _to_kline_code(code):
+        from services.kline_service import KlineService
+        return KlineService._add_prefix_to_code(code)
+
+    @staticmethod
+    async def _create_job(force_update):
+        if force_update:
+            stocks = await StockListRepository.get_all()
+        else:
+            stocks = await StockListRepository.get_pending_update(limit=None)
+        mode = 'force' if force_update else 'incremental'
+        codes = [stock.code for stock in stocks]
+        if not codes:
+            return None, mode
+        return await KlineBackfillRepository.create_job(mode, codes), mode
+
+    @staticmethod
+    async def run(force_update=False, max_concurrent=None):
+        """运行（或续跑）一次全市场K线回补
+
+        Returns:
+            dict: 任务汇总，包含 job_id / status / ok / empty / failed / rows 以及本次运行的
+                  codes_per_min、rows_per_min；已有回补在运行或无股票需要更新时返回 None
+        """
+        if KlineBackfillService._running:
+            logger.warning("已有K线回补任务在运行，跳过本次请求")
+            return None
+
+        KlineBackfillService._running = True
+        try:
+            return await KlineBackfillService._run(force_update, max_concurrent)
+        finally:
+            KlineBackfillService._running = False
+
+    @staticmethod
+    async def _run(force_update, max_concurrent):
+        from services.kline_service import KlineService
+
+        if max_concurrent is None:
+            max_concurrent = int(os.getenv('KLINE_UPDATE_CONCURRENT', '10'))
+        batch_size = int(os.getenv('KLINE_BACKFILL_BATCH', '200'))
+        max_attempts = int(os.getenv('KLINE_BACKFILL_MAX_ATTEMPTS', '3'))
+        retry_base = float(os.getenv('KLINE_BACKFILL_RETRY_SECONDS', '60'))
+
+        job = await KlineBackfillRepository.get_running_job()
+        if job:
+            job_id, mode = job['id'], job['mode']
+            job = await KlineBackfillRepository.refresh_job_progress(job_id)
+            logger.info(
+                f"续跑K线回补任务 {job_id}（{mode}），已完成 {job['ok_count'] + job['empty_count']}/{job['total_codes']}"
+            )
+        else:
+            job_id, mode = await KlineBackfillService._create_job(force_update)
+            if job_id is None:
+                logger.info("没有股票需要回补K线")
+                return None
+            logger.info(f"开始K线回补任务 {job_id}（{mode}）")
+        job_force = mode == 'force'
+
+        run_start = time.time()
+        run_codes = 0
+        run_rows = 0
+        batch_count = 0
+
+        def rates():
+            minutes = max(time.time() - run_start, 1e-6) / 60
+            return run_codes / minutes, run_rows / minutes
+
+        while True:
+            stock_codes = await KlineBackfillRepository.claim_items(job_id, batch_size, max_attempts)
+            if not stock_codes:
+                next_retry_at = await KlineBackfillRepository.get_next_retry_at(job_id, max_attempts)
+                if next_retry_at is None:
+                    break
+                wait = max((next_retry_at - datetime.now()).total_seconds(), 0) + 1
+                logger.info(f"任务 {job_id} 剩余失败股票等待重试，{wait:.0f} 秒后继续")
+                await asyncio.sleep(wait)
+                continue
+
+            batch_count += 1
+            codes = [KlineBackfillService._to_kline_code(code) for code in stock_codes]
+            latest_dates = {} if job_force else await KlineRepository.get_latest_dates_batch(codes)
+            outcomes = {}
+            await KlineService._run_fetch_save_pipeline(codes, max_concurrent, job_force, latest_dates, outcomes)
+
+            checkpoint = {}
+            for stock_code, code in zip(stock_codes, codes):
+                checkpoint[stock_code] = outcomes.get(code, ('failed', 0, '未返回结果'))
+            done_codes = [code for code, (status, _, _) in checkpoint.items() if status != 'failed']
+            await KlineBackfillRepository.mark_items(job_id, checkpoint, retry_base)
+            # 只有成功（含无新数据）的股票才刷新 last_update，失败的股票留给下次更新
+            await StockListRepository.update_last_update(done_codes)
+
+            run_codes += len(done_codes)
+            run_rows += sum(rows for _, rows, _ in checkpoint.values())
+            codes_per_min, rows_per_min = rates()
+            progress = await KlineBackfillRepository.refresh_job_progress(job_id, codes_per_min, rows_per_min)
+            logger.info(
+                f"任务 {job_id} 批次 {batch_count}: {len(done_codes)}/{len(stock_codes)} 成功；"
+                f"累计 {progress['ok_count'] + progress['empty_count']}/{progress['total_codes']}，"
+                f"失败 {progress['failed_count']}；{codes_per_min:.1f} 只/分钟，{rows_per_min:.0f} 行/分钟"
+            )
+
+        codes_per_min, rows_per_min = rates()
+        summary = await KlineBackfillRepository.refresh_job_progress(job_id, codes_per_min, rows_per_min)
+        status = 'success' if summary['failed_count'] == 0 else 'partial'
+        summary = await KlineBackfillRepository.refresh_job_progress(job_id, codes_per_min, rows_per_min, status=status)
+        await KlineRepository.record_update(summary['ok_count'], summary['total_codes'], status)
+
+        elapsed = time.time() - run_start
+        logger.info(
+            f"K线回补任务 {job_id} 结束（{status}）：成功 {summary['ok_count']}，无新数据 {summary['empty_count']}，"
+            f"失败 {summary['failed_count']}，本次写入 {run_rows} 行，耗时 {elapsed:.1f}s，"
+            f"{codes_per_min:.1f} 只/分钟，{rows_per_min:.0f} 行/分钟"
+        )
+        return {
+            'job_id': job_id,
+            'mode': mode,
+            'status': status,
+            'total': summary['total_codes'],
+            'ok': summary['ok_count'],
+            'empty': summary['empty_count'],
+            'failed': summary['failed_count'],
+            'rows': run_rows,
+            'elapsed': round(elapsed, 2),
+            'codes_per_min': round(codes_per_min, 2),
+            'rows_per_min': round(rows_per_min, 2),
+        }
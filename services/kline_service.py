@@ -1,5 +1,4 @@
 import akshare as ak
-import pandas as pd
 from datetime import datetime, timedelta
 import os
 import asyncio
@@ -8,7 +7,11 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from repositories.kline_repository import KlineRepository
 from repositories.monitor_repository import MonitorStockRepository
 from repositories.stock_list_repository import StockListRepository
+from services.kline_timeframes import DERIVED_TIMEFRAMES
+from utils.adaptive_limiter import get_limiter
+from utils.kline_store import get_kline_store
 from utils.logger import get_logger
+from utils.market_data_executor import get_market_data_executor
 
 
 os.environ.pop('http_proxy', None)
@@ -29,7 +32,7 @@ class KlineService:
         Args:
             code: 股票代码
             force_update: 是否强制更新
-            latest_date: 预查询的最新日期，避免重复查询数据库
+            latest_date: 预查询的最新日期（datetime.date），避免重复查询数据库
         """
         try:
             # 转换代码格式
@@ -50,7 +53,7 @@ class KlineService:
                     latest = await KlineRepository.get_latest_date(code)
                 
                 if latest:
-                    next_day = (datetime.strptime(latest, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y%m%d')
+                    next_day = (latest + timedelta(days=1)).strftime('%Y%m%d')
                     start_date = next_day
                 else:
                     # 没有历史数据，从2020年开始获取
@@ -61,15 +64,12 @@ class KlineService:
             if start_date >= end_date:
                 return True, code, None
             
-            # 在线程池中执行阻塞的 akshare 调用，添加120秒超时
-            loop = asyncio.get_event_loop()
-            df = await asyncio.wait_for(
-                loop.run_in_executor(
-                    None, 
-                    lambda: ak.stock_zh_a_hist_tx(symbol=symbol, start_date=start_date, end_date=end_date, adjust="qfq")
-                ),
-                timeout=120
-            )
+            # 在行情专用线程池中执行阻塞的 akshare 调用，添加120秒超时；并发由自适应限流器控制
+            async with get_limiter('kline').slot():
+                df = await get_market_data_executor().run(
+                    lambda: ak.stock_zh_a_hist_tx(symbol=symbol, start_date=start_date, end_date=end_date, adjust="qfq"),
+                    timeout=120
+                )
             
             if df is None or df.empty:
                 return True, code, None
@@ -113,87 +113,23 @@ class KlineService:
         # 检查是否更新所有股票
         update_all = os.getenv('UPDATE_ALL_STOCKS', 'false').lower() == 'true'
 
-        if force_update:
-            if update_all:
-                # 循环获取需要更新的股票（每次10条）
-                logger.info("开始强制更新所有股票的K线（分批处理）")
-                total_processed = 0
-                batch_count = 0
-
-                while True:
-                    # 获取需要更新的股票（每次默认10条）
-                    stocks = await StockListRepository.get_pending_update(limit=max_concurrent)
-
-                    if not stocks:
-                        logger.info("所有股票已处理完成")
-                        break
-
-                    batch_count += 1
-                    codes = [KlineService._add_prefix_to_code(s.code) for s in stocks]
-                    logger.info(f"批次 {batch_count}: 处理 {len(codes)} 只股票")
-
-                    # 处理这批股票
-                    batch_result = await KlineService._process_batch(codes, max_concurrent, force_update)
-
-                    # 更新这些股票的 last_update 时间
-                    updated_codes = [s.code for s in stocks]
-                    await StockListRepository.update_last_update(updated_codes)
-
-                    total_processed += len(codes)
-                    logger.info(f"批次 {batch_count} 完成，累计处理 {total_processed} 只股票")
-
-                    # 如果返回 False，说明有错误，可以选择继续或停止
-                    if not batch_result and force_update:
-                        logger.warning(f"批次 {batch_count} 处理出现错误，继续处理下一批")
-
-                logger.info(f"强制更新完成，共处理 {total_processed} 只股票")
-                return True
-            else:
-                # 只更新监控股票
-                stocks = await MonitorStockRepository.get_enabled()
-                codes = [s.code for s in stocks]
-                logger.info(f"强制更新 {len(codes)} 只监控股票的K线")
-                return await KlineService._process_batch(codes, max_concurrent, force_update)
-        else:
-            if update_all:
-                # 循环获取需要更新的股票（每次10条）
-                logger.info("开始增量更新所有股票的K线（分批处理）")
-                total_processed = 0
-                batch_count = 0
-
-                while True:
-                    # 获取需要更新的股票（每次10条）
-                    stocks = await StockListRepository.get_pending_update(limit=max_concurrent)
-
-                    if not stocks:
-                        logger.info("没有更多股票需要更新")
-                        break
-
-                    batch_count += 1
-                    codes = [KlineService._add_prefix_to_code(s.code) for s in stocks]
-                    logger.info(f"批次 {batch_count}: 处理 {len(codes)} 只股票")
+        if update_all:
+            # 全市场更新走可续跑的回补任务：逐只记录检查点，失败股票退避重试
+            from services.kline_backfill_service import KlineBackfillService
+            result = await KlineBackfillService.run(force_update=force_update, max_concurrent=max_concurrent)
+            return result is None or result['failed'] == 0
 
-                    # 处理这批股票
-                    batch_result = await KlineService._process_batch(codes, max_concurrent, force_update)
-
-                    # 更新这些股票的 last_update 时间
-                    updated_codes = [s.code for s in stocks]
-                    await StockListRepository.update_last_update(updated_codes)
-
-                    total_processed += len(codes)
-                    logger.info(f"批次 {batch_count} 完成，累计处理 {total_processed} 只股票")
-
-                    # 如果返回 False，说明有错误，可以选择继续或停止
-                    if not batch_result:
-                        logger.warning(f"批次 {batch_count} 处理出现错误，继续处理下一批")
+        if force_update:
+            # 只更新监控股票
+            stocks = await MonitorStockRepository.get_enabled()
+            codes = [s.code for s in stocks]
+            logger.info(f"强制更新 {len(codes)} 只监控股票的K线")
+            return await KlineService._process_batch(codes, max_concurrent, force_update)
 
-                logger.info(f"增量更新完成，共处理 {total_processed} 只股票")
-                return True
-            else:
-                # 只更新需要更新的监控股票
-                codes = await KlineRepository.get_need_update(days=1)
-                logger.info(f"增量更新 {len(codes)} 只监控股票的K线")
-                return await KlineService._process_batch(codes, max_concurrent, force_update)
+        # 只更新需要更新的监控股票
+        codes = await KlineRepository.get_need_update(days=1)
+        logger.info(f"增量更新 {len(codes)} 只监控股票的K线")
+        return await KlineService._process_batch(codes, max_concurrent, force_update)
 
     @staticmethod
     async def _process_batch(codes, max_concurrent, force_update):
@@ -201,7 +137,7 @@ class KlineService:
 
         Args:
             codes: 股票代码列表
-            max_concurrent: 最大并发数
+            max_concurrent: 结果队列长度基数（抓取并发由 kline 自适应限流器决定）
             force_update: 是否强制更新
 
         Returns:
@@ -215,56 +151,138 @@ class KlineService:
         if not force_update:
             latest_dates = await KlineRepository.get_latest_dates_batch(codes)
 
-        # 使用信号量控制并发数量
-        semaphore = asyncio.Semaphore(max_concurrent)
+        stats = await KlineService._run_fetch_save_pipeline(codes, max_concurrent, force_update, latest_dates)
+
+        success_count = stats['success']
+        total = len(codes)
+        logger.info(
+            f"数据获取完成: {success_count} 只有新数据, {stats['no_data']} 只无新数据, {stats['error']} 只失败; "
+            f"共写入 {stats['saved']} 只股票，{stats['records']} 条记录，{stats['flushes']} 次刷新"
+        )
+
+        status = 'success' if success_count == total else 'partial'
+        await KlineRepository.record_update(success_count, total, status)
 
-        async def update_with_semaphore(code):
-            async with semaphore:
-                return await KlineService.update_single_kline_async(code, force_update, latest_dates.get(code))
+        logger.info(f"批次处理完成: {success_count}/{total}")
+        return success_count == total
 
-        # 创建所有任务
-        tasks = [update_with_semaphore(code) for code in codes]
+    @staticmethod
+    async def _run_fetch_save_pipeline(codes, max_concurrent, force_update, latest_dates, outcomes=None):
+        """抓取与入库流水线
 
-        # 并发执行所有任务，只获取数据不保存
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        抓取协程从同一个代码迭代器取任务，实际并发由 kline 自适应限流器的窗口决定，
+        max_concurrent 只决定结果队列长度；抓取结果放入有界队列，
+        写入协程从队列取出 DataFrame 累积，满 KLINE_FLUSH_ROWS 行或距首条待写数据
+        超过 KLINE_FLUSH_INTERVAL 秒即调用 save_all_batch 落库。队列满时抓取协程阻塞，
+        内存占用只与队列长度和刷新阈值有关，网络抓取与数据库写入同时进行。
 
-        # 收集所有需要保存的数据
-        kline_data_dict = {}
-        success_count = 0
-        total = len(codes)
-        no_data_count = 0
-        error_count = 0
+        传入 outcomes 字典时，逐只股票记录 {code: (status, rows, error)}，
+        status 为 ok（已落库）/ empty（无新数据）/ failed（抓取或保存失败）。
 
-        for result in results:
-            if isinstance(result, Exception):
-                error_count += 1
-            else:
-                success, code, df = result
-                if success:
-                    if df is not None and not df.empty:
-                        kline_data_dict[code] = df
-                        success_count += 1
+        Returns:
+            dict: success / no_data / error / saved / records / flushes 统计
+        """
+        from services.derived_kline_service import DerivedKlineService
+        from services.ema_state_service import EmaStateService
+
+        flush_rows = int(os.getenv('KLINE_FLUSH_ROWS', '20000'))
+        flush_interval = float(os.getenv('KLINE_FLUSH_INTERVAL', '5'))
+        queue = asyncio.Queue(maxsize=max(max_concurrent * 2, 1))
+        done = object()
+        code_iter = iter(codes)
+        stats = {'success': 0, 'no_data': 0, 'error': 0, 'saved': 0, 'records': 0, 'flushes': 0}
+
+        async def fetcher():
+            for code in code_iter:
+                try:
+                    result = await KlineService.update_single_kline_async(code, force_update, latest_dates.get(code))
+                except Exception as e:
+                    logger.error(f"获取 {code} 数据异常: {e}")
+                    result = (False, code, None)
+                await queue.put(result)
+
+        async def writer():
+            loop = asyncio.get_running_loop()
+            pending = {}
+            pending_rows = 0
+            deadline = None
+
+            async def flush():
+                nonlocal pending, pending_rows, deadline
+                batch, pending, pending_rows, deadline = pending, {}, 0, None
+                save_start = time.time()
+                try:
+                    saved_count, _, records = await KlineRepository.save_all_batch(batch)
+                except Exception as e:
+                    logger.error(f"批量保存异常: {e}")
+                    saved_count, records = 0, 0
+                if outcomes is not None:
+                    for code, df in batch.items():
+                        outcomes[code] = ('ok', len(df), None) if saved_count else ('failed', 0, '保存失败')
+                stats['saved'] += saved_count
+                stats['records'] += records
+                stats['flushes'] += 1
+                logger.info(f"批量保存完成: {saved_count} 只股票，{records} 条记录，耗时: {time.time() - save_start:.2f}秒")
+                if saved_count:
+                    try:
+                        await EmaStateService.apply_written_bars(batch)
+                    except Exception as e:
+                        logger.error(f"推进 EMA 状态失败: {e}")
+                    try:
+                        await DerivedKlineService.apply_written_bars(batch)
+                    except Exception as e:
+                        logger.error(f"更新聚合K线失败: {e}")
+
+            while True:
+                timeout = None if deadline is None else max(deadline - loop.time(), 0)
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    item = None
+
+                if item is done:
+                    break
+                if item is not None:
+                    success, code, df = item
+                    if not success:
+                        stats['error'] += 1
+                        if outcomes is not None:
+                            outcomes[code] = ('failed', 0, '抓取失败')
+                    elif df is None or df.empty:
+                        stats['no_data'] += 1
+                        if outcomes is not None:
+                            outcomes[code] = ('empty', 0, None)
                     else:
-                        no_data_count += 1
-                else:
-                    error_count += 1
+                        stats['success'] += 1
+                        pending[code] = df
+                        pending_rows += len(df)
+                        if deadline is None:
+                            deadline = loop.time() + flush_interval
 
-        logger.info(f"数据获取完成: {success_count} 只有新数据, {no_data_count} 只无新数据, {error_count} 只失败")
+                if pending and (pending_rows >= flush_rows or loop.time() >= deadline):
+                    await flush()
 
-        # 一次性保存所有数据到数据库
-        if kline_data_dict:
-            save_start = time.time()
-            saved_count, _, records = await KlineRepository.save_all_batch(kline_data_dict)
-            save_time = time.time() - save_start
-            logger.info(f"批量保存完成: {saved_count} 只股票，{records} 条记录，耗时: {save_time:.2f}秒")
-        else:
-            logger.info("没有新数据需要保存")
+            if pending:
+                await flush()
 
-        status = 'success' if success_count == total else 'partial'
-        await KlineRepository.record_update(success_count, total, status)
+        writer_task = asyncio.create_task(writer())
+        try:
+            worker_count = min(get_limiter('kline').max_limit, len(codes))
+            await asyncio.gather(*(fetcher() for _ in range(worker_count)))
+            await queue.put(done)
+            await writer_task
+        finally:
+            if not writer_task.done():
+                writer_task.cancel()
+
+        if stats['records'] == 0:
+            logger.info("没有新数据需要保存")
+        else:
+            # 新K线改变了 EMA 状态，让监控快照尽快反映出来
+            from services.monitor_snapshot_service import MonitorSnapshotService
 
-        logger.info(f"批次处理完成: {success_count}/{total}")
-        return success_count == total
+            MonitorSnapshotService.request_rebuild()
+        return stats
 
     @staticmethod
     def batch_update_kline(force_update=False, max_workers=3):
@@ -273,11 +291,73 @@ class KlineService:
         max_concurrent = int(os.getenv('KLINE_UPDATE_CONCURRENT', '50'))
         return asyncio.run(KlineService.batch_update_kline_async(force_update, max_concurrent=max_concurrent))
     
+    @staticmethod
+    async def get_daily_arrays(codes, limit=1000):
+        """批量读取最近 limit 根日K的列数组，优先命中进程内 K 线缓存，未命中的一次查库并回填
+
+        Returns:
+            dict: {code: 列数组}，无数据的股票不在结果中
+        """
+        store = get_kline_store()
+        result = {}
+        misses = []
+        for code in dict.fromkeys(codes):
+            arrays = store.get(code, limit)
+            if arrays is None:
+                misses.append(code)
+            else:
+                result[code] = arrays
+
+        if misses:
+            loaded = await KlineRepository.get_arrays_by_codes(misses, limit)
+            for code, arrays in loaded.items():
+                # 返回不足 limit 条说明已取到全部历史，之后更短的读取和区间导出都能直接命中
+                store.put(code, arrays, complete=limit is None or len(arrays['dates']) < limit)
+                result[code] = arrays
+        return result
+
+    @staticmethod
+    async def get_daily_frames(codes, limit=1000):
+        """批量读取最近 limit 根日K，返回 {code: DataFrame}，无数据的股票为 None"""
+        arrays = await KlineService.get_daily_arrays(codes, limit)
+        return {
+            code: KlineRepository._frame_from_arrays(arrays[code]) if code in arrays else None
+            for code in codes
+        }
+
+    @staticmethod
+    async def get_daily_frame(code, limit=1000):
+        """读取单只股票最近 limit 根日K（DataFrame），无数据时返回 None"""
+        return (await KlineService.get_daily_frames([code], limit))[code]
+
+    @staticmethod
+    async def get_export_frame(code, start_date=None, end_date=None):
+        """导出用的K线区间数据，缓存覆盖该区间时直接切片，否则按区间查库
+
+        列名与 KlineRepository.export_kline_data 一致：日期（date）、开盘、收盘、最高、最低、成交量、成交额。
+        """
+        arrays = get_kline_store().get_range(code, start_date, end_date)
+        if arrays is None:
+            return await KlineRepository.export_kline_data(code, start_date, end_date)
+        if not len(arrays['dates']):
+            return None
+        df = KlineRepository._frame_from_arrays(arrays)
+        df['日期'] = df['日期'].dt.date
+        return df.rename(columns={'volume': '成交量', 'amount': '成交额'})
+
     @staticmethod
     async def get_kline_with_cache(code, period='daily', count=250):
-        """从本地数据库获取K线数据"""
+        """获取K线数据（进程内 K 线缓存优先，未命中时读本地数据库）
+
+        2 日 / 3 日K直接读取 stock_kline_derived 中预先聚合好的K线。
+        """
+        from services.derived_kline_service import DerivedKlineService
+
         try:
-            df = await KlineRepository.get_by_code(code, limit=1000)
+            if period in DERIVED_TIMEFRAMES:
+                df = await DerivedKlineService.get_frame(code, period, limit=count)
+            else:
+                df = await KlineService.get_daily_frame(code, limit=1000)
             
             if df is None or df.empty:
                 print(f"[{datetime.now().strftime('%H:%M:%S')}] 本地无 {code} 的K线数据")
@@ -285,25 +365,6 @@ class KlineService:
             
             print(f"[{datetime.now().strftime('%H:%M:%S')}] 从本地获取 {code} 的 {len(df)} 条K线")
             
-            # 重采样处理
-            if period == '2d':
-                df['日期'] = pd.to_datetime(df['日期'], errors='coerce')
-                df = df.set_index('日期')
-                df = df.resample('2B').agg({
-                    '开盘': 'first', '收盘': 'last', '最高': 'max', '最低': 'min', 'amount': 'sum'
-                }).dropna()
-                df = df.reset_index()
-                df['日期'] = df['日期'].dt.strftime('%Y-%m-%d')
-            
-            elif period == '3d': 
-                df['日期'] = pd.to_datetime(df['日期'], errors='coerce')
-                df = df.set_index('日期')
-                df = df.resample('3B').agg({
-                    '开盘': 'first', '收盘': 'last', '最高': 'max', '最低': 'min', 'amount': 'sum'
-                }).dropna()
-                df = df.reset_index()
-                df['日期'] = df['日期'].dt.strftime('%Y-%m-%d')
-            
             if len(df) > count:
                 df = df.tail(count)
             
@@ -335,6 +396,17 @@ class KlineService:
         except Exception as e: 
             logger.error(f"自动更新异常: {e}")
 
+    @staticmethod
+    async def maintain_partitions_async():
+        """K线表分区维护：提前建好下一年度的分区，避免新数据落入兜底分区"""
+        try:
+            years_ahead = int(os.getenv('KLINE_PARTITION_YEARS_AHEAD', '1'))
+            created = await KlineRepository.ensure_partitions(years_ahead)
+            if created:
+                logger.info(f"K线分区维护：新建 {created} 个年度分区")
+        except Exception as e:
+            logger.error(f"K线分区维护失败: {e}")
+
     @staticmethod
     def auto_update_kline_data():
         """自动更新K线数据（同步包装器）"""
@@ -368,7 +440,7 @@ class KlineService:
             if not valid_dates:
                 return True, "没有历史K线数据，需初始化"
             
-            latest_dt = datetime.strptime(max(valid_dates), "%Y-%m-%d")
+            latest_dt = datetime.combine(max(valid_dates), datetime.min.time())
             now = datetime.now()
             hours = (now - latest_dt).total_seconds() / 3600
             
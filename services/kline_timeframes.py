@@ -0,0 +1,102 @@
+"""K线周期划分：把日K按固定起点分箱为 2 日 / 3 日 / 周 / 月K
+
+pandas 的 resample('2B') 从数据窗口的第一天开始起算箱体，读取窗口一变（比如多取了一根日K），
+所有 2 日 / 3 日K 都会整体错位，增量维护的指标也就无法与全量重算对齐。
+这里固定以 BIN_ORIGIN 为起点按工作日计数分箱，同一天的日K永远落在同一个箱体里。
+周K、月K按自然周（周六至周五）、自然月分箱，日期标签与 resample('W-FRI') / resample('ME') 一致。
+"""
+import numpy as np
+
+TIMEFRAME_DAYS = {'1d': 1, '2d': 2, '3d': 3}
+
+# 预先聚合、随日K入库增量维护的周期（stock_kline_derived）
+DERIVED_TIMEFRAMES = ('2d', '3d', 'weekly', 'monthly')
+
+# 分箱起点（周一）；2 日 / 3 日K的日期取箱内第一个工作日
+BIN_ORIGIN = np.datetime64('2000-01-03', 'D')
+# 周K以周六为一周起点，箱体日期为该周周五
+WEEK_ORIGIN = BIN_ORIGIN - np.timedelta64(2, 'D')
+MONTH_ORIGIN = BIN_ORIGIN.astype('datetime64[M]')
+
+
+def timeframe_days(timeframe):
+    """周期对应的工作日数，未知周期（如 daily）按日K处理"""
+    return TIMEFRAME_DAYS.get(timeframe, 1)
+
+
+def bin_ids(dates, timeframe):
+    """每根日K所属箱体的序号（int64 数组）"""
+    days = np.asarray(dates, dtype='datetime64[D]')
+    if timeframe == 'weekly':
+        return (days - WEEK_ORIGIN).astype(np.int64) // 7
+    if timeframe == 'monthly':
+        return (days.astype('datetime64[M]') - MONTH_ORIGIN).astype(np.int64)
+    return np.busday_count(BIN_ORIGIN, days) // timeframe_days(timeframe)
+
+
+def bin_dates(ids, timeframe):
+    """箱体序号对应的日期标签（datetime64[D]）
+
+    2 日 / 3 日K为箱内第一个工作日，周K为该周周五，月K为当月最后一天。
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if timeframe == 'weekly':
+        return WEEK_ORIGIN + ids * 7 + 6
+    if timeframe == 'monthly':
+        return (MONTH_ORIGIN + ids + 1).astype('datetime64[D]') - 1
+    return np.busday_offset(BIN_ORIGIN, ids * timeframe_days(timeframe), roll='forward')
+
+
+def bin_first_day(date, timeframe):
+    """date 所在箱体的第一个自然日，增量聚合时从这一天起重读日K"""
+    day = np.datetime64(date, 'D')
+    bin_id = bin_ids(day, timeframe)
+    if timeframe == 'weekly':
+        return WEEK_ORIGIN + bin_id * 7
+    if timeframe == 'monthly':
+        return (MONTH_ORIGIN + bin_id).astype('datetime64[D]')
+    return bin_dates(bin_id, timeframe)
+
+
+def last_close_per_bin(dates, closes, timeframe):
+    """按周期取每个箱体的收盘价（箱内最后一根日K的收盘）
+
+    dates 需按升序排列。
+
+    Returns:
+        tuple: (箱体序号数组, 收盘价数组)
+    """
+    ids = bin_ids(dates, timeframe)
+    closes = np.asarray(closes, dtype=np.float64)
+    if timeframe_days(timeframe) == 1 or len(ids) == 0:
+        return ids, closes
+    last = np.empty(len(ids), dtype=bool)
+    last[:-1] = ids[1:] != ids[:-1]
+    last[-1] = True
+    return ids[last], closes[last]
+
+
+def aggregate_bars(arrays, timeframe):
+    """把日K列数组（dates 升序）聚合为指定周期的列数组
+
+    开盘取箱内第一根、收盘取最后一根，最高 / 最低取极值，成交量 / 成交额求和；
+    额外返回 last_dates（箱内最后一根日K的日期），用于判断聚合结果是否跟上日K。
+    """
+    dates = np.asarray(arrays['dates'], dtype='datetime64[D]')
+    ids = bin_ids(dates, timeframe)
+    if not len(ids):
+        empty = {key: np.asarray(arrays[key])[:0] for key in ('opens', 'closes', 'highs', 'lows', 'volumes', 'amounts')}
+        return {'dates': dates[:0], **empty, 'last_dates': dates[:0]}
+
+    first = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    last = np.r_[first[1:], len(ids)] - 1
+    return {
+        'dates': bin_dates(ids[first], timeframe),
+        'opens': np.asarray(arrays['opens'], dtype=np.float64)[first],
+        'closes': np.asarray(arrays['closes'], dtype=np.float64)[last],
+        'highs': np.maximum.reduceat(np.asarray(arrays['highs'], dtype=np.float64), first),
+        'lows': np.minimum.reduceat(np.asarray(arrays['lows'], dtype=np.float64), first),
+        'volumes': np.add.reduceat(np.asarray(arrays['volumes'], dtype=np.int64), first),
+        'amounts': np.add.reduceat(np.asarray(arrays['amounts'], dtype=np.float64), first),
+        'last_dates': dates[last],
+    }
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+
+from repositories.cache_repository import MonitorDataCacheRepository
+from services.ema_state_service import MONITOR_EMA_KEYS
+from utils.logger import get_logger
+
+logger = get_logger('monitor_cache_service')
+
+MONITOR_QUOTE_TTL = float(os.getenv('MONITOR_QUOTE_TTL', '15'))
+# monitor_data_cache（L2）行的保留时间，需覆盖周末与短假期，否则重启后 EMA 要整批重算
+MONITOR_CACHE_RETENTION_HOURS = int(os.getenv('MONITOR_CACHE_RETENTION_HOURS', '168'))
+
+
+class MonitorCacheService:
+    """监控数据的分层缓存：行情、EMA、EPS 各自过期
+
+    - 行情：只放内存，MONITOR_QUOTE_TTL 秒内有效；
+    - EMA：按 (code, timeframe) 记录计算时该股票的最新K线日期（as_of），kline_coverage 出现更新的K线前一直有效，
+      2 日 / 3 日周期的最后一根也由日K推进，所以同样以日K日期为准；
+    - EPS：记录 eps_cache 中的获取时间，与 eps_cache 使用同样的有效期（见 EpsService.is_fresh）。
+
+    进程内存是 L1；monitor_data_cache 是 L2，ema_as_of 与 eps_updated_at 分别记录两类字段的新鲜度，
+    进程重启后先从 L2 恢复，一次刷新只重新计算真正过期的部分。
+    """
+
+    _lock = threading.Lock()
+    # code -> (price, monotonic 取得时间)
+    _quotes = {}
+    # (code, timeframe) -> (ema_values 或 None（K线不足）, as_of)
+    _emas = {}
+    # code -> (eps, 获取时间)
+    _eps = {}
+    # 已从 L2 恢复过的 (code, timeframe)
+    _hydrated = set()
+    _counters = {'quote_hits': 0, 'quote_misses': 0, 'ema_hits': 0, 'ema_misses': 0, 'eps_hits': 0, 'eps_misses': 0}
+
+    @staticmethod
+    def reset() -> None:
+        with MonitorCacheService._lock:
+            MonitorCacheService._quotes.clear()
+            MonitorCacheService._emas.clear()
+            MonitorCacheService._eps.clear()
+            MonitorCacheService._hydrated.clear()
+            for key in MonitorCacheService._counters:
+                MonitorCacheService._counters[key] = 0
+
+    @staticmethod
+    def _count(name: str, hit: bool) -> None:
+        with MonitorCacheService._lock:
+            MonitorCacheService._counters[f"{name}_{'hits' if hit else 'misses'}"] += 1
+
+    @staticmethod
+    async def hydrate(pairs) -> None:
+        """从 monitor_data_cache 恢复尚未载入内存的 EMA 与 EPS，每个 (code, timeframe) 在进程内只读一次"""
+        missing = [pair for pair in dict.fromkeys(pairs) if pair not in MonitorCacheService._hydrated]
+        if not missing:
+            return
+        rows = await MonitorDataCacheRepository.get_batch_by_code_and_timeframe(
+            missing, MONITOR_CACHE_RETENTION_HOURS * 60
+        )
+        with MonitorCacheService._lock:
+            for (code, timeframe), row in rows.items():
+                if row.ema_as_of is not None and (code, timeframe) not in MonitorCacheService._emas:
+                    values = {key: getattr(row, key) for key in MONITOR_EMA_KEYS}
+                    MonitorCacheService._emas[(code, timeframe)] = (values, row.ema_as_of)
+                if row.eps_forecast is not None and row.eps_updated_at is not None:
+                    current = MonitorCacheService._eps.get(code)
+                    if current is None or current[1] < row.eps_updated_at:
+                        MonitorCacheService._eps[code] = (row.eps_forecast, row.eps_updated_at)
+            MonitorCacheService._hydrated.update(missing)
+        logger.info(f'从 monitor_data_cache 恢复 {len(rows)}/{len(missing)} 条监控缓存')
+
+    @staticmethod
+    def get_quote(code):
+        entry = MonitorCacheService._quotes.get(code)
+        hit = entry is not None and time.monotonic() - entry[1] < MONITOR_QUOTE_TTL
+        MonitorCacheService._count('quote', hit)
+        return entry[0] if hit else None
+
+    @staticmethod
+    def put_quote(code, price) -> None:
+        if price is not None:
+            MonitorCacheService._quotes[code] = (price, time.monotonic())
+
+    @staticmethod
+    def get_emas(pair, latest_date):
+        """返回 (命中, ema_values)；缓存的 as_of 与该股票当前最新K线日期一致才算命中"""
+        entry = MonitorCacheService._emas.get(pair)
+        hit = entry is not None and entry[1] == latest_date
+        MonitorCacheService._count('ema', hit)
+        return hit, entry[0] if hit else None
+
+    @staticmethod
+    def put_emas(pair, values, as_of) -> None:
+        MonitorCacheService._emas[pair] = (values, as_of)
+
+    @staticmethod
+    async def evict_emas(pairs) -> None:
+        """EMA 状态被全量重算（回补历史、前复权改写）时调用
+
+        改写历史不一定推进最新K线日期，只比较 as_of 会继续命中旧值，所以直接丢弃内存里的条目，
+        并清空 L2 的 ema_as_of，下一次刷新从 ema_state 重新读取。
+        """
+        pairs = list(pairs)
+        if not pairs:
+            return
+        with MonitorCacheService._lock:
+            for pair in pairs:
+                MonitorCacheService._emas.pop(pair, None)
+        try:
+            await MonitorDataCacheRepository.clear_ema_as_of(pairs)
+        except Exception as exc:
+            logger.warning(f'清空监控缓存中的 EMA 失败: {exc}')
+
+    @staticmethod
+    def get_ema_as_of(pair):
+        entry = MonitorCacheService._emas.get(pair)
+        return entry[1] if entry else None
+
+    @staticmethod
+    def get_eps(code):
+        """返回 (命中, eps)；按获取时间仍在 eps_cache 有效期内才算命中"""
+        from services.eps_service import EpsService
+
+        entry = MonitorCacheService._eps.get(code)
+        hit = entry is not None and EpsService.is_fresh(entry[0], entry[1])
+        MonitorCacheService._count('eps', hit)
+        return hit, entry[0] if hit else None
+
+    @staticmethod
+    def put_eps(code, eps, updated_at) -> None:
+        """updated_at 为 eps_cache 中的获取时间；eps 为 None 表示已确认没有盈利预测（负缓存）"""
+        MonitorCacheService._eps[code] = (eps, updated_at)
+
+    @staticmethod
+    def evict_eps(codes) -> None:
+        """eps_cache 写入新值后调用，下一次刷新重新读取这些股票的 EPS"""
+        with MonitorCacheService._lock:
+            for code in codes:
+                MonitorCacheService._eps.pop(code, None)
+
+    @staticmethod
+    def get_eps_updated_at(code):
+        entry = MonitorCacheService._eps.get(code)
+        return entry[1] if entry else None
+
+    @staticmethod
+    async def clean_expired() -> int:
+        """定时维护任务：分批删除 monitor_data_cache 中超过保留时间的行"""
+        try:
+            deleted = await MonitorDataCacheRepository.clean_old_data(MONITOR_CACHE_RETENTION_HOURS)
+        except Exception as exc:
+            logger.error(f'清理过期监控缓存失败: {exc}')
+            return 0
+        logger.info(f'清理了 {deleted} 条过期监控缓存')
+        return deleted
+
+    @staticmethod
+    def stats() -> dict:
+        with MonitorCacheService._lock:
+            return {
+                'name': 'monitor_cache',
+                'quote_ttl': MONITOR_QUOTE_TTL,
+                'quotes': len(MonitorCacheService._quotes),
+                'emas': len(MonitorCacheService._emas),
+                'eps': len(MonitorCacheService._eps),
+                **MonitorCacheService._counters,
+            }
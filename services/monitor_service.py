@@ -2,6 +2,7 @@ from repositories.monitor_repository import MonitorStockRepository
 from repositories.portfolio_repository import StockRepository
 from services.data_service import DataService
 from services.monitor_scoring_service import MonitorScoringService
+from services.monitor_snapshot_service import MonitorSnapshotService
 from services.service_helpers import clear_proxy_env, success_or_failure
 
 clear_proxy_env()
@@ -14,6 +15,17 @@ class MonitorService:
     async def get_monitor_data():
         return await DataService.get_monitor_data()
 
+    @staticmethod
+    def _refresh_snapshot(success):
+        """监控股票变更成功后重建快照，不必等到下一次定时刷新"""
+        if success:
+            MonitorSnapshotService.request_rebuild()
+
+    @staticmethod
+    async def get_monitor_snapshot():
+        """返回后台构建好的监控快照，/api/monitor 与 /api/dashboard 共用，请求路径上不访问行情接口"""
+        return await MonitorSnapshotService.get_snapshot()
+
     @staticmethod
     async def get_enriched_monitor_data():
         stocks = await DataService.get_monitor_data()
@@ -76,21 +88,26 @@ class MonitorService:
 
     @staticmethod
     async def create_monitor_stock(code, name, timeframe, pe_min=15, pe_max=20):
-        return await MonitorStockRepository.add(code, name, timeframe, pe_min, pe_max)
+        success, msg = await MonitorStockRepository.add(code, name, timeframe, pe_min, pe_max)
+        MonitorService._refresh_snapshot(success)
+        return success, msg
 
     @staticmethod
     async def update_monitor_stock(code, name, timeframe, pe_min, pe_max):
         success = await MonitorStockRepository.update(code, name, timeframe, pe_min, pe_max)
+        MonitorService._refresh_snapshot(success)
         return success_or_failure(success, '更新成功', '更新失败')
 
     @staticmethod
     async def delete_monitor_stock(code):
         success = await MonitorStockRepository.delete(code)
+        MonitorService._refresh_snapshot(success)
         return success_or_failure(success, '删除成功', '删除失败')
 
     @staticmethod
     async def toggle_monitor_stock(code, enabled):
         success = await MonitorStockRepository.toggle_enabled(code, enabled)
+        MonitorService._refresh_snapshot(success)
         return success_or_failure(success, '操作成功', '操作失败')
 
     @staticmethod
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import os
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+from models.monitor_snapshot import MonitorSnapshot
+from repositories.monitor_snapshot_repository import MonitorSnapshotRepository
+from utils.api_helpers import clean_nan_values
+from utils.logger import get_logger
+
+logger = get_logger('monitor_snapshot_service')
+
+SNAPSHOT_INTERVAL = float(os.getenv('MONITOR_SNAPSHOT_INTERVAL', '60'))
+SNAPSHOT_IDLE_INTERVAL = float(os.getenv('MONITOR_SNAPSHOT_IDLE_INTERVAL', '1800'))
+SNAPSHOT_KEEP = int(os.getenv('MONITOR_SNAPSHOT_KEEP', '48'))
+# 集合竞价到收盘（含午休前后几分钟），这段时间按 SNAPSHOT_INTERVAL 刷新，其余时间按 SNAPSHOT_IDLE_INTERVAL
+TRADING_WINDOWS = (((9, 15), (11, 35)), ((12, 55), (15, 5)))
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def _encode(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, default=_json_default).encode('utf-8')
+
+
+class MonitorSnapshotService:
+    """监控看板快照：后台构建、整体替换的只读结果
+
+    构建时完成监控数据（EMA 状态、实时行情、EPS）与首页数据（持仓行情、雪球调仓）的全部取数与计算，
+    发布为不可变的 MonitorSnapshot，同时写入 monitor_snapshots。/api/monitor 与 /api/dashboard
+    直接返回快照里预先编码好的响应体，请求路径上没有上游调用。快照由定时任务（交易时段短间隔、
+    其余时间长间隔）和K线入库后的重建请求刷新；进程重启后先读数据库里的最新版本。
+    """
+
+    # snapshot 为当前发布的快照，published_at 为其构建时间戳；task 为进行中的构建，rerun 表示构建期间又收到了重建请求
+    _state = {'snapshot': None, 'published_at': 0.0, 'loaded': False, 'task': None, 'rerun': False}
+
+    @staticmethod
+    def reset() -> None:
+        MonitorSnapshotService._state.update(
+            snapshot=None, published_at=0.0, loaded=False, task=None, rerun=False
+        )
+
+    @staticmethod
+    def in_trading_session(now: datetime) -> bool:
+        if now.weekday() >= 5:
+            return False
+        current = (now.hour, now.minute)
+        return any(start <= current <= end for start, end in TRADING_WINDOWS)
+
+    @staticmethod
+    def _make_snapshot(version: int, built_at: str, stocks: list, dashboard: dict) -> MonitorSnapshot:
+        monitor_body = _encode({
+            'status': 'success',
+            'timestamp': built_at,
+            'snapshot_version': version,
+            'stocks': stocks,
+        })
+        dashboard_body = _encode({
+            'status': 'success',
+            'timestamp': built_at,
+            'snapshot_version': version,
+            'data': dashboard,
+        })
+        return MonitorSnapshot(version, built_at, tuple(stocks), dashboard, monitor_body, dashboard_body)
+
+    @staticmethod
+    def _publish(snapshot: MonitorSnapshot, published_at: float) -> None:
+        state = MonitorSnapshotService._state
+        state['snapshot'] = snapshot
+        state['published_at'] = published_at
+
+    @staticmethod
+    async def _build() -> MonitorSnapshot:
+        from services.dashboard_service import DashboardService
+        from services.monitor_service import MonitorService
+
+        start = time.time()
+        stocks = await MonitorService.get_enriched_monitor_data()
+        dashboard = await DashboardService.get_dashboard_data(stocks)
+        stocks = clean_nan_values(stocks)
+        dashboard = clean_nan_values(dashboard)
+
+        built_at = datetime.now()
+        current = MonitorSnapshotService._state['snapshot']
+        version = current.version + 1 if current else 1
+        try:
+            payload_json = _encode({'stocks': stocks, 'dashboard': dashboard}).decode('utf-8')
+            version = await MonitorSnapshotRepository.save(built_at, len(stocks), payload_json, SNAPSHOT_KEEP)
+        except Exception as exc:
+            logger.warning(f'监控快照写入数据库失败，仅发布到内存: {exc}')
+
+        snapshot = MonitorSnapshotService._make_snapshot(
+            version, built_at.strftime('%Y-%m-%d %H:%M:%S'), stocks, dashboard
+        )
+        MonitorSnapshotService._publish(snapshot, built_at.timestamp())
+        logger.info(f'监控快照 v{version} 已发布：{len(stocks)} 只股票，耗时 {time.time() - start:.2f}s')
+        return snapshot
+
+    @staticmethod
+    async def _build_until_settled() -> MonitorSnapshot:
+        state = MonitorSnapshotService._state
+        while True:
+            state['rerun'] = False
+            snapshot = await MonitorSnapshotService._build()
+            if not state['rerun']:
+                return snapshot
+            logger.info('构建期间有新的K线写入，重新构建监控快照')
+
+    @staticmethod
+    def _running_task():
+        task = MonitorSnapshotService._state['task']
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            return None
+        return task
+
+    @staticmethod
+    async def rebuild() -> MonitorSnapshot:
+        """构建并发布新快照；已有构建在进行时等待它完成，而不是再起一次"""
+        task = MonitorSnapshotService._running_task()
+        if task is None:
+            task = asyncio.get_running_loop().create_task(MonitorSnapshotService._build_until_settled())
+            MonitorSnapshotService._state['task'] = task
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def request_rebuild() -> None:
+        """K线入库后调用：后台重建快照；正在构建时只做标记，当前构建结束后再构建一次"""
+        if MonitorSnapshotService._running_task() is not None:
+            MonitorSnapshotService._state['rerun'] = True
+            return
+        asyncio.get_running_loop().create_task(MonitorSnapshotService.refresh())
+
+    @staticmethod
+    async def refresh() -> None:
+        """后台任务入口，失败只记录日志，继续使用上一个快照"""
+        try:
+            await MonitorSnapshotService.rebuild()
+        except Exception as exc:
+            logger.error(f'构建监控快照失败，继续使用上一个版本: {exc}')
+
+    @staticmethod
+    async def refresh_if_due() -> None:
+        """定时任务：交易时段每次都重建，其余时间距上次构建超过 SNAPSHOT_IDLE_INTERVAL 才重建"""
+        interval = SNAPSHOT_INTERVAL if MonitorSnapshotService.in_trading_session(datetime.now()) else SNAPSHOT_IDLE_INTERVAL
+        age = time.time() - MonitorSnapshotService._state['published_at']
+        # 留出调度抖动的余量，避免恰好差几毫秒而跳过一轮
+        if MonitorSnapshotService._state['snapshot'] is None or age >= interval - 5:
+            await MonitorSnapshotService.refresh()
+
+    @staticmethod
+    async def _load_latest() -> MonitorSnapshot | None:
+        try:
+            row = await MonitorSnapshotRepository.get_latest()
+        except Exception as exc:
+            logger.warning(f'读取数据库中的监控快照失败: {exc}')
+            return None
+        if row is None:
+            return None
+        payload = json.loads(row['payload'])
+        snapshot = MonitorSnapshotService._make_snapshot(
+            row['version'],
+            row['built_at'].strftime('%Y-%m-%d %H:%M:%S'),
+            payload['stocks'],
+            payload['dashboard'],
+        )
+        MonitorSnapshotService._publish(snapshot, row['built_at'].timestamp())
+        logger.info(f"已从数据库恢复监控快照 v{row['version']}（{snapshot.built_at}）")
+        return snapshot
+
+    @staticmethod
+    async def get_snapshot() -> MonitorSnapshot:
+        """返回当前快照。只有进程启动后还没有任何快照时才会等待：先读数据库，再不行就现场构建一次"""
+        state = MonitorSnapshotService._state
+        if state['snapshot'] is not None:
+            return state['snapshot']
+
+        if not state['loaded']:
+            state['loaded'] = True
+            snapshot = await MonitorSnapshotService._load_latest()
+            if snapshot is not None:
+                if time.time() - state['published_at'] >= SNAPSHOT_IDLE_INTERVAL:
+                    MonitorSnapshotService.request_rebuild()
+                return snapshot
+        return await MonitorSnapshotService.rebuild()
+
+    @staticmethod
+    async def warm_up() -> None:
+        """启动时调用：先恢复数据库里的最新快照（过旧时后台重建），没有则现场构建一次"""
+        try:
+            await MonitorSnapshotService.get_snapshot()
+        except Exception as exc:
+            logger.error(f'启动时准备监控快照失败: {exc}')
+
+    @staticmethod
+    def stats() -> dict:
+        snapshot = MonitorSnapshotService._state['snapshot']
+        return {
+            'version': snapshot.version if snapshot else None,
+            'built_at': snapshot.built_at if snapshot else None,
+            'stocks': len(snapshot.stocks) if snapshot else 0,
+            'building': MonitorSnapshotService._state['task'] is not None
+            and not MonitorSnapshotService._state['task'].done(),
+        }
@@ -6,6 +6,8 @@ from concurrent.futures import ThreadPoolExecutor
 import akshare as ak
 from repositories.portfolio_repository import StockRepository
 from services.service_helpers import build_xueqiu_headers, clear_proxy_env
+from utils.adaptive_limiter import get_limiter
+from utils.http_clients import get_http_clients
 from utils.logger import get_logger
 
 # 获取日志实例
@@ -42,18 +44,23 @@ class PortfolioService:
             # 使用雪球API获取股票数据
             url = f"https://stock.xueqiu.com/v5/stock/quote.json?symbol={symbol}&extend=detail"
             
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                response.raise_for_status()
-                data = await response.json()
+            async with get_limiter('quote').slot():
+                async with session.get(
+                    url,
+                    headers=PortfolioService._get_headers(),
+                    timeout=get_http_clients().timeout('quote'),
+                ) as response:
+                    response.raise_for_status()
+                    data = await response.json()
+            
+            if data and 'data' in data and 'quote' in data['data']:
+                quote = data['data']['quote']
+                current_price = quote.get('current')
+                dividend_ttm = quote.get('dividend')
+                dividend_yield_ttm = quote.get('dividend_yield')
                 
-                if data and 'data' in data and 'quote' in data['data']:
-                    quote = data['data']['quote']
-                    current_price = quote.get('current')
-                    dividend_ttm = quote.get('dividend')
-                    dividend_yield_ttm = quote.get('dividend_yield')
-                    
-                    if current_price and current_price > 0:
-                        return stock_code, current_price, dividend_ttm or 0, dividend_yield_ttm or 0
+                if current_price and current_price > 0:
+                    return stock_code, current_price, dividend_ttm or 0, dividend_yield_ttm or 0
         
         except Exception as e:
             logger.error(f"获取 {stock_code} 实时价格失败: {str(e)[:100]}")
@@ -67,9 +74,7 @@ class PortfolioService:
         Returns:
             tuple: (stock_code, current_price, dividend_ttm, dividend_yield_ttm)
         """
-        headers = PortfolioService._get_headers()
-        async with aiohttp.ClientSession(headers=headers, trust_env=False) as session:
-            return await PortfolioService._fetch_stock_price(session, stock_code)
+        return await PortfolioService._fetch_stock_price(get_http_clients().session(), stock_code)
 
     @staticmethod
     def get_real_time_price(stock_code, max_retries=3):
@@ -78,7 +83,14 @@ class PortfolioService:
         Returns:
             tuple: (stock_code, current_price, dividend_ttm, dividend_yield_ttm)
         """
-        return asyncio.run(PortfolioService.get_real_time_price_async(stock_code, max_retries))
+        async def fetch():
+            try:
+                return await PortfolioService.get_real_time_price_async(stock_code, max_retries)
+            finally:
+                # asyncio.run 每次新建事件循环，退出前关掉这个循环上的连接池
+                await get_http_clients().close_session()
+
+        return asyncio.run(fetch())
     
     @staticmethod
     async def get_portfolio_data():
@@ -99,26 +111,23 @@ class PortfolioService:
         stock_codes = [stock.code for stock in stocks]
         logger.info(f"开始获取 {len(stock_codes)} 只股票的实时价格")
 
-        headers = PortfolioService._get_headers()
-        connector = aiohttp.TCPConnector(limit=10, ttl_dns_cache=300)
-
-        async with aiohttp.ClientSession(headers=headers, connector=connector, trust_env=False) as session:
-            # 创建所有异步任务
-            tasks = [PortfolioService._fetch_stock_price(session, code) for code in stock_codes]
+        session = get_http_clients().session()
+        # 创建所有异步任务
+        tasks = [PortfolioService._fetch_stock_price(session, code) for code in stock_codes]
 
-            # 并发执行所有任务
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+        # 并发执行所有任务
+        results = await asyncio.gather(*tasks, return_exceptions=True)
 
-            # 处理结果
-            processed_results = []
-            for result in results:
-                if isinstance(result, Exception):
-                    logger.error(f"获取股票数据时发生异常: {result}")
-                    processed_results.append((None, None, None, None))
-                else:
-                    processed_results.append(result)
+        # 处理结果
+        processed_results = []
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"获取股票数据时发生异常: {result}")
+                processed_results.append((None, None, None, None))
+            else:
+                processed_results.append(result)
 
-            results = processed_results
+        results = processed_results
 
         # 构建股票数据映射
         stock_data_map = {
@@ -1,18 +1,22 @@
 import asyncio
 import json
 import os
+import time
 from datetime import datetime
 from pathlib import Path
+from stat import S_ISREG
 
-import aiohttp
+import numpy as np
 import pandas as pd
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 
 from repositories.analysis_repository import AnalysisRepository
-from repositories.kline_repository import KlineRepository
+from repositories.kline_repository import KLINE_ARRAY_KEYS
 from repositories.stock_list_repository import StockListRepository
+from services.derived_kline_service import DerivedKlineService
+from services.kline_service import KlineService
+from services.kline_timeframes import DERIVED_TIMEFRAMES
+from utils.compute_executor import get_compute_executor
+from utils.http_clients import get_http_clients
 from utils.logger import get_logger
 
 logger = get_logger('price_action_service')
@@ -20,22 +24,18 @@ logger = get_logger('price_action_service')
 
 class PriceActionService:
     EMA_WARMUP = 40
+    PAYLOAD_METRIC_FIELDS = (
+        'ema20', 'ema20_slope', 'ema20_distance', 'body_ratio',
+        'upper_wick_ratio', 'lower_wick_ratio', 'close_position',
+    )
+    PAYLOAD_FIELDS = (
+        'date', 'open', 'high', 'low', 'close', 'volume', 'amount', 'change_pct', 'turnover', 'amplitude',
+        *PAYLOAD_METRIC_FIELDS, 'bar_type', 'gap',
+    )
     VALID_PERIODS = {'daily': '101', 'weekly': '102', 'monthly': '103'}
     SKILL_ROOT = Path(r'C:\Users\86158\.openclaw\workspace\skills\price-action')
-
-    @staticmethod
-    def _build_session() -> requests.Session:
-        session = requests.Session()
-        session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/145.0.0.0 Safari/537.36',
-            'Referer': 'https://quote.eastmoney.com/',
-            'Connection': 'close',
-        })
-        retry = Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
-        adapter = HTTPAdapter(max_retries=retry)
-        session.mount('http://', adapter)
-        session.mount('https://', adapter)
-        return session
+    # skill 资产缓存：fingerprints 为已同步文件的 {asset_key: mtime_ns:size}，layers 为拼好的提示词
+    _prompt_cache = {'fingerprints': None, 'layers': None, 'checked_at': 0.0}
 
     @staticmethod
     def _strip_prefix(code: str) -> str:
@@ -108,29 +108,6 @@ class PriceActionService:
         gaps[df['high'] < prev_low] = 'gap_down'
         return gaps
 
-    @staticmethod
-    def _resample_from_daily(df: pd.DataFrame, period: str) -> pd.DataFrame:
-        if period == 'daily':
-            return df
-
-        rule = 'W-FRI' if period == 'weekly' else 'ME'
-        agg = {
-            'open': 'first',
-            'close': 'last',
-            'high': 'max',
-            'low': 'min',
-            'volume': 'sum',
-            'amount': 'sum',
-        }
-        resampled = (
-            df.set_index('date')
-            .resample(rule)
-            .agg(agg)
-            .dropna()
-            .reset_index()
-        )
-        return resampled
-
     @staticmethod
     def _build_analysis_payload(df: pd.DataFrame, code: str, stock_name: str, period: str, count: int) -> dict:
         df = df.copy()
@@ -144,31 +121,46 @@ class PriceActionService:
         if len(df) > count:
             df = df.tail(count).reset_index(drop=True)
 
-        klines = []
-        for _, row in df.iterrows():
-            item = {
-                'date': row['date'].strftime('%Y-%m-%d') if hasattr(row['date'], 'strftime') else str(row['date']),
-                'open': round(float(row['open']), 2),
-                'high': round(float(row['high']), 2),
-                'low': round(float(row['low']), 2),
-                'close': round(float(row['close']), 2),
-                'volume': round(float(row.get('volume', 0))),
-                'amount': round(float(row.get('amount', 0)), 2),
-                'change_pct': round(float(row.get('change_pct', 0)), 2) if 'change_pct' in row else 0,
-                'turnover': round(float(row.get('turnover', 0)), 2) if 'turnover' in row else 0,
-                'amplitude': round(float(row.get('amplitude', 0)), 2) if 'amplitude' in row else round(((row['high'] - row['low']) / row['close']) * 100, 2) if row['close'] else 0,
-                'ema20': float(row['ema20']),
-                'ema20_slope': float(row['ema20_slope']),
-                'ema20_distance': float(row['ema20_distance']),
-                'body_ratio': float(row['body_ratio']),
-                'upper_wick_ratio': float(row['upper_wick_ratio']),
-                'lower_wick_ratio': float(row['lower_wick_ratio']),
-                'close_position': float(row['close_position']),
-                'bar_type': row['bar_type'],
-            }
-            if pd.notna(row.get('gap')):
-                item['gap'] = row['gap']
-            klines.append(item)
+        # 整列取整后一次 zip 出逐根记录，不再 iterrows 逐行 round(float(...))
+        rows = len(df)
+
+        def rounded(name, decimals=2):
+            if name not in df.columns:
+                return [0] * rows
+            return df[name].astype(float).round(decimals).tolist()
+
+        if 'amplitude' in df.columns:
+            amplitude = rounded('amplitude')
+        else:
+            close_safe = df['close'].replace(0, float('nan'))
+            amplitude = (((df['high'] - df['low']) / close_safe) * 100).round(2).fillna(0).tolist()
+        if pd.api.types.is_datetime64_any_dtype(df['date']):
+            dates = df['date'].dt.strftime('%Y-%m-%d').tolist()
+        else:
+            dates = df['date'].astype(str).tolist()
+        volumes = df['volume'].astype(float).round().astype('int64').tolist() if 'volume' in df.columns else [0] * rows
+
+        columns = {
+            'date': dates,
+            'open': rounded('open'),
+            'high': rounded('high'),
+            'low': rounded('low'),
+            'close': rounded('close'),
+            'volume': volumes,
+            'amount': rounded('amount'),
+            'change_pct': rounded('change_pct'),
+            'turnover': rounded('turnover'),
+            'amplitude': amplitude,
+        }
+        for name in PriceActionService.PAYLOAD_METRIC_FIELDS:
+            columns[name] = df[name].astype(float).tolist()
+        columns['bar_type'] = df['bar_type'].tolist()
+
+        keys = tuple(columns)
+        klines = [dict(zip(keys, values)) for values in zip(*columns.values())]
+        gaps = df['gap']
+        for index in np.flatnonzero(gaps.notna().to_numpy()):
+            klines[index]['gap'] = gaps.iat[index]
 
         return {
             'code': PriceActionService._strip_prefix(code),
@@ -179,32 +171,116 @@ class PriceActionService:
         }
 
     @staticmethod
-    async def sync_skill_assets_to_db() -> None:
+    def _encode_kline_data(kline_data: dict, prompt_format: str) -> str:
+        """把分析数据编码为提示词正文
+
+        json 为缩进 JSON（每根K线重复全部键名）；columnar 为一行概要、一行表头加逐根 CSV 行，
+        60～500 根K线时提示词长度约为 JSON 的四分之一。
+        """
+        if prompt_format != 'columnar':
+            return json.dumps(kline_data, ensure_ascii=False, indent=2)
+
+        fields = PriceActionService.PAYLOAD_FIELDS
+        lines = [
+            f"code={kline_data['code']} name={kline_data['name']} "
+            f"period={kline_data['period']} count={kline_data['count']}",
+            ','.join(fields),
+        ]
+        for item in kline_data['klines']:
+            lines.append(','.join('' if item.get(field) is None else str(item.get(field)) for field in fields))
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _scan_skill_files() -> dict | None:
+        """只 stat 不读内容：{asset_key: (path, category, fingerprint)}，目录不存在时返回 None"""
         root = PriceActionService.SKILL_ROOT
         if not root.exists():
-            logger.warning(f'Price action skill root not found: {root}')
-            return
+            return None
 
-        files = [path for path in root.rglob('*') if path.is_file() and '.git' not in path.parts]
-        for path in files:
+        files = {}
+        for path in root.rglob('*'):
+            if '.git' in path.parts:
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if not S_ISREG(stat.st_mode):
+                continue
             category = 'skill'
             if 'references' in path.parts:
                 category = 'reference'
             elif 'scripts' in path.parts:
                 category = 'script'
             asset_key = str(path.relative_to(root)).replace('\\', '/')
-            content = path.read_text(encoding='utf-8', errors='replace')
-            await AnalysisRepository.upsert_prompt_asset(
-                asset_key=asset_key,
-                category=category,
-                source_path=str(path),
-                content=content,
-            )
+            files[asset_key] = (path, category, f'{stat.st_mtime_ns}:{stat.st_size}')
+        return files
+
+    @staticmethod
+    def _read_skill_files(files: dict) -> list[dict]:
+        return [
+            {
+                'asset_key': asset_key,
+                'category': category,
+                'source_path': str(path),
+                'content': path.read_text(encoding='utf-8', errors='replace'),
+                'fingerprint': fingerprint,
+            }
+            for asset_key, (path, category, fingerprint) in files.items()
+        ]
+
+    @staticmethod
+    async def sync_skill_assets_to_db() -> bool:
+        """把有变化的 skill 文件同步到 prompt_assets
+
+        按文件 mtime / size 指纹比较，只读取并写入新增或修改过的文件。
+
+        Returns:
+            bool: 是否有文件被写入
+        """
+        files = await asyncio.to_thread(PriceActionService._scan_skill_files)
+        if files is None:
+            logger.warning(f'Price action skill root not found: {PriceActionService.SKILL_ROOT}')
+            return False
+
+        cache = PriceActionService._prompt_cache
+        if cache['fingerprints'] is None:
+            cache['fingerprints'] = await AnalysisRepository.list_prompt_asset_fingerprints()
+        changed = {
+            asset_key: entry for asset_key, entry in files.items()
+            if cache['fingerprints'].get(asset_key) != entry[2]
+        }
+        if not changed:
+            return False
+
+        assets = await asyncio.to_thread(PriceActionService._read_skill_files, changed)
+        await AnalysisRepository.upsert_prompt_assets(assets)
+        cache['fingerprints'].update({item['asset_key']: item['fingerprint'] for item in assets})
+        logger.info(f'Synced {len(assets)} changed price action skill files')
+        return True
 
     @staticmethod
     async def _load_prompt_layers() -> tuple[str, str]:
-        await PriceActionService.sync_skill_assets_to_db()
-        assets = await AnalysisRepository.list_prompt_assets()
+        """返回 (system_prompt, analysis_rubric)
+
+        拼好的提示词缓存在进程内；距上次检查超过 ANALYSIS_PROMPT_SCAN_INTERVAL 秒才重新扫描 skill 目录，
+        只有资产发生变化时才重新读取 prompt_assets 并拼接。
+        """
+        cache = PriceActionService._prompt_cache
+        interval = float(os.getenv('ANALYSIS_PROMPT_SCAN_INTERVAL', '30'))
+        now = time.monotonic()
+        if cache['layers'] is not None and now - cache['checked_at'] < interval:
+            return cache['layers']
+
+        changed = await PriceActionService.sync_skill_assets_to_db()
+        if changed or cache['layers'] is None:
+            assets = await AnalysisRepository.list_prompt_assets()
+            cache['layers'] = PriceActionService._compose_prompt_layers(assets)
+        cache['checked_at'] = now
+        return cache['layers']
+
+    @staticmethod
+    def _compose_prompt_layers(assets: list[dict]) -> tuple[str, str]:
         skill_docs = [item for item in assets if item['category'] == 'skill']
         reference_docs = [item for item in assets if item['category'] == 'reference']
 
@@ -238,43 +314,46 @@ class PriceActionService:
 
         return system_prompt, analysis_rubric
 
+    @staticmethod
+    def _payload_from_arrays(arrays: dict, code: str, stock_name: str, period: str, count: int) -> dict:
+        """在计算进程中执行：由K线列数组构造 DataFrame 并生成分析数据"""
+        df = pd.DataFrame({
+            'date': arrays['dates'].astype('datetime64[ns]'),
+            'open': arrays['opens'],
+            'close': arrays['closes'],
+            'high': arrays['highs'],
+            'low': arrays['lows'],
+            'volume': arrays['volumes'],
+            'amount': arrays['amounts'],
+        })
+        return PriceActionService._build_analysis_payload(df, code, stock_name, period, count)
+
     @staticmethod
     async def _fetch_kline_from_db(code: str, count: int, period: str) -> dict | None:
+        limit = max(count * 6, 300)
         for candidate in PriceActionService._normalize_code_candidates(code):
-            df = await KlineRepository.get_by_code(candidate, limit=max(count * 6, 300))
-            if df is None or df.empty:
-                continue
-
-            renamed = df.rename(columns={
-                '日期': 'date',
-                '开盘': 'open',
-                '收盘': 'close',
-                '最高': 'high',
-                '最低': 'low',
-            }).copy()
-            if 'date' not in renamed.columns:
-                continue
-            renamed['date'] = pd.to_datetime(renamed['date'], errors='coerce')
-            renamed = renamed.dropna(subset=['date']).sort_values('date')
-            if renamed.empty:
+            # 周K / 月K直接读取 stock_kline_derived 中预先聚合好的K线
+            if period in DERIVED_TIMEFRAMES:
+                arrays = (await DerivedKlineService.get_arrays([candidate], period, limit=limit)).get(candidate)
+            else:
+                arrays = (await KlineService.get_daily_arrays([candidate], limit=limit)).get(candidate)
+            if arrays is None or not len(arrays['dates']):
                 continue
 
-            resampled = PriceActionService._resample_from_daily(renamed, period)
-            if resampled.empty:
-                continue
-
-            return PriceActionService._build_analysis_payload(
-                resampled,
-                code=candidate,
-                stock_name=PriceActionService._strip_prefix(candidate),
-                period=period,
-                count=count,
+            # 指标与逐根K线分类是 CPU 密集计算，放到计算进程池，列数组经共享内存传递
+            return await get_compute_executor().run_arrays(
+                PriceActionService._payload_from_arrays,
+                {key: arrays[key] for key in KLINE_ARRAY_KEYS},
+                candidate,
+                PriceActionService._strip_prefix(candidate),
+                period,
+                count,
             )
         return None
 
     @staticmethod
     def _fetch_kline_sync(code: str, count: int, period: str) -> dict | None:
-        session = PriceActionService._build_session()
+        session = get_http_clients().requests_session()
         raw_code = PriceActionService._strip_prefix(code)
         fetch_count = count + PriceActionService.EMA_WARMUP
         market_code = PriceActionService._get_market_code(raw_code)
@@ -332,49 +411,7 @@ class PriceActionService:
             for arr in (line.split(',') for line in rows)
         ])
 
-        df['ema20'] = PriceActionService._compute_ema(df['close'], span=20).round(2)
-        df['ema20_slope'] = (df['ema20'].pct_change() * 100).round(3).fillna(0)
-        ema_safe = df['ema20'].replace(0, float('nan'))
-        df['ema20_distance'] = (((df['close'] - df['ema20']) / ema_safe) * 100).round(2).fillna(0)
-        df = PriceActionService._compute_bar_metrics(df)
-        df['bar_type'] = PriceActionService._classify_bar_type(df)
-        df['gap'] = PriceActionService._detect_gaps(df)
-        if len(df) > count:
-            df = df.tail(count).reset_index(drop=True)
-
-        klines = []
-        for _, row in df.iterrows():
-            item = {
-                'date': str(row['date']),
-                'open': round(float(row['open']), 2),
-                'high': round(float(row['high']), 2),
-                'low': round(float(row['low']), 2),
-                'close': round(float(row['close']), 2),
-                'volume': round(float(row.get('volume', 0))),
-                'amount': round(float(row.get('amount', 0)), 2),
-                'change_pct': round(float(row.get('change_pct', 0)), 2),
-                'turnover': round(float(row.get('turnover', 0)), 2),
-                'amplitude': round(float(row.get('amplitude', 0)), 2),
-                'ema20': float(row['ema20']),
-                'ema20_slope': float(row['ema20_slope']),
-                'ema20_distance': float(row['ema20_distance']),
-                'body_ratio': float(row['body_ratio']),
-                'upper_wick_ratio': float(row['upper_wick_ratio']),
-                'lower_wick_ratio': float(row['lower_wick_ratio']),
-                'close_position': float(row['close_position']),
-                'bar_type': row['bar_type'],
-            }
-            if pd.notna(row['gap']):
-                item['gap'] = row['gap']
-            klines.append(item)
-
-        return {
-            'code': raw_code,
-            'name': stock_name,
-            'period': period,
-            'count': len(klines),
-            'klines': klines,
-        }
+        return PriceActionService._build_analysis_payload(df, raw_code, stock_name, period, count)
 
     @staticmethod
     async def fetch_kline_data(code: str, count: int, period: str) -> dict | None:
@@ -393,6 +430,10 @@ class PriceActionService:
     @staticmethod
     async def _build_prompt_layers(kline_data: dict) -> tuple[str, str, str]:
         system_prompt, analysis_rubric = await PriceActionService._load_prompt_layers()
+        prompt_format = os.getenv('ANALYSIS_PROMPT_FORMAT', 'json').strip().lower()
+        data_note = ''
+        if prompt_format == 'columnar':
+            data_note = '数据格式：第一行为概要，第二行为表头，其后每行一根 K 线（按日期升序，逗号分隔，gap 为空表示无缺口）。\n'
         user_data = f"""请分析以下 A 股 K 线数据。
 
 输出要求：
@@ -402,7 +443,7 @@ class PriceActionService:
 4. 输出使用 Markdown。
 
 待分析数据：
-{json.dumps(kline_data, ensure_ascii=False, indent=2)}
+{data_note}{PriceActionService._encode_kline_data(kline_data, prompt_format)}
 """
         return system_prompt, analysis_rubric, user_data
 
@@ -419,15 +460,15 @@ class PriceActionService:
         return deduped
 
     @staticmethod
-    async def _call_llm_once(
+    def _build_llm_request(
         base_url: str,
         api_style: str,
         model_name: str,
-        api_key: str,
         system_prompt: str,
         analysis_rubric: str,
         user_data: str,
-    ) -> tuple[str, str]:
+        stream: bool = False,
+    ) -> tuple[str, dict]:
         if api_style == 'responses':
             url = f'{base_url}/responses'
             payload = {
@@ -450,35 +491,42 @@ class PriceActionService:
                     {'role': 'user', 'content': user_data},
                 ],
             }
+        if stream:
+            payload['stream'] = True
+        return url, payload
 
-        headers = {
-            'Authorization': f'Bearer {api_key}',
-            'Content-Type': 'application/json',
-        }
+    @staticmethod
+    def _extract_llm_content(api_style: str, data: dict) -> str:
+        if api_style == 'responses':
+            content = data.get('output_text')
+            if not content:
+                chunks = []
+                for item in data.get('output', []):
+                    for content_item in item.get('content', []):
+                        if content_item.get('type') in {'output_text', 'text'}:
+                            chunks.append(content_item.get('text', ''))
+                content = '\n'.join(chunk for chunk in chunks if chunk).strip()
+            return content
+        return data['choices'][0]['message']['content']
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=payload, timeout=aiohttp.ClientTimeout(total=120)) as response:
-                text = await response.text()
-                if response.status >= 400:
-                    raise RuntimeError(f'{api_style} {url} -> HTTP {response.status} - {text[:500]}')
-                data = json.loads(text)
-                if api_style == 'responses':
-                    content = data.get('output_text')
-                    if not content:
-                        chunks = []
-                        for item in data.get('output', []):
-                            for content_item in item.get('content', []):
-                                if content_item.get('type') in {'output_text', 'text'}:
-                                    chunks.append(content_item.get('text', ''))
-                        content = '\n'.join(chunk for chunk in chunks if chunk).strip()
-                else:
-                    content = data['choices'][0]['message']['content']
-                if not content:
-                    raise RuntimeError(f'{api_style} {url} -> 模型返回内容为空')
-                return model_name, content
+    @staticmethod
+    def _extract_stream_delta(api_style: str, event: dict) -> str:
+        """从一条流式事件中取出新增文本；chat_completions 取 choices[0].delta.content，responses 取 output_text.delta"""
+        if api_style == 'responses':
+            event_type = event.get('type', '')
+            if event_type == 'response.output_text.delta':
+                return event.get('delta') or ''
+            if event_type in {'response.failed', 'error'}:
+                error = event.get('error') or (event.get('response') or {}).get('error') or event
+                raise RuntimeError(f'responses 流式调用失败: {error}')
+            return ''
+        choices = event.get('choices') or []
+        if not choices:
+            return ''
+        return (choices[0].get('delta') or {}).get('content') or ''
 
     @staticmethod
-    async def _call_llm(system_prompt: str, analysis_rubric: str, user_data: str) -> tuple[str, str]:
+    def _llm_config() -> tuple[str, str, str, str]:
         base_url = os.getenv('OPENAI_BASE_URL', '').rstrip('/')
         api_key = os.getenv('OPENAI_API_KEY', '')
         model_name = os.getenv('OPENAI_MODEL', '')
@@ -487,48 +535,170 @@ class PriceActionService:
             raise ValueError('OpenAI 模型配置不完整，请检查 .env 中的 OPENAI_BASE_URL / OPENAI_API_KEY / OPENAI_MODEL')
         if api_style not in {'chat_completions', 'responses'}:
             raise ValueError('OPENAI_API_STYLE 仅支持 chat_completions 或 responses')
+        return base_url, api_key, model_name, api_style
 
+    @staticmethod
+    def _llm_candidates(base_url: str, api_style: str) -> list[tuple[str, str]]:
         styles = [api_style, 'responses' if api_style == 'chat_completions' else 'chat_completions']
-        tried = []
+        candidates = []
         for candidate_base_url in PriceActionService._build_base_url_candidates(base_url):
             for candidate_style in styles:
-                key = (candidate_base_url, candidate_style)
-                if key in tried:
+                if (candidate_base_url, candidate_style) not in candidates:
+                    candidates.append((candidate_base_url, candidate_style))
+        return candidates
+
+    @staticmethod
+    async def _call_llm_once(
+        base_url: str,
+        api_style: str,
+        model_name: str,
+        api_key: str,
+        system_prompt: str,
+        analysis_rubric: str,
+        user_data: str,
+    ) -> tuple[str, str]:
+        url, payload = PriceActionService._build_llm_request(
+            base_url, api_style, model_name, system_prompt, analysis_rubric, user_data
+        )
+        headers = {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json',
+        }
+
+        clients = get_http_clients()
+        async with clients.session().post(url, headers=headers, json=payload, timeout=clients.timeout('llm')) as response:
+            text = await response.text()
+            if response.status >= 400:
+                raise RuntimeError(f'{api_style} {url} -> HTTP {response.status} - {text[:500]}')
+            content = PriceActionService._extract_llm_content(api_style, json.loads(text))
+            if not content:
+                raise RuntimeError(f'{api_style} {url} -> 模型返回内容为空')
+            return model_name, content
+
+    @staticmethod
+    async def _stream_llm_once(
+        base_url: str,
+        api_style: str,
+        model_name: str,
+        api_key: str,
+        system_prompt: str,
+        analysis_rubric: str,
+        user_data: str,
+    ):
+        """以 stream: true 调用模型，逐段产出新增文本"""
+        url, payload = PriceActionService._build_llm_request(
+            base_url, api_style, model_name, system_prompt, analysis_rubric, user_data, stream=True
+        )
+        headers = {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream',
+        }
+        clients = get_http_clients()
+        async with clients.session().post(url, headers=headers, json=payload, timeout=clients.timeout('llm_stream')) as response:
+            if response.status >= 400:
+                text = await response.text()
+                raise RuntimeError(f'{api_style} {url} -> HTTP {response.status} - {text[:500]}')
+            if response.content_type == 'application/json':
+                # 不支持流式的网关会忽略 stream 参数，直接返回完整结果
+                content = PriceActionService._extract_llm_content(api_style, await response.json())
+                if content:
+                    yield content
+                return
+
+            async for raw_line in response.content:
+                line = raw_line.decode('utf-8').strip()
+                if not line.startswith('data:'):
                     continue
-                tried.append(key)
-                try:
-                    logger.info(f'Calling LLM via {candidate_style} at {candidate_base_url}')
-                    return await PriceActionService._call_llm_once(
-                        candidate_base_url,
-                        candidate_style,
-                        model_name,
-                        api_key,
-                        system_prompt,
-                        analysis_rubric,
-                        user_data,
-                    )
-                except Exception as exc:
-                    logger.warning(f'LLM call failed via {candidate_style} at {candidate_base_url}: {exc}')
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+                delta = PriceActionService._extract_stream_delta(api_style, json.loads(data))
+                if delta:
+                    yield delta
+
+    @staticmethod
+    async def _call_llm(system_prompt: str, analysis_rubric: str, user_data: str) -> tuple[str, str]:
+        base_url, api_key, model_name, api_style = PriceActionService._llm_config()
+        for candidate_base_url, candidate_style in PriceActionService._llm_candidates(base_url, api_style):
+            try:
+                logger.info(f'Calling LLM via {candidate_style} at {candidate_base_url}')
+                return await PriceActionService._call_llm_once(
+                    candidate_base_url,
+                    candidate_style,
+                    model_name,
+                    api_key,
+                    system_prompt,
+                    analysis_rubric,
+                    user_data,
+                )
+            except Exception as exc:
+                logger.warning(f'LLM call failed via {candidate_style} at {candidate_base_url}: {exc}')
 
         raise RuntimeError('模型调用失败：已尝试 chat_completions / responses 以及 base_url 和 base_url/v1 组合，仍未成功')
 
     @staticmethod
-    async def generate_analysis(code: str, count: int = 60, period: str = 'daily') -> dict:
+    async def _stream_llm(system_prompt: str, analysis_rubric: str, user_data: str):
+        """流式版 _call_llm：按同样的顺序尝试各组合，已经产出文本后出错不再切换，直接抛出"""
+        base_url, api_key, model_name, api_style = PriceActionService._llm_config()
+        for candidate_base_url, candidate_style in PriceActionService._llm_candidates(base_url, api_style):
+            started = False
+            try:
+                logger.info(f'Streaming LLM via {candidate_style} at {candidate_base_url}')
+                async for delta in PriceActionService._stream_llm_once(
+                    candidate_base_url,
+                    candidate_style,
+                    model_name,
+                    api_key,
+                    system_prompt,
+                    analysis_rubric,
+                    user_data,
+                ):
+                    started = True
+                    yield delta
+                if started:
+                    return
+                logger.warning(f'LLM stream via {candidate_style} at {candidate_base_url} returned no content')
+            except Exception as exc:
+                if started:
+                    raise
+                logger.warning(f'LLM stream failed via {candidate_style} at {candidate_base_url}: {exc}')
+
+        raise RuntimeError('模型调用失败：已尝试 chat_completions / responses 以及 base_url 和 base_url/v1 组合，仍未成功')
+
+    @staticmethod
+    async def prepare_analysis(code: str, count: int = 60, period: str = 'daily') -> dict:
+        """校验参数与模型配置，取K线并拼好提示词；输入有误时抛 ValueError"""
         if period not in PriceActionService.VALID_PERIODS:
             raise ValueError('period 仅支持 daily / weekly / monthly')
+        model_name = PriceActionService._llm_config()[2]
 
         kline_data = await PriceActionService.fetch_kline_data(code, count, period)
         if not kline_data:
             raise ValueError('未获取到可分析的 K 线数据')
 
         system_prompt, analysis_rubric, user_data = await PriceActionService._build_prompt_layers(kline_data)
-        model_name, analysis_markdown = await PriceActionService._call_llm(system_prompt, analysis_rubric, user_data)
-        prompt = '\n\n===== SYSTEM PROMPT =====\n' + system_prompt + '\n\n===== ANALYSIS RUBRIC =====\n' + analysis_rubric + '\n\n===== USER DATA =====\n' + user_data
+        return {
+            'period': period,
+            'model_name': model_name,
+            'kline_data': kline_data,
+            'system_prompt': system_prompt,
+            'analysis_rubric': analysis_rubric,
+            'user_data': user_data,
+        }
 
+    @staticmethod
+    async def _save_report(prepared: dict, model_name: str, analysis_markdown: str) -> dict:
+        kline_data = prepared['kline_data']
+        prompt = (
+            '\n\n===== SYSTEM PROMPT =====\n' + prepared['system_prompt']
+            + '\n\n===== ANALYSIS RUBRIC =====\n' + prepared['analysis_rubric']
+            + '\n\n===== USER DATA =====\n' + prepared['user_data']
+        )
         report_id = await AnalysisRepository.create_report(
             code=kline_data['code'],
             stock_name=kline_data['name'],
-            period=period,
+            period=prepared['period'],
             kline_count=kline_data['count'],
             model_name=model_name,
             prompt_text=prompt,
@@ -540,13 +710,54 @@ class PriceActionService:
             'id': report_id,
             'code': kline_data['code'],
             'stock_name': kline_data['name'],
-            'period': period,
+            'period': prepared['period'],
             'kline_count': kline_data['count'],
             'model_name': model_name,
             'analysis_markdown': analysis_markdown,
             'input_payload': kline_data,
         }
 
+    @staticmethod
+    async def generate_analysis(code: str, count: int = 60, period: str = 'daily') -> dict:
+        prepared = await PriceActionService.prepare_analysis(code, count, period)
+        model_name, analysis_markdown = await PriceActionService._call_llm(
+            prepared['system_prompt'], prepared['analysis_rubric'], prepared['user_data']
+        )
+        return await PriceActionService._save_report(prepared, model_name, analysis_markdown)
+
+    @staticmethod
+    async def stream_analysis(prepared: dict):
+        """逐段产出 (事件名, 数据)：meta 为股票与模型信息，delta 为新增文本，done 为入库后的报告，error 为失败原因。
+        模型输出完整结束后才写入 analysis_reports，客户端中途断开则不保存"""
+        kline_data = prepared['kline_data']
+        yield 'meta', {
+            'code': kline_data['code'],
+            'stock_name': kline_data['name'],
+            'period': prepared['period'],
+            'kline_count': kline_data['count'],
+            'model_name': prepared['model_name'],
+        }
+
+        chunks = []
+        try:
+            async for delta in PriceActionService._stream_llm(
+                prepared['system_prompt'], prepared['analysis_rubric'], prepared['user_data']
+            ):
+                chunks.append(delta)
+                yield 'delta', {'text': delta}
+
+            analysis_markdown = ''.join(chunks).strip()
+            if not analysis_markdown:
+                raise RuntimeError('模型返回内容为空')
+            report = await PriceActionService._save_report(prepared, prepared['model_name'], analysis_markdown)
+        except Exception as exc:
+            logger.error(f"Streaming analysis failed for {kline_data['code']}: {exc}")
+            yield 'error', {'detail': str(exc)}
+            return
+
+        report.pop('input_payload')
+        yield 'done', report
+
     @staticmethod
     async def list_reports(limit: int = 50) -> list[dict]:
         reports = await AnalysisRepository.list_reports(limit=limit)
@@ -1,5 +1,6 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from utils.logger import get_logger
 
 logger = get_logger('scheduler_service')
@@ -71,6 +72,34 @@ class SchedulerService:
         except Exception as e:
             logger.error(f"添加定时任务失败: {e}")
     
+    @staticmethod
+    def add_interval_job(func, seconds, job_id, args=(), kwargs=None):
+        """
+        添加固定间隔执行的任务
+
+        Args:
+            func: 要执行的函数
+            seconds: 执行间隔（秒）
+            job_id: 任务ID
+            args: 位置参数
+            kwargs: 关键字参数
+        """
+        try:
+            scheduler.add_job(
+                func,
+                trigger=IntervalTrigger(seconds=seconds),
+                id=job_id,
+                args=args,
+                kwargs=kwargs or {},
+                replace_existing=True,
+                # 上一轮还没结束时跳过本轮，而不是并发执行或积压补跑
+                max_instances=1,
+                coalesce=True,
+            )
+            logger.info(f"已添加间隔任务: {job_id} - 每 {seconds} 秒执行")
+        except Exception as e:
+            logger.error(f"添加间隔任务失败: {e}")
+    
     @staticmethod
     def remove_job(job_id):
         """移除定时任务"""
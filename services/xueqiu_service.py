@@ -5,6 +5,7 @@ from typing import List, Dict, Optional
 import logging
 
 from services.service_helpers import build_xueqiu_headers
+from utils.http_clients import get_http_clients
 
 logger = logging.getLogger(__name__)
 
@@ -38,7 +39,12 @@ class XueqiuService:
         }
         
         try:
-            async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=10)) as response:
+            async with session.get(
+                url,
+                params=params,
+                headers=XueqiuService._get_headers(),
+                timeout=get_http_clients().timeout('xueqiu'),
+            ) as response:
                 response.raise_for_status()
                 data = await response.json()
                 if data and 'list' in data:
@@ -69,7 +75,14 @@ class XueqiuService:
         Returns:
             字典，key为组合ID，value为调仓历史列表
         """
-        return asyncio.run(XueqiuService.get_all_cubes_data_async())
+        async def fetch():
+            try:
+                return await XueqiuService.get_all_cubes_data_async()
+            finally:
+                # asyncio.run 每次新建事件循环，退出前关掉这个循环上的连接池
+                await get_http_clients().close_session()
+
+        return asyncio.run(fetch())
 
     @staticmethod
     async def get_all_cubes_data_async() -> Dict[str, List[Dict]]:
@@ -101,29 +114,26 @@ class XueqiuService:
             字典，key为组合ID，value为调仓历史列表
         """
         result = {}
-        headers = XueqiuService._get_headers()
-        
-        # 使用aiohttp的连接器，限制并发连接数
-        connector = aiohttp.TCPConnector(limit=10, ttl_dns_cache=300)
-        
-        async with aiohttp.ClientSession(headers=headers, connector=connector, trust_env=False) as session:
-            # 创建所有异步任务
-            tasks = [XueqiuService._fetch_cube_data(session, symbol) for symbol in cube_symbols]
-            
-            # 并发执行所有任务
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # 处理结果
-            for cube_symbol, history in zip(cube_symbols, results):
-                if isinstance(history, Exception):
-                    logger.error(f"获取组合 {cube_symbol} 时发生异常: {history}")
-                    result[cube_symbol] = []
-                elif history is not None:
-                    result[cube_symbol] = history
-                else:
-                    result[cube_symbol] = []
-                    logger.warning(f"获取组合 {cube_symbol} 数据失败")
-        
+        # 共享连接池按主机限制并发连接数，雪球的多次请求复用同一批 keep-alive 连接
+        session = get_http_clients().session()
+
+        # 创建所有异步任务
+        tasks = [XueqiuService._fetch_cube_data(session, symbol) for symbol in cube_symbols]
+
+        # 并发执行所有任务
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        # 处理结果
+        for cube_symbol, history in zip(cube_symbols, results):
+            if isinstance(history, Exception):
+                logger.error(f"获取组合 {cube_symbol} 时发生异常: {history}")
+                result[cube_symbol] = []
+            elif history is not None:
+                result[cube_symbol] = history
+            else:
+                result[cube_symbol] = []
+                logger.warning(f"获取组合 {cube_symbol} 数据失败")
+
         return result
     
     @staticmethod
@@ -52,27 +52,48 @@ CREATE TABLE IF NOT EXISTS monitor_data_cache (
     ema21 REAL,
     ema42 REAL,
     eps_forecast REAL CHECK (eps_forecast IS NULL OR eps_forecast > 0),
+    -- EMA 对应的最新K线日期；该股票出现更新的K线前，缓存的 EMA 一直有效
+    ema_as_of DATE,
+    -- EPS 的获取时间，当天有效
+    eps_updated_at TIMESTAMP,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE(code, timeframe)
 );
 
--- 创建K线数据表
+-- 创建K线数据表（旧版本的 TEXT 日期 / REAL 价格表用 scripts/migrate_kline_table.py 在线迁移）
 CREATE TABLE IF NOT EXISTS stock_kline_data (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL PRIMARY KEY,
     code TEXT NOT NULL,
-    date TEXT NOT NULL,
-    open REAL NOT NULL CHECK (open > 0),
-    close REAL NOT NULL CHECK (close > 0),
-    high REAL NOT NULL CHECK (high > 0),
-    low REAL NOT NULL CHECK (low > 0),
-    volume INTEGER NOT NULL CHECK (volume >= 0),
-    amount REAL NOT NULL CHECK (amount >= 0),
+    date DATE NOT NULL,
+    open DOUBLE PRECISION NOT NULL CHECK (open > 0),
+    close DOUBLE PRECISION NOT NULL CHECK (close > 0),
+    high DOUBLE PRECISION NOT NULL CHECK (high > 0),
+    low DOUBLE PRECISION NOT NULL CHECK (low > 0),
+    volume BIGINT NOT NULL CHECK (volume >= 0),
+    amount DOUBLE PRECISION NOT NULL CHECK (amount >= 0),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE(code, date),
     CONSTRAINT chk_ohlc_valid CHECK (high >= open AND high >= close AND high >= low AND low <= open AND low <= close)
 );
 
+-- 创建K线覆盖范围汇总表（每只股票一行，随 K 线写入在同一事务内维护，用于替代按股票 MAX(date) 扫描）
+-- bar_count 只累加新插入的行；写入方按股票取事务级 advisory lock 后再判断行是否已存在，并发写入同一股票不会重复计数
+CREATE TABLE IF NOT EXISTS kline_coverage (
+    code TEXT PRIMARY KEY,
+    first_date DATE NOT NULL,
+    last_date DATE NOT NULL,
+    bar_count INTEGER NOT NULL DEFAULT 0 CHECK (bar_count >= 0),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 已有 K 线但尚无汇总的股票（升级前的数据）补齐汇总，已存在的行不覆盖
+INSERT INTO kline_coverage (code, first_date, last_date, bar_count)
+SELECT code, MIN(date)::date, MAX(date)::date, COUNT(*)
+FROM stock_kline_data
+GROUP BY code
+ON CONFLICT (code) DO NOTHING;
+
 -- 创建K线更新日志表
 CREATE TABLE IF NOT EXISTS kline_update_log (
     id SERIAL PRIMARY KEY,
@@ -133,10 +154,12 @@ CREATE INDEX IF NOT EXISTS idx_monitor_cache_created ON monitor_data_cache(creat
 CREATE INDEX IF NOT EXISTS idx_monitor_cache_unique ON monitor_data_cache(code, timeframe);
 
 -- stock_kline_data表索引
-CREATE INDEX IF NOT EXISTS idx_kline_code ON stock_kline_data(code);
-CREATE INDEX IF NOT EXISTS idx_kline_code_date ON stock_kline_data(code, date);
-CREATE INDEX IF NOT EXISTS idx_kline_date ON stock_kline_data(date);
-CREATE INDEX IF NOT EXISTS idx_kline_created ON stock_kline_data(created_at);
+-- UNIQUE(code, date) 自带的 B-tree 已覆盖按代码、按代码+日期的查询，
+-- 其余索引只会拖慢 upsert，旧库上一并删除
+DROP INDEX IF EXISTS idx_kline_code;
+DROP INDEX IF EXISTS idx_kline_code_date;
+DROP INDEX IF EXISTS idx_kline_date;
+DROP INDEX IF EXISTS idx_kline_created;
 
 -- kline_update_log表索引
 CREATE INDEX IF NOT EXISTS idx_update_log_date ON kline_update_log(update_date);
@@ -421,9 +444,13 @@ CREATE TABLE IF NOT EXISTS prompt_assets (
     category VARCHAR(50) NOT NULL,
     source_path TEXT NOT NULL,
     content TEXT NOT NULL,
+    fingerprint TEXT,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- fingerprint 为源文件的 mtime_ns:size，未变化的文件不再重复读取与写入
+ALTER TABLE prompt_assets ADD COLUMN IF NOT EXISTS fingerprint TEXT;
+
 CREATE INDEX IF NOT EXISTS idx_prompt_assets_category ON prompt_assets(category);
 
 CREATE TABLE IF NOT EXISTS custom_portfolios (
@@ -450,3 +477,159 @@ CREATE INDEX IF NOT EXISTS idx_custom_portfolio_holdings_portfolio_id
 
 CREATE UNIQUE INDEX IF NOT EXISTS idx_custom_portfolio_holdings_unique
     ON custom_portfolio_holdings(portfolio_id, code);
+
+-- ============================================
+-- 全市场K线回补任务与逐只股票检查点
+-- ============================================
+CREATE TABLE IF NOT EXISTS kline_backfill_jobs (
+    id SERIAL PRIMARY KEY,
+    mode VARCHAR(20) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'running',
+    total_codes INTEGER NOT NULL DEFAULT 0,
+    ok_count INTEGER NOT NULL DEFAULT 0,
+    empty_count INTEGER NOT NULL DEFAULT 0,
+    failed_count INTEGER NOT NULL DEFAULT 0,
+    rows_written BIGINT NOT NULL DEFAULT 0,
+    codes_per_min REAL,
+    rows_per_min REAL,
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS kline_backfill_items (
+    job_id INTEGER NOT NULL REFERENCES kline_backfill_jobs(id) ON DELETE CASCADE,
+    code VARCHAR(20) NOT NULL,
+    status VARCHAR(10) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    rows_written INTEGER NOT NULL DEFAULT 0,
+    next_retry_at TIMESTAMP,
+    last_error TEXT,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (job_id, code)
+);
+
+CREATE INDEX IF NOT EXISTS idx_kline_backfill_items_status ON kline_backfill_items(job_id, status);
+
+-- ============================================
+-- EMA 增量状态（监控读取过的 code / timeframe / span 组合，随K线入库推进）
+-- ============================================
+CREATE TABLE IF NOT EXISTS ema_state (
+    code TEXT NOT NULL,
+    timeframe TEXT NOT NULL,
+    span INTEGER NOT NULL,
+    ema DOUBLE PRECISION NOT NULL,
+    ema_prev DOUBLE PRECISION,
+    last_bin INTEGER NOT NULL,
+    last_date DATE NOT NULL,
+    bar_count INTEGER NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (code, timeframe, span)
+);
+
+-- ============================================
+-- 2 日 / 3 日 / 周 / 月K聚合结果（读取过的股票，随日K入库增量更新受影响的箱体）
+-- ============================================
+-- date 为箱体日期标签：2 日 / 3 日K取箱内第一个工作日，周K取周五，月K取月末；
+-- last_date 为箱内最后一根日K的日期，与 kline_coverage.last_date 比较判断是否落后
+CREATE TABLE IF NOT EXISTS stock_kline_derived (
+    code TEXT NOT NULL,
+    timeframe TEXT NOT NULL,
+    date DATE NOT NULL,
+    open DOUBLE PRECISION NOT NULL,
+    close DOUBLE PRECISION NOT NULL,
+    high DOUBLE PRECISION NOT NULL,
+    low DOUBLE PRECISION NOT NULL,
+    volume BIGINT NOT NULL,
+    amount DOUBLE PRECISION NOT NULL,
+    last_date DATE NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (code, timeframe, date)
+);
+
+-- ============================================
+-- 监控看板快照（后台定时与K线入库后构建，/api/monitor、/api/dashboard 直接读取最新版本）
+-- ============================================
+-- payload 含 stocks（监控列表）与 dashboard（首页数据），只保留最近 MONITOR_SNAPSHOT_KEEP 个版本
+CREATE TABLE IF NOT EXISTS monitor_snapshots (
+    version BIGSERIAL PRIMARY KEY,
+    built_at TIMESTAMP NOT NULL,
+    stock_count INTEGER NOT NULL,
+    payload JSONB NOT NULL
+);
+
+-- ============================================
+-- 表结构迁移记录（repositories/schema_migrations.py 在应用启动时执行未登记的版本）
+-- ============================================
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- ============================================
+-- stock_kline_data 可选的按年分区布局
+-- ============================================
+-- 默认布局为单表。需要分区时用 scripts/migrate_kline_table.py --layout partitioned 在线迁移，
+-- 迁移脚本通过 create_stock_kline_partitioned_table 建表；分区由定时任务调用
+-- ensure_stock_kline_partitions 提前创建（单表布局下该函数直接返回 0）。
+
+-- 按年补齐分区：p_from_year 为空时从当前年份开始，一直建到当前年份 + p_years_ahead
+CREATE OR REPLACE FUNCTION ensure_stock_kline_partitions(
+    p_table TEXT DEFAULT 'stock_kline_data',
+    p_years_ahead INTEGER DEFAULT 1,
+    p_from_year INTEGER DEFAULT NULL
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_year INTEGER;
+    v_to_year INTEGER := EXTRACT(YEAR FROM CURRENT_DATE)::INTEGER + p_years_ahead;
+    v_created INTEGER := 0;
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(p_table)) THEN
+        RETURN 0;
+    END IF;
+
+    FOR v_year IN COALESCE(p_from_year, EXTRACT(YEAR FROM CURRENT_DATE)::INTEGER)..v_to_year LOOP
+        IF to_regclass(p_table || '_y' || v_year) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                p_table || '_y' || v_year, p_table, make_date(v_year, 1, 1), make_date(v_year + 1, 1, 1)
+            );
+            v_created := v_created + 1;
+        END IF;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 创建按年 RANGE 分区的K线表；分区键必须包含在主键中，因此主键为 (code, date)，id 仅作自增列保留
+CREATE OR REPLACE FUNCTION create_stock_kline_partitioned_table(
+    p_table TEXT,
+    p_from_year INTEGER DEFAULT NULL
+)
+RETURNS VOID AS $$
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I (
+            id BIGSERIAL,
+            code TEXT NOT NULL,
+            date DATE NOT NULL,
+            open DOUBLE PRECISION NOT NULL CHECK (open > 0),
+            close DOUBLE PRECISION NOT NULL CHECK (close > 0),
+            high DOUBLE PRECISION NOT NULL CHECK (high > 0),
+            low DOUBLE PRECISION NOT NULL CHECK (low > 0),
+            volume BIGINT NOT NULL CHECK (volume >= 0),
+            amount DOUBLE PRECISION NOT NULL CHECK (amount >= 0),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (code, date),
+            CONSTRAINT chk_ohlc_valid CHECK (high >= open AND high >= close AND high >= low AND low <= open AND low <= close)
+        ) PARTITION BY RANGE (date)',
+        p_table
+    );
+    -- 兜底分区只接收超出年度分区范围的数据，正常情况下应为空
+    EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF %I DEFAULT', p_table || '_default', p_table);
+    PERFORM ensure_stock_kline_partitions(p_table, 1, p_from_year);
+END;
+$$ LANGUAGE plpgsql;
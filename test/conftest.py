@@ -40,10 +40,27 @@ def client(mock_db_conn):
 
 @pytest.fixture(autouse=True)
 def reset_monitor_cache():
-    from api import monitor_routes
+    from services.monitor_cache_service import MonitorCacheService
+    from services.monitor_snapshot_service import MonitorSnapshotService
 
-    monitor_routes._monitor_cache['data'] = None
-    monitor_routes._monitor_cache['timestamp'] = None
+    MonitorSnapshotService.reset()
+    MonitorCacheService.reset()
     yield
-    monitor_routes._monitor_cache['data'] = None
-    monitor_routes._monitor_cache['timestamp'] = None
+    MonitorSnapshotService.reset()
+    MonitorCacheService.reset()
+
+
+@pytest.fixture(autouse=True)
+def snapshot_rebuild():
+    # 变更类接口成功后会在后台重建监控快照，路由测试只断言是否发起了重建
+    with patch('services.monitor_snapshot_service.MonitorSnapshotService.request_rebuild') as mock_rebuild:
+        yield mock_rebuild
+
+
+@pytest.fixture(autouse=True)
+def reset_kline_store():
+    from utils.kline_store import get_kline_store
+
+    get_kline_store().invalidate()
+    yield
+    get_kline_store().invalidate()
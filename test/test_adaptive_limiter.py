@@ -0,0 +1,43 @@
+import asyncio
+import threading
+
+from utils.adaptive_limiter import AdaptiveLimiter
+
+
+class TestAdaptiveLimiter:
+    async def test_release_wakes_waiter_on_another_loop(self):
+        limiter = AdaptiveLimiter('test', initial=1, max_limit=1)
+        await limiter.acquire()
+
+        acquired = threading.Event()
+
+        async def wait_for_slot():
+            async with limiter.slot():
+                acquired.set()
+
+        # 后台线程用 asyncio.run 起自己的事件循环，与调度任务中的用法一致
+        worker = threading.Thread(target=lambda: asyncio.run(wait_for_slot()))
+        worker.start()
+        while limiter.stats()['waiting'] == 0:
+            await asyncio.sleep(0.01)
+
+        limiter.release(latency=0.1)
+        worker.join(timeout=5)
+
+        assert acquired.is_set()
+        assert limiter.stats()['in_flight'] == 0
+        assert limiter.stats()['waiting'] == 0
+
+    async def test_cancelled_waiter_returns_handed_over_slot(self):
+        limiter = AdaptiveLimiter('test', initial=1, max_limit=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+
+        # 槽位交给等待者之后、等待者恢复之前被取消，槽位必须归还
+        limiter.release()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+        assert limiter.stats()['in_flight'] == 0
+        await asyncio.wait_for(limiter.acquire(), timeout=1)
@@ -32,6 +32,14 @@ class TestAdminRoutes:
         assert response.status_code == 200
         assert response.json()['status'] == 'success'
 
+    def test_delete_stock_rebuilds_snapshot(self, client, snapshot_rebuild):
+        with patch('repositories.portfolio_repository.StockRepository.delete', new_callable=AsyncMock) as mock_delete:
+            mock_delete.return_value = True
+            response = client.delete('/api/admin/stocks/sh600000')
+
+        assert response.json()['status'] == 'success'
+        snapshot_rebuild.assert_called_once()
+
     def test_create_stock_failure(self, client):
         stock_data = {'code': 'sh600000', 'name': 'PF Bank', 'cost_price': 10.5, 'shares': 1000}
 
@@ -149,3 +157,17 @@ class TestAdminRoutes:
 
         assert response.status_code == 200
         assert response.json()['status'] == 'error'
+
+    def test_get_runtime_status(self, client):
+        response = client.get('/api/admin/runtime-status')
+
+        assert response.status_code == 200
+        executor = response.json()['data']['executors'][0]
+        assert executor['name'] == 'market-data'
+        assert executor['in_flight'] == 0
+        assert executor['queued'] == 0
+        assert response.json()['data']['executors'][1]['name'] == 'compute'
+        assert isinstance(response.json()['data']['limiters'], list)
+        kline_store = response.json()['data']['kline_store']
+        assert kline_store['entries'] == 0
+        assert 'hit_rate' in kline_store
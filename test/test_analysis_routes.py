@@ -80,6 +80,49 @@ class TestAnalysisRoutes:
         assert response.status_code == 500
         assert response.json()['detail'] == 'analysis failed'
 
+    def test_stream_analysis_report_success(self, client):
+        payload = {'code': 'sh600000', 'count': 80, 'period': 'daily'}
+        prepared = {'period': 'daily'}
+
+        async def fake_stream(_prepared):
+            yield 'meta', {'code': 'sh600000'}
+            yield 'delta', {'text': '## 结论'}
+            yield 'done', {'id': 5}
+
+        with patch(
+            'services.price_action_service.PriceActionService.prepare_analysis',
+            new_callable=AsyncMock,
+        ) as mock_prepare, patch(
+            'services.price_action_service.PriceActionService.stream_analysis',
+            side_effect=fake_stream,
+        ):
+            mock_prepare.return_value = prepared
+
+            response = client.post('/api/analysis/stream', json=payload)
+
+        assert response.status_code == 200
+        assert response.headers['content-type'].startswith('text/event-stream')
+        assert response.text == (
+            'event: meta\ndata: {"code": "sh600000"}\n\n'
+            'event: delta\ndata: {"text": "## 结论"}\n\n'
+            'event: done\ndata: {"id": 5}\n\n'
+        )
+        mock_prepare.assert_called_once_with(code='sh600000', count=80, period='daily')
+
+    def test_stream_analysis_report_value_error(self, client):
+        payload = {'code': 'sh600000', 'count': 80, 'period': 'daily'}
+
+        with patch(
+            'services.price_action_service.PriceActionService.prepare_analysis',
+            new_callable=AsyncMock,
+        ) as mock_prepare:
+            mock_prepare.side_effect = ValueError('bad input')
+
+            response = client.post('/api/analysis/stream', json=payload)
+
+        assert response.status_code == 400
+        assert response.json()['detail'] == 'bad input'
+
     def test_delete_analysis_report_success(self, client):
         with patch('services.price_action_service.PriceActionService.get_report', new_callable=AsyncMock) as mock_get, \
              patch('services.price_action_service.PriceActionService.delete_report', new_callable=AsyncMock) as mock_delete:
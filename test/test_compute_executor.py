@@ -0,0 +1,38 @@
+import asyncio
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pytest
+
+from utils.compute_executor import ComputeExecutor
+
+
+def _crash(delay):
+    time.sleep(delay)
+    os._exit(1)
+
+
+def _column_sum(arrays):
+    return float(arrays['values'].sum())
+
+
+class TestComputeExecutor:
+    async def test_broken_pool_restarts_once(self):
+        executor = ComputeExecutor('test', 2)
+        try:
+            # 两个调用同时落在同一个崩溃的进程池上，只能重建一次
+            results = await asyncio.gather(
+                executor.run(_crash, 0.2), executor.run(_crash, 0.2), return_exceptions=True
+            )
+            assert all(isinstance(result, BrokenProcessPool) for result in results)
+            assert executor.stats()['restarts'] == 1
+
+            total = await executor.run_arrays(_column_sum, {'values': np.arange(4, dtype=np.float64)})
+            assert total == pytest.approx(6.0)
+            stats = executor.stats()
+            assert stats['shared_bytes_total'] >= 32
+            assert stats['shared_bytes_in_flight'] == 0
+        finally:
+            executor.shutdown()
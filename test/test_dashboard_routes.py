@@ -60,6 +60,23 @@ class TestDashboardRoutes:
             mock_monitor.assert_called_once()
             mock_dashboard.assert_called_once_with(monitor_stocks)
 
+    def test_get_dashboard_shares_monitor_cache(self, client):
+        monitor_stocks = [{'code': 'sh600519', 'score': 85}]
+
+        with patch('services.monitor_service.MonitorService.get_enriched_monitor_data', new_callable=AsyncMock) as mock_monitor, \
+             patch('services.dashboard_service.DashboardService.get_dashboard_data', new_callable=AsyncMock) as mock_dashboard:
+            mock_monitor.return_value = monitor_stocks
+            mock_dashboard.return_value = {'focus_stocks': monitor_stocks}
+
+            client.get('/api/monitor')
+            client.get('/api/dashboard')
+            response = client.get('/api/dashboard')
+
+            assert response.status_code == 200
+            assert response.json()['data']['focus_stocks'][0]['code'] == 'sh600519'
+            mock_monitor.assert_called_once()
+            mock_dashboard.assert_called_once_with(monitor_stocks)
+
     def test_get_dashboard_failure(self, client):
         with patch('services.monitor_service.MonitorService.get_enriched_monitor_data', new_callable=AsyncMock) as mock_monitor:
             mock_monitor.side_effect = RuntimeError('dashboard failed')
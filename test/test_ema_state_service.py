@@ -0,0 +1,71 @@
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from services.ema_state_service import MONITOR_EMA_SPANS, EmaStateService
+from utils.compute_executor import ComputeExecutor
+
+
+def _history(count=320, seed=3):
+    """工作日日K，中间去掉几段停牌 / 节假日，让 2 日 / 3 日箱体出现不完整的情况"""
+    gaps = [40, 41, 42, 97, 150, 151, 152, 153, 154, 260, 261, 262]
+    days = np.delete(np.busday_offset('2023-01-02', np.arange(count + len(gaps)), roll='forward'), gaps)
+    rng = np.random.default_rng(seed)
+    return {'dates': days, 'closes': 20 + np.cumsum(rng.normal(0, 0.3, len(days)))}
+
+
+@pytest.fixture(autouse=True)
+def inline_compute():
+    with patch('services.ema_state_service.get_compute_executor', return_value=ComputeExecutor('inline', 0)):
+        yield
+
+
+class TestEmaStateService:
+    @pytest.mark.parametrize('timeframe', ['1d', '2d', '3d'])
+    @pytest.mark.parametrize('split', [200, 201, 202])
+    async def test_advance_bar_by_bar_matches_recompute(self, timeframe, split):
+        history = _history()
+        spans = MONITOR_EMA_SPANS[timeframe]
+        prefix = {key: values[:split] for key, values in history.items()}
+
+        states = (await EmaStateService.compute_states({'sh600000': prefix}, timeframe, spans))['sh600000']
+        for day, close in zip(history['dates'][split:], history['closes'][split:]):
+            states = {
+                span: EmaStateService.advance_state(state, span, day[None], close[None], timeframe)
+                for span, state in states.items()
+            }
+        expected = (await EmaStateService.compute_states({'sh600000': history}, timeframe, spans))['sh600000']
+
+        for span in spans:
+            assert states[span]['last_bin'] == expected[span]['last_bin']
+            assert states[span]['bar_count'] == expected[span]['bar_count']
+            assert states[span]['last_date'] == expected[span]['last_date']
+            assert states[span]['ema'] == pytest.approx(expected[span]['ema'], rel=1e-9)
+            assert states[span]['ema_prev'] == pytest.approx(expected[span]['ema_prev'], rel=1e-9)
+
+    @pytest.mark.parametrize('timeframe', ['1d', '2d', '3d'])
+    async def test_advance_in_one_chunk_matches_recompute(self, timeframe):
+        history = _history()
+        spans = MONITOR_EMA_SPANS[timeframe]
+        prefix = {key: values[:251] for key, values in history.items()}
+
+        states = (await EmaStateService.compute_states({'sh600000': prefix}, timeframe, spans))['sh600000']
+        advanced = {
+            span: EmaStateService.advance_state(state, span, history['dates'][251:], history['closes'][251:], timeframe)
+            for span, state in states.items()
+        }
+        expected = (await EmaStateService.compute_states({'sh600000': history}, timeframe, spans))['sh600000']
+
+        for span in spans:
+            assert advanced[span]['bar_count'] == expected[span]['bar_count']
+            assert advanced[span]['ema'] == pytest.approx(expected[span]['ema'], rel=1e-9)
+
+    async def test_compute_states_skips_codes_without_bars(self):
+        empty = {'dates': np.array([], dtype='datetime64[D]'), 'closes': np.array([])}
+
+        states = await EmaStateService.compute_states(
+            {'sh600000': _history(), 'sz000001': empty}, '1d', MONITOR_EMA_SPANS['1d']
+        )
+
+        assert list(states) == ['sh600000']
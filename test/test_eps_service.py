@@ -0,0 +1,27 @@
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+from services.eps_service import EpsService
+from services.monitor_cache_service import MonitorCacheService
+
+
+class TestEpsService:
+    async def test_refresh_rebuilds_snapshot_after_write(self, snapshot_rebuild):
+        MonitorCacheService.put_eps('sh600900', 1.2, datetime.now())
+        with patch.object(EpsService, '_fetch', new=AsyncMock(side_effect=[1.5, None])), \
+             patch('services.eps_service.EpsCacheRepository.upsert_batch', new_callable=AsyncMock) as mock_upsert:
+            stats = await EpsService.refresh(['sh600900', 'sz000001'])
+
+        assert stats == {'fetched': 1, 'negative': 1, 'failed': 0}
+        mock_upsert.assert_awaited_once_with({'sh600900': 1.5, 'sz000001': None})
+        snapshot_rebuild.assert_called_once()
+        # 监控缓存里的旧 EPS 被丢弃，下一次刷新从 eps_cache 重新读取
+        assert MonitorCacheService.get_eps('sh600900') == (False, None)
+
+    async def test_refresh_without_writes_keeps_snapshot(self, snapshot_rebuild):
+        with patch.object(EpsService, '_fetch', new=AsyncMock(side_effect=RuntimeError('rate limited'))), \
+             patch('services.eps_service.EpsCacheRepository.upsert_batch', new_callable=AsyncMock):
+            stats = await EpsService.refresh(['sh600900'])
+
+        assert stats == {'fetched': 0, 'negative': 0, 'failed': 1}
+        snapshot_rebuild.assert_not_called()
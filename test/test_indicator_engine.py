@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.indicator_engine import multi_span_ema, right_align
+
+SPANS = (5, 20, 144, 188)
+
+
+def _series(lengths, seed=7):
+    rng = np.random.default_rng(seed)
+    return [10 + np.cumsum(rng.normal(0, 0.2, length)) for length in lengths]
+
+
+class TestRightAlign:
+    def test_pads_on_the_left(self):
+        matrix, lengths = right_align([np.array([1.0, 2.0]), np.array([3.0]), np.array([])])
+
+        assert lengths.tolist() == [2, 1, 0]
+        assert matrix.tolist() == [[1.0, 2.0], [0.0, 3.0], [0.0, 0.0]]
+
+    def test_empty_input(self):
+        matrix, lengths = right_align([])
+
+        assert matrix.shape == (0, 0)
+        assert len(lengths) == 0
+
+
+class TestMultiSpanEma:
+    @pytest.mark.parametrize('lengths', [(1, 2, 3), (300, 5, 188, 1, 40), (600,)])
+    def test_matches_pandas_ewm_for_ragged_rows(self, lengths):
+        series = _series(lengths)
+        matrix, row_lengths = right_align(series)
+
+        out = multi_span_ema(matrix, row_lengths, SPANS, tail=2)
+
+        assert out.shape == (2, len(series), len(SPANS))
+        for row, closes in enumerate(series):
+            for col, span in enumerate(SPANS):
+                expected = pd.Series(closes).ewm(span=span, adjust=False).mean().to_numpy()
+                assert out[0, row, col] == pytest.approx(expected[-1], rel=1e-9)
+                if len(closes) > 1:
+                    assert out[1, row, col] == pytest.approx(expected[-2], rel=1e-9)
+                else:
+                    assert np.isnan(out[1, row, col])
+
+    def test_tail_one_matches_last_value_only(self):
+        series = _series((50, 7))
+        matrix, lengths = right_align(series)
+
+        out = multi_span_ema(matrix, lengths, SPANS)
+
+        assert out.shape == (1, 2, len(SPANS))
+        np.testing.assert_allclose(out[0], multi_span_ema(matrix, lengths, SPANS, tail=2)[0])
+
+    def test_empty_rows_are_nan(self):
+        matrix, lengths = right_align([np.array([]), np.array([4.0, 5.0])])
+
+        out = multi_span_ema(matrix, lengths, SPANS, tail=2)
+
+        assert np.isnan(out[:, 0]).all()
+        assert out[0, 1, 0] == pytest.approx(pd.Series([4.0, 5.0]).ewm(span=5, adjust=False).mean().iloc[-1])
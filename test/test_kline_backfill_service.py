@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from services.kline_backfill_service import KlineBackfillService
+
+
+class FakeBackfillStore:
+    """按 KlineBackfillRepository 的语义在内存中保存检查点，时间由 asyncio.sleep 的替身推进"""
+
+    def __init__(self, items=None, job=None):
+        self.items = {
+            code: {'status': status, 'attempts': attempts, 'next_retry_at': None, 'rows': 0}
+            for code, (status, attempts) in (items or {}).items()
+        }
+        self.job = job
+        self.final_status = None
+        self.offset = timedelta()
+
+    def now(self):
+        return datetime.now() + self.offset
+
+    async def sleep(self, seconds):
+        self.offset += timedelta(seconds=seconds)
+
+    async def get_running_job(self):
+        return self.job
+
+    async def create_job(self, mode, codes):
+        self.items = {code: {'status': 'pending', 'attempts': 0, 'next_retry_at': None, 'rows': 0} for code in codes}
+        return 1
+
+    async def claim_items(self, _job_id, limit, max_attempts):
+        ready = [
+            (item['attempts'], code) for code, item in self.items.items()
+            if item['status'] == 'pending'
+            or (item['status'] == 'failed' and item['attempts'] < max_attempts and item['next_retry_at'] <= self.now())
+        ]
+        return [code for _, code in sorted(ready)[:limit]]
+
+    async def get_next_retry_at(self, _job_id, max_attempts):
+        retry_at = [
+            item['next_retry_at'] for item in self.items.values()
+            if item['status'] == 'failed' and item['attempts'] < max_attempts
+        ]
+        return min(retry_at) - self.offset if retry_at else None
+
+    async def mark_items(self, _job_id, outcomes, retry_base_seconds):
+        for code, (status, rows, _error) in outcomes.items():
+            item = self.items[code]
+            item['next_retry_at'] = (
+                self.now() + timedelta(seconds=retry_base_seconds * 2 ** item['attempts']) if status == 'failed' else None
+            )
+            item['status'] = status
+            item['rows'] += rows
+            item['attempts'] += 1
+
+    async def refresh_job_progress(self, job_id, codes_per_min=None, rows_per_min=None, status=None):
+        if status is not None:
+            self.final_status = status
+        statuses = [item['status'] for item in self.items.values()]
+        return {
+            'id': job_id,
+            'total_codes': len(self.items),
+            'ok_count': statuses.count('ok'),
+            'empty_count': statuses.count('empty'),
+            'failed_count': statuses.count('failed'),
+        }
+
+
+class FakePipeline:
+    """替代 _run_fetch_save_pipeline：按脚本给出每只股票每次尝试的结果"""
+
+    def __init__(self, script):
+        self.script = {code: list(results) for code, results in script.items()}
+        self.calls = []
+
+    async def run(self, codes, _max_concurrent, _force, _latest_dates, outcomes):
+        self.calls.append(list(codes))
+        for code in codes:
+            status = self.script[code].pop(0)
+            outcomes[code] = (status, 5 if status == 'ok' else 0, '抓取失败' if status == 'failed' else None)
+
+
+@pytest.fixture
+def backfill_env(monkeypatch):
+    monkeypatch.setenv('KLINE_BACKFILL_BATCH', '10')
+    monkeypatch.setenv('KLINE_BACKFILL_MAX_ATTEMPTS', '3')
+    monkeypatch.setenv('KLINE_BACKFILL_RETRY_SECONDS', '10')
+
+
+def _patched(store, pipeline, pending_codes=()):
+    repo = 'services.kline_backfill_service.KlineBackfillRepository'
+    mocks = {
+        name: patch(f'{repo}.{name}', new=AsyncMock(side_effect=getattr(store, name)))
+        for name in ('get_running_job', 'create_job', 'claim_items', 'get_next_retry_at',
+                     'mark_items', 'refresh_job_progress')
+    }
+    mocks['pipeline'] = patch('services.kline_service.KlineService._run_fetch_save_pipeline',
+                              new=AsyncMock(side_effect=pipeline.run))
+    mocks['sleep'] = patch('services.kline_backfill_service.asyncio.sleep', new=AsyncMock(side_effect=store.sleep))
+    mocks['latest'] = patch('services.kline_backfill_service.KlineRepository.get_latest_dates_batch',
+                            new=AsyncMock(return_value={}))
+    mocks['record'] = patch('services.kline_backfill_service.KlineRepository.record_update', new=AsyncMock())
+    mocks['pending'] = patch(
+        'services.kline_backfill_service.StockListRepository.get_pending_update',
+        new=AsyncMock(return_value=[SimpleNamespace(code=code) for code in pending_codes]),
+    )
+    mocks['last_update'] = patch('services.kline_backfill_service.StockListRepository.update_last_update',
+                                 new=AsyncMock())
+    return mocks
+
+
+async def _run(mocks):
+    started = {name: patcher.start() for name, patcher in mocks.items()}
+    try:
+        result = await KlineBackfillService.run()
+    finally:
+        for patcher in mocks.values():
+            patcher.stop()
+    return result, started
+
+
+class TestKlineBackfillService:
+    async def test_resumed_job_only_processes_unclaimed_items(self, backfill_env):
+        store = FakeBackfillStore(
+            items={'600001': ('ok', 1), '000002': ('empty', 1), '300003': ('pending', 0), '688004': ('pending', 0)},
+            job={'id': 7, 'mode': 'incremental'},
+        )
+        pipeline = FakePipeline({'sz300003': ['ok'], 'sh688004': ['empty']})
+
+        result, mocks = await _run(_patched(store, pipeline))
+
+        assert pipeline.calls == [['sz300003', 'sh688004']]
+        mocks['create_job'].assert_not_awaited()
+        mocks['last_update'].assert_awaited_once_with(['300003', '688004'])
+        assert result['job_id'] == 7
+        assert result['status'] == 'success'
+        assert (result['ok'], result['empty'], result['failed']) == (2, 2, 0)
+
+    async def test_failed_code_retries_with_backoff_then_stops(self, backfill_env):
+        store = FakeBackfillStore()
+        pipeline = FakePipeline({
+            'sh600001': ['ok'],
+            'sz000002': ['failed', 'failed', 'failed', 'ok'],
+            'sz300003': ['failed', 'empty'],
+        })
+
+        result, mocks = await _run(_patched(store, pipeline, pending_codes=['600001', '000002', '300003']))
+
+        # 000002 在第 3 次（KLINE_BACKFILL_MAX_ATTEMPTS）失败后不再领取，第 4 个脚本结果不会被用到
+        assert pipeline.calls == [['sz000002', 'sz300003', 'sh600001'], ['sz000002', 'sz300003'], ['sz000002']]
+        assert store.items['000002']['attempts'] == 3
+        # 退避：第一次失败后约 10 秒，第二次失败后约 20 秒（另加 1 秒余量）
+        waits = [call.args[0] for call in mocks['sleep'].await_args_list]
+        assert waits == [pytest.approx(11, abs=1), pytest.approx(21, abs=1)]
+        # 只有成功和无新数据的股票刷新 last_update
+        assert [call.args[0] for call in mocks['last_update'].await_args_list] == [['600001'], ['300003'], []]
+        assert store.final_status == 'partial'
+        assert result['status'] == 'partial'
+        assert (result['ok'], result['empty'], result['failed']) == (1, 1, 1)
+        mocks['record'].assert_awaited_once_with(1, 3, 'partial')
+
+    async def test_no_pending_codes_skips_job(self, backfill_env):
+        store = FakeBackfillStore()
+        pipeline = FakePipeline({})
+
+        result, mocks = await _run(_patched(store, pipeline))
+
+        assert result is None
+        mocks['create_job'].assert_not_awaited()
+        mocks['pipeline'].assert_not_awaited()
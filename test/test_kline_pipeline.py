@@ -0,0 +1,137 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pandas as pd
+import pytest
+
+from services.kline_service import KlineService
+
+
+def _bars(rows):
+    return pd.DataFrame({'收盘': [10.0] * rows})
+
+
+@pytest.fixture
+def written_hooks():
+    with patch('services.ema_state_service.EmaStateService.apply_written_bars', new_callable=AsyncMock) as ema, \
+         patch('services.derived_kline_service.DerivedKlineService.apply_written_bars', new_callable=AsyncMock):
+        yield ema
+
+
+class FakeSaver:
+    """替代 KlineRepository.save_all_batch：记录每次刷新写入的股票，可指定某次刷新抛出异常"""
+
+    def __init__(self, events=None, fail_on=()):
+        self.batches = []
+        self.events = events if events is not None else []
+        self._fail_on = set(fail_on)
+
+    async def __call__(self, batch):
+        self.batches.append(list(batch))
+        self.events.append(('save', list(batch)))
+        if len(self.batches) in self._fail_on:
+            raise RuntimeError('database is down')
+        return len(batch), len(batch), sum(len(df) for df in batch.values())
+
+
+async def _run(codes, fetch, saver, outcomes=None):
+    with patch.object(KlineService, 'update_single_kline_async', side_effect=fetch), \
+         patch('services.kline_service.KlineRepository.save_all_batch', new=saver):
+        return await KlineService._run_fetch_save_pipeline(codes, 10, False, {}, outcomes)
+
+
+class TestFetchSavePipeline:
+    async def test_flushes_by_row_count_and_drains_on_done(self, monkeypatch, written_hooks, snapshot_rebuild):
+        monkeypatch.setenv('KLINE_FLUSH_ROWS', '5')
+        monkeypatch.setenv('KLINE_FLUSH_INTERVAL', '60')
+        saver = FakeSaver()
+
+        async def fetch(code, _force, _latest):
+            return True, code, _bars(3)
+
+        outcomes = {}
+        stats = await _run(['a', 'b', 'c', 'd', 'e'], fetch, saver, outcomes)
+
+        # 每两只（6 行）达到 5 行阈值刷新一次，剩下的 e 在收到 done 后落库
+        assert saver.batches == [['a', 'b'], ['c', 'd'], ['e']]
+        assert stats == {'success': 5, 'no_data': 0, 'error': 0, 'saved': 5, 'records': 15, 'flushes': 3}
+        assert outcomes == {code: ('ok', 3, None) for code in 'abcde'}
+        assert written_hooks.await_count == 3
+        snapshot_rebuild.assert_called_once()
+
+    async def test_flushes_by_interval(self, monkeypatch, written_hooks):
+        monkeypatch.setenv('KLINE_FLUSH_ROWS', '100000')
+        monkeypatch.setenv('KLINE_FLUSH_INTERVAL', '0.05')
+        events = []
+        saver = FakeSaver(events)
+
+        async def fetch(code, _force, _latest):
+            if code == 'b':
+                await asyncio.sleep(0.3)
+                events.append(('fetched', code))
+            return True, code, _bars(2)
+
+        stats = await _run(['a', 'b'], fetch, saver)
+
+        # a 等待超过 KLINE_FLUSH_INTERVAL 后单独落库，不等 b 抓取完成
+        assert events == [('save', ['a']), ('fetched', 'b'), ('save', ['b'])]
+        assert stats['flushes'] == 2
+        assert stats['records'] == 4
+
+    async def test_outcomes_for_failed_and_empty_codes(self, monkeypatch, written_hooks):
+        monkeypatch.setenv('KLINE_FLUSH_ROWS', '5')
+        monkeypatch.setenv('KLINE_FLUSH_INTERVAL', '60')
+        # 第一次刷新（a、b）写库异常，第二次（c）正常
+        saver = FakeSaver(fail_on={1})
+
+        async def fetch(code, _force, _latest):
+            if code == 'boom':
+                raise ConnectionError('upstream reset')
+            if code == 'bad':
+                return False, code, None
+            if code == 'flat':
+                return True, code, _bars(0)
+            return True, code, _bars(3)
+
+        outcomes = {}
+        stats = await _run(['a', 'boom', 'b', 'bad', 'flat', 'c'], fetch, saver, outcomes)
+
+        assert saver.batches == [['a', 'b'], ['c']]
+        assert outcomes == {
+            'a': ('failed', 0, '保存失败'),
+            'b': ('failed', 0, '保存失败'),
+            'boom': ('failed', 0, '抓取失败'),
+            'bad': ('failed', 0, '抓取失败'),
+            'flat': ('empty', 0, None),
+            'c': ('ok', 3, None),
+        }
+        assert stats == {'success': 3, 'no_data': 1, 'error': 2, 'saved': 1, 'records': 3, 'flushes': 2}
+        # 写库失败的批次不推进 EMA 状态
+        assert written_hooks.await_count == 1
+
+    async def test_queue_bounds_fetch_ahead(self, monkeypatch, written_hooks):
+        monkeypatch.setenv('KLINE_FLUSH_ROWS', '1')
+        monkeypatch.setenv('KLINE_FLUSH_INTERVAL', '60')
+        release = asyncio.Event()
+        fetched = []
+
+        async def slow_saver(batch):
+            await release.wait()
+            return len(batch), len(batch), sum(len(df) for df in batch.values())
+
+        async def fetch(code, _force, _latest):
+            fetched.append(code)
+            return True, code, _bars(1)
+
+        codes = [f'c{i}' for i in range(100)]
+        with patch.object(KlineService, 'update_single_kline_async', side_effect=fetch), \
+             patch('services.kline_service.KlineRepository.save_all_batch', side_effect=slow_saver):
+            task = asyncio.create_task(KlineService._run_fetch_save_pipeline(codes, 2, False, {}))
+            await asyncio.sleep(0.05)
+            # 写入阻塞时，抓取最多领先：写入中的 1 只 + 队列 4 只 + 每个抓取协程手里的 1 只
+            assert len(fetched) <= 1 + 4 + 10
+            release.set()
+            stats = await task
+
+        assert stats['saved'] == 100
+        assert len(fetched) == 100
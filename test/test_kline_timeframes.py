@@ -0,0 +1,112 @@
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from repositories.kline_repository import KlineRepository
+from services.derived_kline_service import DerivedKlineService
+from services.kline_timeframes import DERIVED_TIMEFRAMES, aggregate_bars, bin_ids, last_close_per_bin
+
+# 2024 年的几段 A 股休市日（春节、清明、劳动节、国庆）
+HOLIDAYS = np.array([
+    '2024-02-12', '2024-02-13', '2024-02-14', '2024-02-15', '2024-02-16',
+    '2024-04-04', '2024-04-05', '2024-05-01', '2024-05-02', '2024-05-03',
+    '2024-10-01', '2024-10-02', '2024-10-03', '2024-10-04', '2024-10-07',
+], dtype='datetime64[D]')
+
+
+def _daily(start='2023-11-01', end='2024-12-31', seed=11):
+    days = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+    days = days[np.is_busday(days) & ~np.isin(days, HOLIDAYS)]
+    rng = np.random.default_rng(seed)
+    closes = 30 + np.cumsum(rng.normal(0, 0.4, len(days)))
+    opens = closes + rng.normal(0, 0.2, len(days))
+    return {
+        'dates': days,
+        'opens': opens,
+        'closes': closes,
+        'highs': np.maximum(opens, closes) + 0.5,
+        'lows': np.minimum(opens, closes) - 0.5,
+        # 写入路径按现有约定把成交量写 0，与入库后读出的数据保持一致
+        'volumes': np.zeros(len(days), dtype=np.int64),
+        'amounts': rng.uniform(1e6, 2e6, len(days)),
+    }
+
+
+def _slice(arrays, start, stop=None):
+    return {key: values[start:stop] for key, values in arrays.items()}
+
+
+class TestBinIds:
+    @pytest.mark.parametrize('timeframe', ['2d', '3d', 'weekly', 'monthly'])
+    def test_stable_when_read_window_shifts(self, timeframe):
+        dates = _daily()['dates']
+        full = bin_ids(dates, timeframe)
+
+        for offset in (1, 2, 3, 57, 58):
+            np.testing.assert_array_equal(bin_ids(dates[offset:], timeframe), full[offset:])
+
+    @pytest.mark.parametrize('timeframe', ['2d', '3d'])
+    def test_holiday_gap_does_not_shift_later_bins(self, timeframe):
+        days = np.arange(np.datetime64('2024-01-02'), np.datetime64('2024-03-29') + 1)
+        trading = days[np.is_busday(days)]
+        with_holidays = trading[~np.isin(trading, HOLIDAYS)]
+
+        # 同一天不论前面是否有休市日，都落在同一个箱体里
+        ids = dict(zip(trading.tolist(), bin_ids(trading, timeframe).tolist()))
+        assert bin_ids(with_holidays, timeframe).tolist() == [ids[day] for day in with_holidays.tolist()]
+
+    def test_weekly_and_monthly_labels_match_resample(self):
+        daily = _daily()
+        frame = pd.Series(daily['closes'], index=pd.to_datetime(daily['dates']))
+
+        for timeframe, rule in (('weekly', 'W-FRI'), ('monthly', 'ME')):
+            bars = aggregate_bars(daily, timeframe)
+            expected = frame.resample(rule).last().dropna()
+            np.testing.assert_array_equal(bars['dates'], expected.index.to_numpy(dtype='datetime64[D]'))
+            np.testing.assert_allclose(bars['closes'], expected.to_numpy())
+
+    def test_last_close_per_bin_matches_aggregate(self):
+        daily = _daily()
+        for timeframe in ('2d', '3d'):
+            ids, closes = last_close_per_bin(daily['dates'], daily['closes'], timeframe)
+            np.testing.assert_allclose(closes, aggregate_bars(daily, timeframe)['closes'])
+            assert len(np.unique(ids)) == len(ids)
+
+
+class TestIncrementalAggregation:
+    @pytest.mark.parametrize('split', [60, 61, 62, 140, 200])
+    async def test_apply_written_bars_matches_full_rebuild(self, split):
+        daily = _daily()
+        table = {}
+
+        async def save_bars(bars):
+            # 模拟 stock_kline_derived：按 (code, timeframe, date) 整行覆盖
+            for (code, timeframe), arrays in bars.items():
+                for row in range(len(arrays['dates'])):
+                    table[(code, timeframe, arrays['dates'][row].item())] = {
+                        key: values[row].item() for key, values in arrays.items()
+                    }
+
+        async def get_arrays_since(starts):
+            return {
+                code: _slice(daily, np.searchsorted(daily['dates'], np.datetime64(start, 'D')))
+                for code, start in starts.items()
+            }
+
+        await save_bars(DerivedKlineService._aggregate_all({'sh600000': _slice(daily, 0, split)}))
+        written = {'sh600000': KlineRepository._frame_from_arrays(_slice(daily, split))}
+        with patch('services.derived_kline_service.DerivedKlineRepository.get_materialized_codes',
+                   new=AsyncMock(return_value={'sh600000'})), \
+             patch('services.derived_kline_service.DerivedKlineRepository.save_bars', new=save_bars), \
+             patch('services.derived_kline_service.KlineRepository.get_arrays_since', new=get_arrays_since):
+            await DerivedKlineService.apply_written_bars(written)
+
+        for timeframe in DERIVED_TIMEFRAMES:
+            expected = aggregate_bars(daily, timeframe)
+            rows = [table[key] for key in sorted(key for key in table if key[1] == timeframe)]
+            assert [row['dates'] for row in rows] == expected['dates'].tolist()
+            for key in ('opens', 'closes', 'highs', 'lows', 'amounts'):
+                np.testing.assert_allclose([row[key] for row in rows], expected[key])
+            assert [row['last_dates'] for row in rows] == expected['last_dates'].tolist()
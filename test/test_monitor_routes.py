@@ -1,7 +1,16 @@
 from unittest.mock import AsyncMock, patch
 
+import pytest
+
 
 class TestMonitorRoutes:
+    @pytest.fixture(autouse=True)
+    def stub_dashboard(self):
+        # /api/monitor 读取的快照同时包含首页数据，这里不关心首页部分
+        with patch('services.dashboard_service.DashboardService.get_dashboard_data', new_callable=AsyncMock) as mock_dashboard:
+            mock_dashboard.return_value = {}
+            yield mock_dashboard
+
     def test_get_monitor_success(self, client):
         mock_stocks = [{'code': 'sh600000', 'name': 'PF Bank', 'score': 82, 'risk_level': 'low'}]
 
@@ -12,7 +21,7 @@ class TestMonitorRoutes:
         assert response.status_code == 200
         assert response.json()['stocks'][0]['score'] == 82
 
-    def test_get_monitor_uses_cache(self, client):
+    def test_get_monitor_serves_published_snapshot(self, client):
         with patch('services.monitor_service.MonitorService.get_enriched_monitor_data', new_callable=AsyncMock) as mock_get_data:
             mock_get_data.return_value = [{'code': 'sh600000'}]
             client.get('/api/monitor')
@@ -20,6 +29,24 @@ class TestMonitorRoutes:
 
         mock_get_data.assert_called_once()
 
+    def test_get_monitor_returns_rebuilt_snapshot(self, client):
+        from services.monitor_snapshot_service import MonitorSnapshotService
+
+        with patch('services.monitor_service.MonitorService.get_enriched_monitor_data', new_callable=AsyncMock) as mock_get_data:
+            mock_get_data.return_value = [{'code': 'sh600000', 'score': 1}]
+            first = client.get('/api/monitor')
+
+            mock_get_data.return_value = [{'code': 'sh600000', 'score': 2}]
+            unchanged = client.get('/api/monitor')
+            client.portal.call(MonitorSnapshotService.rebuild)
+            rebuilt = client.get('/api/monitor')
+
+        assert first.json()['stocks'][0]['score'] == 1
+        assert unchanged.json()['stocks'][0]['score'] == 1
+        assert rebuilt.json()['stocks'][0]['score'] == 2
+        assert rebuilt.json()['snapshot_version'] > first.json()['snapshot_version']
+        assert mock_get_data.call_count == 2
+
     def test_get_monitor_failure(self, client):
         with patch('services.monitor_service.MonitorService.get_enriched_monitor_data', new_callable=AsyncMock) as mock_get_data:
             mock_get_data.side_effect = RuntimeError('monitor failed')
@@ -60,6 +87,24 @@ class TestMonitorRoutes:
         assert response.status_code == 200
         assert response.json()['status'] == 'success'
 
+    def test_create_monitor_stock_rebuilds_snapshot(self, client, snapshot_rebuild):
+        stock_data = {'code': 'sh600000', 'name': 'PF Bank', 'timeframe': '1d', 'reasonable_pe_min': 15, 'reasonable_pe_max': 20}
+
+        with patch('repositories.monitor_repository.MonitorStockRepository.add', new_callable=AsyncMock) as mock_add:
+            mock_add.return_value = (True, 'created')
+            response = client.post('/api/monitor/stocks', json=stock_data)
+
+        assert response.json()['status'] == 'success'
+        snapshot_rebuild.assert_called_once()
+
+    def test_toggle_monitor_stock_failure_keeps_snapshot(self, client, snapshot_rebuild):
+        with patch('repositories.monitor_repository.MonitorStockRepository.toggle_enabled', new_callable=AsyncMock) as mock_toggle:
+            mock_toggle.return_value = False
+            response = client.post('/api/monitor/stocks/sh600000/toggle', json={'enabled': False})
+
+        assert response.json()['status'] == 'error'
+        snapshot_rebuild.assert_not_called()
+
     def test_create_monitor_stock_failure(self, client):
         stock_data = {'code': 'sh600000', 'name': 'PF Bank', 'timeframe': '1d', 'reasonable_pe_min': 15, 'reasonable_pe_max': 20}
 
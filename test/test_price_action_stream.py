@@ -0,0 +1,189 @@
+import json
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from services.price_action_service import PriceActionService
+
+
+def _sse(*events):
+    lines = [f'data: {json.dumps(event, ensure_ascii=False)}\n'.encode('utf-8') for event in events]
+    return lines + [b'\n', b'data: [DONE]\n']
+
+
+class FakeContent:
+    """按行产出字节的 response.content，可在指定行之后抛出异常模拟连接中断"""
+
+    def __init__(self, lines, fail_after=None):
+        self._lines = lines
+        self._fail_after = fail_after
+
+    async def __aiter__(self):
+        for index, line in enumerate(self._lines):
+            if self._fail_after is not None and index == self._fail_after:
+                raise ConnectionResetError('connection reset by peer')
+            yield line
+
+
+class FakeResponse:
+    def __init__(self, status=200, lines=(), content_type='text/event-stream', body=None, fail_after=None):
+        self.status = status
+        self.content_type = content_type
+        self.content = FakeContent(list(lines), fail_after)
+        self._body = body
+
+    async def text(self):
+        return json.dumps(self._body) if self._body is not None else 'upstream error'
+
+    async def json(self):
+        return self._body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeClients:
+    """替代 get_http_clients()：按调用顺序返回预设的响应，并记录请求的 URL"""
+
+    def __init__(self, *responses):
+        self._responses = list(responses)
+        self.urls = []
+
+    def session(self):
+        return self
+
+    def post(self, url, **_kwargs):
+        self.urls.append(url)
+        return self._responses.pop(0)
+
+    @staticmethod
+    def timeout(_name):
+        return None
+
+
+@pytest.fixture(autouse=True)
+def llm_env(monkeypatch):
+    monkeypatch.setenv('OPENAI_BASE_URL', 'http://llm.test')
+    monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+    monkeypatch.setenv('OPENAI_MODEL', 'test-model')
+    monkeypatch.setenv('OPENAI_API_STYLE', 'chat_completions')
+
+
+def _chat_delta(text):
+    return {'choices': [{'delta': {'content': text}}]}
+
+
+async def _collect(stream):
+    return [item async for item in stream]
+
+
+PREPARED = {
+    'period': 'daily',
+    'model_name': 'test-model',
+    'kline_data': {'code': 'sh600000', 'name': '浦发银行', 'count': 60},
+    'system_prompt': 'system',
+    'analysis_rubric': 'rubric',
+    'user_data': 'data',
+}
+
+
+class TestExtractStreamDelta:
+    def test_chat_completions(self):
+        assert PriceActionService._extract_stream_delta('chat_completions', _chat_delta('上涨')) == '上涨'
+        assert PriceActionService._extract_stream_delta('chat_completions', {'choices': [{'delta': {}}]}) == ''
+        assert PriceActionService._extract_stream_delta('chat_completions', {'choices': []}) == ''
+
+    def test_responses(self):
+        event = {'type': 'response.output_text.delta', 'delta': '趋势'}
+        assert PriceActionService._extract_stream_delta('responses', event) == '趋势'
+        assert PriceActionService._extract_stream_delta('responses', {'type': 'response.created'}) == ''
+
+    def test_responses_error_event_raises(self):
+        with pytest.raises(RuntimeError, match='rate limited'):
+            PriceActionService._extract_stream_delta('responses', {'type': 'error', 'error': 'rate limited'})
+        with pytest.raises(RuntimeError, match='quota'):
+            PriceActionService._extract_stream_delta(
+                'responses', {'type': 'response.failed', 'response': {'error': {'message': 'quota'}}}
+            )
+
+
+class TestStreamLlm:
+    async def test_falls_back_to_next_candidate_before_first_token(self):
+        clients = FakeClients(
+            FakeResponse(status=404),
+            FakeResponse(lines=_sse({'type': 'response.output_text.delta', 'delta': '第一段'},
+                                    {'type': 'response.completed'})),
+        )
+        with patch('services.price_action_service.get_http_clients', return_value=clients):
+            chunks = await _collect(PriceActionService._stream_llm('system', 'rubric', 'data'))
+
+        assert chunks == ['第一段']
+        assert clients.urls == ['http://llm.test/chat/completions', 'http://llm.test/responses']
+
+    async def test_empty_stream_tries_next_candidate(self):
+        clients = FakeClients(
+            FakeResponse(lines=_sse({'choices': []})),
+            FakeResponse(content_type='application/json', body={'output_text': '完整结果'}),
+        )
+        with patch('services.price_action_service.get_http_clients', return_value=clients):
+            chunks = await _collect(PriceActionService._stream_llm('system', 'rubric', 'data'))
+
+        assert chunks == ['完整结果']
+        assert len(clients.urls) == 2
+
+    async def test_no_fallback_after_first_token(self):
+        clients = FakeClients(
+            FakeResponse(lines=_sse(_chat_delta('已输出'), _chat_delta('未送达')), fail_after=1),
+            FakeResponse(lines=_sse(_chat_delta('不应被请求'))),
+        )
+        chunks = []
+        with patch('services.price_action_service.get_http_clients', return_value=clients):
+            with pytest.raises(ConnectionResetError):
+                async for delta in PriceActionService._stream_llm('system', 'rubric', 'data'):
+                    chunks.append(delta)
+
+        assert chunks == ['已输出']
+        assert clients.urls == ['http://llm.test/chat/completions']
+
+
+class TestStreamAnalysis:
+    async def test_saves_report_after_complete_stream(self):
+        clients = FakeClients(FakeResponse(lines=_sse(_chat_delta('## 结论\n'), _chat_delta('偏多'))))
+        with patch('services.price_action_service.get_http_clients', return_value=clients), \
+             patch('services.price_action_service.AnalysisRepository.create_report',
+                   new_callable=AsyncMock, return_value=7) as mock_create:
+            events = await _collect(PriceActionService.stream_analysis(PREPARED))
+
+        assert [name for name, _ in events] == ['meta', 'delta', 'delta', 'done']
+        assert events[-1][1]['id'] == 7
+        assert 'input_payload' not in events[-1][1]
+        assert mock_create.await_args.kwargs['analysis_markdown'] == '## 结论\n偏多'
+
+    async def test_error_event_does_not_save_report(self, monkeypatch):
+        monkeypatch.setenv('OPENAI_API_STYLE', 'responses')
+        clients = FakeClients(FakeResponse(lines=_sse(
+            {'type': 'response.output_text.delta', 'delta': '部分内容'},
+            {'type': 'error', 'error': {'message': 'server overloaded'}},
+        )))
+        with patch('services.price_action_service.get_http_clients', return_value=clients), \
+             patch('services.price_action_service.AnalysisRepository.create_report',
+                   new_callable=AsyncMock) as mock_create:
+            events = await _collect(PriceActionService.stream_analysis(PREPARED))
+
+        assert [name for name, _ in events] == ['meta', 'delta', 'error']
+        assert 'server overloaded' in events[-1][1]['detail']
+        mock_create.assert_not_awaited()
+
+    async def test_all_candidates_failing_reports_error(self):
+        clients = FakeClients(*(FakeResponse(status=502) for _ in range(4)))
+        with patch('services.price_action_service.get_http_clients', return_value=clients), \
+             patch('services.price_action_service.AnalysisRepository.create_report',
+                   new_callable=AsyncMock) as mock_create:
+            events = await _collect(PriceActionService.stream_analysis(PREPARED))
+
+        assert [name for name, _ in events] == ['meta', 'error']
+        assert len(clients.urls) == 4
+        mock_create.assert_not_awaited()
@@ -1,5 +1,6 @@
 from unittest.mock import AsyncMock, MagicMock, patch
 
+import numpy as np
 import pandas as pd
 
 
@@ -10,9 +11,9 @@ class TestToolsRoutes:
         mock_monitor_stock.name = 'PF Bank'
 
         with patch('repositories.monitor_repository.MonitorStockRepository.get_enabled', new_callable=AsyncMock) as mock_get_enabled, \
-             patch('repositories.kline_repository.KlineRepository.get_latest_date', new_callable=AsyncMock) as mock_get_latest:
+             patch('repositories.kline_repository.KlineRepository.get_latest_dates_batch', new_callable=AsyncMock) as mock_get_latest:
             mock_get_enabled.return_value = [mock_monitor_stock]
-            mock_get_latest.return_value = '2026-02-10'
+            mock_get_latest.return_value = {'sh600000': '2026-02-10'}
             response = client.get('/api/tools/export-kline/stocks')
 
         assert response.status_code == 200
@@ -32,9 +33,9 @@ class TestToolsRoutes:
         mock_monitor_stock.name = 'PF Bank'
 
         with patch('repositories.monitor_repository.MonitorStockRepository.get_enabled', new_callable=AsyncMock) as mock_get_enabled, \
-             patch('repositories.kline_repository.KlineRepository.get_latest_date', new_callable=AsyncMock) as mock_get_latest:
+             patch('repositories.kline_repository.KlineRepository.get_latest_dates_batch', new_callable=AsyncMock) as mock_get_latest:
             mock_get_enabled.return_value = [mock_monitor_stock]
-            mock_get_latest.return_value = None
+            mock_get_latest.return_value = {'sh600000': None}
             response = client.get('/api/tools/export-kline/stocks')
 
         assert response.status_code == 200
@@ -49,13 +50,15 @@ class TestToolsRoutes:
         mock_stock2.name = 'PingAn'
 
         with patch('repositories.monitor_repository.MonitorStockRepository.get_enabled', new_callable=AsyncMock) as mock_get_enabled, \
-             patch('repositories.kline_repository.KlineRepository.get_latest_date', new_callable=AsyncMock) as mock_get_latest:
+             patch('repositories.kline_repository.KlineRepository.get_latest_dates_batch', new_callable=AsyncMock) as mock_get_latest:
             mock_get_enabled.return_value = [mock_stock1, mock_stock2]
-            mock_get_latest.side_effect = ['2026-02-10', '2026-02-09']
+            mock_get_latest.return_value = {'sh600000': '2026-02-10', 'sz000001': '2026-02-09'}
             response = client.get('/api/tools/export-kline/stocks')
 
         assert response.status_code == 200
         assert len(response.json()['data']) == 2
+        assert response.json()['data'][1]['latest_date'] == '2026-02-09'
+        mock_get_latest.assert_awaited_once_with(['sh600000', 'sz000001'])
 
     def test_get_export_stocks_failure(self, client):
         with patch('repositories.monitor_repository.MonitorStockRepository.get_enabled', new_callable=AsyncMock) as mock_get_enabled:
@@ -108,6 +111,33 @@ class TestToolsRoutes:
         assert response.status_code == 200
         assert 'text/csv' in response.headers['content-type']
 
+    def test_export_kline_served_from_kline_store(self, client):
+        from utils.kline_store import get_kline_store
+
+        mock_stock = MagicMock()
+        mock_stock.name = 'PF Bank'
+        get_kline_store().put('sh600000', {
+            'dates': np.array(['2026-02-06', '2026-02-09', '2026-02-10'], dtype='datetime64[D]'),
+            'opens': np.array([10.1, 10.3, 10.5]),
+            'closes': np.array([10.2, 10.5, 10.8]),
+            'highs': np.array([10.4, 10.8, 11.0]),
+            'lows': np.array([10.0, 10.2, 10.3]),
+            'volumes': np.zeros(3, dtype=np.int64),
+            'amounts': np.array([1e6, 2e6, 3e6]),
+        }, complete=True)
+        export_data = {'code': 'sh600000', 'format': 'csv', 'start_date': '2026-02-09', 'end_date': '2026-02-10'}
+
+        with patch('repositories.monitor_repository.MonitorStockRepository.get_by_code', new_callable=AsyncMock) as mock_get_stock, \
+             patch('repositories.kline_repository.KlineRepository.export_kline_data', new_callable=AsyncMock) as mock_export:
+            mock_get_stock.return_value = mock_stock
+            response = client.post('/api/tools/export-kline', json=export_data)
+
+        assert response.status_code == 200
+        mock_export.assert_not_awaited()
+        lines = response.content.decode('utf-8-sig').strip().splitlines()
+        assert len(lines) == 3
+        assert lines[1].startswith('2026-02-09,10.3,10.5')
+
     def test_export_kline_no_code(self, client):
         response = client.post('/api/tools/export-kline', json={'format': 'csv', 'start_date': '2026-02-09', 'end_date': '2026-02-10'})
         assert response.status_code == 422
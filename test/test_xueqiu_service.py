@@ -0,0 +1,20 @@
+from unittest.mock import patch
+
+from services.xueqiu_service import XueqiuService
+from utils.http_clients import get_http_clients
+
+
+class TestXueqiuService:
+    def test_sync_wrapper_closes_loop_session(self):
+        sessions = []
+
+        async def fake_fetch():
+            sessions.append(get_http_clients().session())
+            return {'ZH0001': []}
+
+        with patch.object(XueqiuService, 'get_all_cubes_data_async', side_effect=fake_fetch):
+            result = XueqiuService.get_all_cubes_data()
+
+        assert result == {'ZH0001': []}
+        # asyncio.run 的事件循环结束前关闭了该循环上的 aiohttp 会话
+        assert sessions[0].closed
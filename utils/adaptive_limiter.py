@@ -0,0 +1,214 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from utils.logger import get_logger
+
+logger = get_logger('adaptive_limiter')
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limiter for upstream market-data fetches.
+
+    Every successful call whose latency stays under ``latency_target`` grows the
+    window by ``1 / window`` (about +1 per full window of calls). A failed call
+    (timeout, HTTP error, upstream exception) multiplies the window by
+    ``backoff``, at most once per ``cooldown`` seconds so one burst of failures
+    only counts as a single congestion signal.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        initial: float,
+        min_limit: int = 1,
+        max_limit: int = 50,
+        latency_target: float = 5.0,
+        backoff: float = 0.5,
+        cooldown: float = 2.0,
+    ):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.cooldown = cooldown
+        # The limiter is shared by every event loop in the process (the app loop and the
+        # asyncio.run loops of background threads), so all state is guarded by a thread lock
+        # and waiters on other loops are woken through call_soon_threadsafe.
+        self._lock = threading.Lock()
+        self._window = float(min(max(initial, self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._waiters = deque()
+        self._last_decrease = 0.0
+        self._successes = 0
+        self._failures = 0
+        self._latency_ewma = None
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._window))
+
+    async def acquire(self) -> None:
+        with self._lock:
+            if self._in_flight < self.limit and not self._waiters:
+                self._in_flight += 1
+                return
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove(waiter)
+                    granted = False
+                except ValueError:
+                    granted = True
+            if granted:
+                # The slot was handed over just before cancellation; give it back.
+                self.release()
+            raise
+
+    def release(self, *, latency: float | None = None, error: bool = False) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if error:
+                self._on_failure()
+            elif latency is not None:
+                self._on_success(latency)
+            woken = self._pop_waiters()
+        self._wake(woken)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one slot for the duration of an upstream call and feed back the outcome."""
+        await self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        except asyncio.CancelledError:
+            self.release()
+            raise
+        except Exception:
+            self.release(error=True)
+            raise
+        else:
+            self.release(latency=time.monotonic() - start)
+
+    def _pop_waiters(self) -> list:
+        """Hand free slots to queued waiters; caller holds ``_lock``."""
+        woken = []
+        while self._waiters and self._in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if waiter.get_loop().is_closed():
+                continue
+            self._in_flight += 1
+            woken.append(waiter)
+        return woken
+
+    def _wake(self, waiters) -> None:
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        for waiter in waiters:
+            loop = waiter.get_loop()
+            if loop is current:
+                _resolve(waiter)
+                continue
+            try:
+                loop.call_soon_threadsafe(_resolve, waiter)
+            except RuntimeError:
+                # The waiter's loop closed after it was dequeued; its slot goes back to the pool.
+                self.release()
+
+    def _set_window(self, window: float, reason: str) -> None:
+        previous = self.limit
+        self._window = min(max(window, float(self.min_limit)), float(self.max_limit))
+        if self.limit != previous:
+            logger.info(f'{self.name}: concurrency window {previous} -> {self.limit} ({reason})')
+
+    def _on_success(self, latency: float) -> None:
+        self._successes += 1
+        self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+        if latency <= self.latency_target and self._in_flight + 1 >= self.limit:
+            # Only grow while the window is actually being used.
+            self._set_window(self._window + 1 / self._window, f'latency {latency:.2f}s')
+
+    def _on_failure(self) -> None:
+        self._failures += 1
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self._set_window(self._window * self.backoff, 'upstream error')
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'name': self.name,
+                'window': self.limit,
+                'min_limit': self.min_limit,
+                'max_limit': self.max_limit,
+                'in_flight': self._in_flight,
+                'waiting': len(self._waiters),
+                'successes': self._successes,
+                'failures': self._failures,
+                'latency_ewma': round(self._latency_ewma, 3) if self._latency_ewma is not None else None,
+            }
+
+
+def _resolve(waiter) -> None:
+    # A waiter cancelled after being handed a slot returns it from acquire().
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+_limiters: dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _build_limiter(name: str) -> AdaptiveLimiter:
+    if name == 'kline':
+        return AdaptiveLimiter(
+            name,
+            initial=4,
+            max_limit=int(os.getenv('KLINE_UPDATE_CONCURRENT', '10')),
+            latency_target=float(os.getenv('KLINE_LATENCY_TARGET', '15')),
+        )
+    if name == 'eps':
+        return AdaptiveLimiter(
+            name,
+            initial=4,
+            max_limit=int(os.getenv('EPS_MAX_CONCURRENT', '10')),
+            latency_target=float(os.getenv('EPS_LATENCY_TARGET', '10')),
+        )
+    if name == 'quote':
+        return AdaptiveLimiter(
+            name,
+            initial=8,
+            max_limit=int(os.getenv('QUOTE_MAX_CONCURRENT', '20')),
+            latency_target=float(os.getenv('QUOTE_LATENCY_TARGET', '2')),
+        )
+    return AdaptiveLimiter(name, initial=4)
+
+
+def get_limiter(name: str) -> AdaptiveLimiter:
+    """Return the shared limiter for an upstream (``kline`` / ``eps`` / ``quote``)."""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = _build_limiter(name)
+            _limiters[name] = limiter
+        return limiter
+
+
+def all_limiter_stats() -> list[dict]:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.stats() for limiter in limiters]
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import json
 from datetime import datetime
 from typing import Any
 
@@ -29,3 +30,8 @@ def status_message_response(success: bool, success_message: str, error_message:
         'status': 'success' if success else 'error',
         'message': success_message if success else (error_message or success_message)
     }
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Encode one server-sent event; ``data`` is serialized as a single JSON line."""
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n'
@@ -0,0 +1,211 @@
+import asyncio
+import gc
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger('compute_executor')
+
+
+def _pack_arrays(arrays: dict):
+    """Copy ``arrays`` into one shared-memory block and describe where each one lives."""
+    layout = []
+    offset = 0
+    contiguous = {}
+    for key, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        contiguous[key] = array
+        offset = -(-offset // 64) * 64
+        layout.append((key, array.dtype.str, array.shape, offset))
+        offset += array.nbytes
+
+    block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for key, dtype, shape, start in layout:
+        array = contiguous[key]
+        np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=start)[...] = array
+    return block, layout
+
+
+def _call_with_shared_arrays(func, block_name: str, layout: list, args: tuple):
+    """Worker side: attach to the block, expose it as read-only arrays and call ``func``."""
+    block = shared_memory.SharedMemory(name=block_name)
+    try:
+        arrays = {}
+        for key, dtype, shape, start in layout:
+            view = np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=start)
+            view.flags.writeable = False
+            arrays[key] = view
+        return func(arrays, *args)
+    finally:
+        arrays = view = None
+        try:
+            block.close()
+        except BufferError:
+            # pandas objects built on the views can sit in reference cycles until collected
+            gc.collect()
+            block.close()
+
+
+def _noop():
+    return os.getpid()
+
+
+class ComputeExecutor:
+    """Process pool for CPU-bound NumPy / pandas work that would otherwise block the event loop.
+
+    ``run_arrays`` copies the input arrays once into a shared-memory block; workers
+    map that block instead of unpickling DataFrames. Callables must be importable
+    module-level functions (or static methods) and must not return views of their
+    input arrays, since the block is unmapped as soon as they return.
+
+    With ``max_workers == 0`` everything runs inline on the caller's thread, which
+    keeps the old behaviour available for debugging and single-core hosts.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max(0, max_workers)
+        self._context = multiprocessing.get_context('spawn')
+        self._pool = self._create_pool()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._timeouts = 0
+        self._restarts = 0
+        self._shared_bytes_total = 0
+        self._shared_bytes_in_flight = 0
+
+    def _create_pool(self):
+        if self.max_workers == 0:
+            return None
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self._context)
+
+    async def _submit(self, func, *args, timeout: float | None = None):
+        with self._lock:
+            self._in_flight += 1
+            pool = self._pool
+        try:
+            if pool is None:
+                result = func(*args)
+            else:
+                future = pool.submit(func, *args)
+                try:
+                    result = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+                except asyncio.TimeoutError:
+                    future.cancel()
+                    with self._lock:
+                        self._timeouts += 1
+                    raise
+        except BrokenProcessPool:
+            with self._lock:
+                self._failed += 1
+                # Every call that was running on the broken pool lands here; only the first one
+                # (while self._pool is still that pool) replaces it.
+                restart = self._pool is pool
+                if restart:
+                    self._restarts += 1
+                    self._pool = self._create_pool()
+            if restart:
+                logger.error(f'{self.name}: worker process died, restarting pool')
+                pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        except asyncio.TimeoutError:
+            raise
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        else:
+            with self._lock:
+                self._completed += 1
+            return result
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    async def run(self, func, *args, timeout: float | None = None):
+        """Run ``func(*args)`` in a worker process; arguments are pickled."""
+        return await self._submit(func, *args, timeout=timeout)
+
+    async def run_arrays(self, func, arrays: dict, *args, timeout: float | None = None):
+        """Run ``func(arrays, *args)`` in a worker, passing ``arrays`` through shared memory."""
+        if self._pool is None:
+            return await self._submit(func, arrays, *args)
+
+        block, layout = _pack_arrays(arrays)
+        with self._lock:
+            self._shared_bytes_total += block.size
+            self._shared_bytes_in_flight += block.size
+        try:
+            return await self._submit(
+                _call_with_shared_arrays, func, block.name, layout, args, timeout=timeout
+            )
+        finally:
+            # A timed-out worker may still have the block mapped; unlinking only removes the name
+            block.close()
+            block.unlink()
+            with self._lock:
+                self._shared_bytes_in_flight -= block.size
+
+    async def warm_up(self) -> None:
+        """Start every worker process ahead of the first real task."""
+        if self._pool is None:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.gather(*(
+                asyncio.wrap_future(self._pool.submit(_noop), loop=loop)
+                for _ in range(self.max_workers)
+            ))
+        except Exception as exc:
+            logger.warning(f'{self.name}: warm-up failed, workers will start on demand: {exc}')
+            return
+        logger.info(f'{self.name}: {self.max_workers} worker processes ready')
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'name': self.name,
+                'max_workers': self.max_workers,
+                'in_flight': self._in_flight,
+                'completed': self._completed,
+                'failed': self._failed,
+                'timeouts': self._timeouts,
+                'restarts': self._restarts,
+                'shared_bytes_total': self._shared_bytes_total,
+                'shared_bytes_in_flight': self._shared_bytes_in_flight,
+            }
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_executor: ComputeExecutor | None = None
+
+
+def get_compute_executor() -> ComputeExecutor:
+    """Return the process-wide compute executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        default_workers = min(4, os.cpu_count() or 1)
+        _executor = ComputeExecutor('compute', int(os.getenv('COMPUTE_WORKERS', str(default_workers))))
+        logger.info(f'Compute executor initialized, workers={_executor.max_workers}')
+    return _executor
+
+
+def shutdown_compute_executor() -> None:
+    """Shut down the compute executor's worker processes."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+        logger.info('Compute executor closed')
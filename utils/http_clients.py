@@ -0,0 +1,142 @@
+import asyncio
+import os
+import threading
+import weakref
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.logger import get_logger
+
+logger = get_logger('http_clients')
+
+# Shared per-purpose timeouts; callers pass ``timeout=registry.timeout(name)``.
+TIMEOUTS = {
+    'quote': aiohttp.ClientTimeout(total=10),
+    'xueqiu': aiohttp.ClientTimeout(total=10),
+    'llm': aiohttp.ClientTimeout(total=120, sock_connect=30),
+    # Streaming has no overall cap: only connecting and the gap between chunks are bounded.
+    'llm_stream': aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=120),
+}
+
+EASTMONEY_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/145.0.0.0 Safari/537.36',
+    'Referer': 'https://quote.eastmoney.com/',
+}
+
+
+class HttpClientRegistry:
+    """Application-scoped HTTP clients with keep-alive connection pools.
+
+    ``session()`` returns one ``aiohttp.ClientSession`` per event loop, backed by a
+    connector with a global and per-host connection cap and a DNS cache, so quote,
+    Xueqiu and LLM calls reuse TCP/TLS connections instead of handshaking on every
+    request. Default headers are not set on the session; callers pass their own,
+    since tokens such as the Xueqiu cookie are read from the environment per call.
+
+    ``requests_session()`` is the blocking counterpart for code that runs in worker
+    threads (pooled adapter with retries, shared across threads).
+    """
+
+    def __init__(self, max_connections: int, max_per_host: int, keepalive: float, dns_ttl: int):
+        self.max_connections = max(1, max_connections)
+        self.max_per_host = max(1, max_per_host)
+        self.keepalive = keepalive
+        self.dns_ttl = dns_ttl
+        self._sessions = weakref.WeakKeyDictionary()
+        self._requests_session = None
+        self._lock = threading.Lock()
+        self._sessions_created = 0
+
+    def session(self) -> aiohttp.ClientSession:
+        """Return the shared session for the running event loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive,
+            )
+            session = aiohttp.ClientSession(connector=connector, trust_env=False)
+            self._sessions[loop] = session
+            with self._lock:
+                self._sessions_created += 1
+        return session
+
+    @staticmethod
+    def timeout(name: str) -> aiohttp.ClientTimeout:
+        return TIMEOUTS[name]
+
+    def requests_session(self) -> requests.Session:
+        """Return the shared blocking session used for Eastmoney fallbacks."""
+        with self._lock:
+            if self._requests_session is None:
+                session = requests.Session()
+                session.headers.update(EASTMONEY_HEADERS)
+                retry = Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
+                adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=self.max_per_host,
+                    max_retries=retry,
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._requests_session = session
+            return self._requests_session
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'name': 'http',
+                'max_connections': self.max_connections,
+                'max_per_host': self.max_per_host,
+                'sessions': len(self._sessions),
+                'sessions_created': self._sessions_created,
+            }
+
+    async def close_session(self) -> None:
+        """Close the running loop's session (for short-lived loops such as ``asyncio.run``)."""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
+    async def close(self) -> None:
+        """Close the current loop's session and the blocking session."""
+        await self.close_session()
+        with self._lock:
+            requests_session, self._requests_session = self._requests_session, None
+        if requests_session is not None:
+            requests_session.close()
+
+
+_registry: HttpClientRegistry | None = None
+
+
+def get_http_clients() -> HttpClientRegistry:
+    """Return the process-wide HTTP client registry, creating it on first use."""
+    global _registry
+    if _registry is None:
+        _registry = HttpClientRegistry(
+            max_connections=int(os.getenv('HTTP_MAX_CONNECTIONS', '100')),
+            max_per_host=int(os.getenv('HTTP_MAX_PER_HOST', '10')),
+            keepalive=float(os.getenv('HTTP_KEEPALIVE', '30')),
+            dns_ttl=int(os.getenv('HTTP_DNS_TTL', '300')),
+        )
+        logger.info(
+            f'HTTP clients initialized, max_connections={_registry.max_connections}, '
+            f'max_per_host={_registry.max_per_host}'
+        )
+    return _registry
+
+
+async def close_http_clients() -> None:
+    """Close pooled connections; call from the lifespan shutdown on the serving loop."""
+    global _registry
+    if _registry is not None:
+        await _registry.close()
+        _registry = None
+        logger.info('HTTP clients closed')
@@ -0,0 +1,155 @@
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger('kline_store')
+
+DATE_KEY = 'dates'
+
+
+class KlineStore:
+    """Process-wide LRU cache of per-code K-line column arrays.
+
+    Each entry is a dict of equally long NumPy arrays sorted by ``dates``
+    (datetime64[D]) and holds the most recent bars of one code. ``complete``
+    marks entries that hold the code's whole history, so any shorter read or
+    date range can be served from them. Entries are evicted least recently
+    used first once their total ``nbytes`` exceeds ``max_bytes``, and are
+    treated as misses after ``ttl`` seconds so writes from other processes are
+    eventually picked up. Writes from this process are merged in place via
+    :meth:`merge`.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._merges = 0
+
+    def _lookup(self, code: str) -> dict | None:
+        entry = self._entries.get(code)
+        if entry is None:
+            return None
+        if time.monotonic() - entry['loaded_at'] > self.ttl:
+            self._drop(code)
+            return None
+        self._entries.move_to_end(code)
+        return entry
+
+    def _drop(self, code: str) -> None:
+        entry = self._entries.pop(code, None)
+        if entry is not None:
+            self._bytes -= entry['nbytes']
+
+    def _store(self, code: str, arrays: dict, complete: bool, loaded_at: float) -> dict | None:
+        self._drop(code)
+        nbytes = sum(array.nbytes for array in arrays.values())
+        if nbytes > self.max_bytes:
+            return None
+        entry = {'arrays': arrays, 'complete': complete, 'loaded_at': loaded_at, 'nbytes': nbytes}
+        self._entries[code] = entry
+        self._bytes += nbytes
+        while self._bytes > self.max_bytes:
+            evicted, _ = next(iter(self._entries.items()))
+            self._drop(evicted)
+            self._evictions += 1
+        return entry
+
+    def get(self, code: str, limit: int | None) -> dict | None:
+        """Return the last ``limit`` bars (all bars if ``None``), or ``None`` on a miss."""
+        entry = self._lookup(code)
+        if entry is not None:
+            length = len(entry['arrays'][DATE_KEY])
+            if entry['complete'] or (limit is not None and length >= limit):
+                self._hits += 1
+                if limit is None or length <= limit:
+                    return entry['arrays']
+                return {key: array[-limit:] for key, array in entry['arrays'].items()}
+        self._misses += 1
+        return None
+
+    def get_range(self, code: str, start=None, end=None) -> dict | None:
+        """Return bars with ``start <= date <= end`` if the cached entry covers ``start``."""
+        entry = self._lookup(code)
+        if entry is not None:
+            dates = entry['arrays'][DATE_KEY]
+            start_day = np.datetime64(start, 'D') if start is not None else None
+            covered = entry['complete'] or (start_day is not None and len(dates) and start_day >= dates[0])
+            if covered:
+                self._hits += 1
+                lo = 0 if start_day is None else np.searchsorted(dates, start_day, side='left')
+                hi = len(dates) if end is None else np.searchsorted(dates, np.datetime64(end, 'D'), side='right')
+                return {key: array[lo:hi] for key, array in entry['arrays'].items()}
+        self._misses += 1
+        return None
+
+    def put(self, code: str, arrays: dict, complete: bool) -> None:
+        """Cache bars freshly read from the database."""
+        self._store(code, arrays, complete, time.monotonic())
+
+    def merge(self, code: str, arrays: dict) -> None:
+        """Fold newly written bars into a cached entry; rows for existing dates are replaced.
+
+        Codes that are not cached are ignored. Bars older than a partial
+        entry's first date would leave a gap, so that entry is dropped instead.
+        """
+        entry = self._entries.get(code)
+        if entry is None or not len(arrays[DATE_KEY]):
+            return
+        cached = entry['arrays']
+        if not entry['complete'] and len(cached[DATE_KEY]) and arrays[DATE_KEY].min() < cached[DATE_KEY][0]:
+            self._drop(code)
+            return
+
+        combined = {key: np.concatenate([cached[key], arrays[key]]) for key in cached}
+        order = np.argsort(combined[DATE_KEY], kind='stable')
+        dates = combined[DATE_KEY][order]
+        # After a stable sort the written row follows the cached row of the same date; keep the last one
+        keep = np.ones(len(dates), dtype=bool)
+        keep[:-1] = dates[1:] != dates[:-1]
+        merged = {key: array[order][keep] for key, array in combined.items()}
+        self._store(code, merged, entry['complete'], entry['loaded_at'])
+        self._merges += 1
+
+    def invalidate(self, code: str | None = None) -> None:
+        if code is None:
+            self._entries.clear()
+            self._bytes = 0
+        else:
+            self._drop(code)
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self._hits,
+            'misses': self._misses,
+            'hit_rate': round(self._hits / lookups, 4) if lookups else None,
+            'evictions': self._evictions,
+            'merges': self._merges,
+        }
+
+
+_store: KlineStore | None = None
+
+
+def get_kline_store() -> KlineStore:
+    """Return the process-wide K-line store (``KLINE_STORE_MAX_MB`` / ``KLINE_STORE_TTL``)."""
+    global _store
+    if _store is None:
+        _store = KlineStore(
+            max_bytes=int(float(os.getenv('KLINE_STORE_MAX_MB', '256')) * 1024 * 1024),
+            ttl=float(os.getenv('KLINE_STORE_TTL', '3600')),
+        )
+        logger.info(f'K-line store budget {_store.max_bytes // (1024 * 1024)} MB, ttl {_store.ttl:.0f}s')
+    return _store
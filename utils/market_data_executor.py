@@ -0,0 +1,141 @@
+import asyncio
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.logger import get_logger
+
+logger = get_logger('market_data_executor')
+
+
+class MarketDataExecutor:
+    """Dedicated thread pool for blocking market-data calls (akshare and friends).
+
+    Concurrency is capped at ``max_workers`` by a per-event-loop semaphore. When a
+    call times out, its slot is released immediately and the still-running thread
+    is tracked as abandoned; the pool keeps ``headroom`` spare threads so that
+    abandoned threads do not starve new calls.
+    """
+
+    def __init__(self, name: str, max_workers: int, headroom: int | None = None):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.headroom = self.max_workers if headroom is None else max(0, headroom)
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.max_workers + self.headroom,
+            thread_name_prefix=name,
+        )
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._abandoned = 0
+        self._completed = 0
+        self._failed = 0
+        self._timeouts = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_workers)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    def _on_abandoned_done(self, _future) -> None:
+        with self._lock:
+            self._abandoned -= 1
+
+    def _abandon(self, future) -> None:
+        if future.cancel() or future.done():
+            return
+        with self._lock:
+            self._abandoned += 1
+            abandoned = self._abandoned
+        future.add_done_callback(self._on_abandoned_done)
+        if abandoned > self.headroom:
+            logger.warning(
+                f'{self.name}: {abandoned} abandoned threads exceed headroom {self.headroom}, new calls may queue'
+            )
+
+    async def run(self, func, *args, timeout: float | None = None):
+        """Run ``func(*args)`` in the pool, waiting at most ``timeout`` seconds."""
+        semaphore = self._get_semaphore()
+        with self._lock:
+            self._queued += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            with self._lock:
+                self._queued -= 1
+
+        with self._lock:
+            self._in_flight += 1
+        future = self._pool.submit(func, *args)
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timeouts += 1
+            self._abandon(future)
+            raise
+        except asyncio.CancelledError:
+            self._abandon(future)
+            raise
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        else:
+            with self._lock:
+                self._completed += 1
+            return result
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            semaphore.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'name': self.name,
+                'max_workers': self.max_workers,
+                'headroom': self.headroom,
+                'queued': self._queued,
+                'in_flight': self._in_flight,
+                'abandoned': self._abandoned,
+                'completed': self._completed,
+                'failed': self._failed,
+                'timeouts': self._timeouts,
+            }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_executor: MarketDataExecutor | None = None
+
+
+def get_market_data_executor() -> MarketDataExecutor:
+    """Return the process-wide market-data executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        max_workers = int(os.getenv('MARKET_DATA_WORKERS', os.getenv('KLINE_UPDATE_CONCURRENT', '10')))
+        headroom = os.getenv('MARKET_DATA_ABANDON_HEADROOM')
+        _executor = MarketDataExecutor(
+            'market-data',
+            max_workers,
+            headroom=int(headroom) if headroom is not None else None,
+        )
+        logger.info(f'Market data executor initialized, workers={_executor.max_workers}, headroom={_executor.headroom}')
+    return _executor
+
+
+def shutdown_market_data_executor() -> None:
+    """Shut down the market-data executor without waiting for abandoned threads."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+        logger.info('Market data executor closed')